@@ -1,27 +1,133 @@
+import datetime
+import json
+from django.conf import settings
 from django.contrib import admin
-from core.models import Customer, Order, OrderItem, PaymentLog
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
+from core.models import ORDER_LOG_MARGIN, Customer, Order, OrderItem, PaymentLog, PaymentLogSummary, DailySalesRollup
+from core.analytics import summarize_rollups, summarize_options
 from django.contrib import messages
 from django.urls import reverse
 from django.utils.html import format_html
-from core.views import VippsMobilePayAPI
-from django.http import HttpResponseRedirect
+from core import keyset, partitions, search
+from core.order_states import transition_order
+from core.payment_log_writer import log_payment_event
+from payments import api  # Shared process-wide Vipps MobilePay client, created on first use
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import path
 from django.shortcuts import get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Max, Min, OuterRef, Q, Subquery
+from django.contrib.admin.utils import display_for_field
+from django.core.exceptions import PermissionDenied
 
-# Initialize the API helper
-api = VippsMobilePayAPI()
+def format_payload(log):
+    """Render a log's response data, decoding compact payloads transparently"""
+    payload = log.payload
+    if payload is None:
+        return "-"
+    return format_html('<pre>{}</pre>', json.dumps(payload, indent=2, ensure_ascii=False))
+
+CURSOR_VAR = 'cursor'
+
+class KeysetChangeList(ChangeList):
+    """Change list that pages by (created_at, id) cursor instead of OFFSET (see core.keyset).
+
+    Used while the list is in its default newest-first order; sorting by
+    another column falls back to the usual numbered pages. The total shown
+    is an estimate when unfiltered, and is left out when filtered.
+    """
+    keyset_orderings = [('-created_at', '-id'), ('-created_at', '-pk')]
+    
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset_paginated = False
+        super().__init__(request, *args, **kwargs)
+        # Filter, search and sort links start again from the newest page
+        self.params.pop(CURSOR_VAR, None)
+    
+    def get_queryset(self, request, exclude_parameters=None):
+        # Large columns the list never shows (list_defer on the ModelAdmin)
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer(*self.model_admin.list_defer)
+    
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+    
+    def get_results(self, request):
+        # get_ordering() appends the queryset's own ordering, so the default order can appear twice
+        ordering = tuple(dict.fromkeys(self.queryset.query.order_by))
+        if self.show_all or ordering not in self.keyset_orderings:
+            return super().get_results(request)
+        try:
+            result_list, next_cursor, previous_cursor = keyset.paginate(self.queryset, self.cursor, self.list_per_page)
+        except keyset.InvalidCursor:
+            raise IncorrectLookupParameters
+        estimate = None if self.queryset.query.has_filters() else keyset.approximate_count(self.model)
+        
+        self.keyset_paginated = True
+        self.result_count = estimate if estimate is not None else len(result_list)
+        self.result_count_estimated = estimate is not None
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = bool(next_cursor or previous_cursor)
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.next_url = self.get_query_string({CURSOR_VAR: next_cursor}) if next_cursor else None
+        self.previous_url = self.get_query_string({CURSOR_VAR: previous_cursor}) if previous_cursor else None
+        self.first_url = self.get_query_string(remove=[CURSOR_VAR])
+
+class KeysetPaginationMixin:
+    """Newest-first admin list paged by cursor, for tables too large to count or OFFSET through.
+
+    There is no date_hierarchy on these lists: it reads the distinct years of
+    the whole table on every page. Use the created_at filter instead.
+    """
+    change_list_template = 'admin/keyset_change_list.html'
+    ordering = ['-created_at', '-id']
+    show_full_result_count = False
+    list_defer = []
+    
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
 
+class PaymentLogInlineFormSet(BaseInlineFormSet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            # Only the latest logs, without their payloads, so the page costs the same however many
+            # logs the order has; older logs and payloads are loaded on demand (see change_form.html).
+            # Bounded like PaymentLog.objects.for_order, so a partitioned table only reads the order's months.
+            self.queryset = (
+                self.queryset
+                .filter(created_at__gte=self.instance.created_at - ORDER_LOG_MARGIN)
+                .select_related('order')
+                .defer('response_data', 'response_data_compact')
+                .order_by('-created_at', '-id')[:settings.ADMIN_ORDER_LOG_PAGE_SIZE]
+            )
+
 class PaymentLogInline(admin.TabularInline):
     model = PaymentLog
+    formset = PaymentLogInlineFormSet
     extra = 0
-    readonly_fields = ['event_type', 'status', 'amount', 'transaction_id', 'created_at', 'response_data']
+    fields = ['event_type', 'status', 'amount', 'transaction_id', 'created_at', 'repeat_count', 'last_seen_at', 'payload_display']
+    readonly_fields = fields
     can_delete = False
     
+    def payload_display(self, obj):
+        return format_html('<a href="{}" class="payment-log-payload">Show</a>', reverse('admin:payment_log_payload', args=[obj.pk]))
+    payload_display.short_description = "Response data"
+    
     def has_add_permission(self, request, obj=None):
         return False
 
@@ -31,14 +137,22 @@ class CustomerAdmin(admin.ModelAdmin):
     list_filter = ['marketing_consent', 'created_at']
     search_fields = ['first_name', 'last_name', 'email', 'phone', 'address', 'city']
     date_hierarchy = 'created_at'
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Served from the search index rather than LIKE '%term%' over every search field (see core.search)
+        if not search_term:
+            return queryset, False
+        return search.search_customers(search_term, queryset), False
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(KeysetPaginationMixin, admin.ModelAdmin):
     list_display = ['reference', 'get_customer_name', 'amount_in_dkk', 'status', 'payment_method', 'payment_status', 'shipping_method', 'created_at']
     list_filter = ['status', 'payment_method', 'shipping_method', 'created_at', 'completed_at']
     search_fields = ['reference', 'customer__first_name', 'customer__last_name', 'customer__email']
     readonly_fields = ['reference', 'callback_token', 'created_at', 'updated_at', 'completed_at', 'payment_actions', 'customer_shipping_info']
-    date_hierarchy = 'created_at'
+    list_select_related = ['customer']
+    # A <select> of every customer would dominate the change page; look them up through CustomerAdmin's search instead
+    autocomplete_fields = ['customer']
     inlines = [OrderItemInline, PaymentLogInline]
     actions = ['capture_payment_action', 'cancel_payment_action', 'refund_payment_action']
     
@@ -60,6 +174,19 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     ]
     
+    def get_queryset(self, request):
+        # The latest payment status for the list, in the same query rather than one log (payload and all) per row
+        latest_log = PaymentLog.objects.filter(
+            order=OuterRef('pk'), created_at__gte=OuterRef('created_at') - ORDER_LOG_MARGIN,
+        ).order_by('-created_at', '-id')
+        return super().get_queryset(request).annotate(latest_payment_status=Subquery(latest_log.values('status')[:1]))
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Matches the reference or anything in the customer's details, from the search index (see core.search)
+        if not search_term:
+            return queryset, False
+        return search.search_orders(search_term, queryset), False
+    
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
@@ -83,23 +210,81 @@ class OrderAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.view_transaction_details_view),
                 name='view_transaction_details',
             ),
+            path(
+                'payment/<int:order_id>/logs/',
+                self.admin_site.admin_view(self.payment_logs_view),
+                name='order_payment_logs',
+            ),
+            path(
+                'payment/logs/<int:log_id>/payload/',
+                self.admin_site.admin_view(self.payment_log_payload_view),
+                name='payment_log_payload',
+            ),
         ]
         return custom_urls + urls
     
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = {**(extra_context or {}), 'payment_log_page_size': settings.ADMIN_ORDER_LOG_PAGE_SIZE}
+        return super().change_view(request, object_id, form_url, extra_context)
+    
+    def payment_logs_view(self, request, order_id):
+        """JSON page of an order's payment logs older than ``before`` (a log id), newest first, without payloads"""
+        order = get_object_or_404(Order, id=order_id)
+        if not self.has_view_permission(request, order):
+            raise PermissionDenied
+        
+        logs = (
+            PaymentLog.objects.for_order(order)
+            .defer('response_data', 'response_data_compact')
+            .order_by('-created_at', '-id')
+        )
+        before = request.GET.get('before')
+        if before:
+            # Keyset pagination: each page costs the same however far back it is
+            cursor = get_object_or_404(logs.only('id', 'created_at'), id=before)
+            logs = logs.filter(Q(created_at__lt=cursor.created_at) | Q(created_at=cursor.created_at, id__lt=cursor.id))
+        
+        page_size = settings.ADMIN_ORDER_LOG_PAGE_SIZE
+        page = list(logs[:page_size + 1])
+        fields = [name for name in PaymentLogInline.fields if name != 'payload_display']
+        rows = []
+        for log in page[:page_size]:
+            log.order = order
+            rows.append({
+                'id': log.pk,
+                'label': str(log),
+                'cells': [
+                    [name, str(display_for_field(getattr(log, name), PaymentLog._meta.get_field(name), self.get_empty_value_display()))]
+                    for name in fields
+                ],
+                'payload_url': reverse('admin:payment_log_payload', args=[log.pk]),
+            })
+        return JsonResponse({'logs': rows, 'has_more': len(page) > page_size})
+    
+    def payment_log_payload_view(self, request, log_id):
+        """JSON with one payment log's response data, decoded if it is stored compacted"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        log = get_object_or_404(
+            PaymentLog.objects.only('response_data', 'response_data_compact', 'payload_dictionary'),
+            id=log_id,
+        )
+        return JsonResponse({'payload': log.payload})
+    
     def capture_payment_view(self, request, order_id):
         """View for capturing payment from admin interface"""
         order = get_object_or_404(Order, id=order_id)
         
         try:
             # Get the latest payment log
-            latest_log = order.payment_logs.order_by('-created_at').first()
+            latest_log = PaymentLog.objects.for_order(order).order_by('-created_at').first()
             
             if latest_log and latest_log.status == 'AUTHORIZED':
                 # Capture the payment
                 response = api.capture_payment(order.reference, amount=order.amount)
                 
                 # Log the capture event
-                PaymentLog.objects.create(
+                log_payment_event(
                     order=order,
                     transaction_id=latest_log.transaction_id,
                     event_type='CAPTURE',
@@ -109,8 +294,7 @@ class OrderAdmin(admin.ModelAdmin):
                 )
                 
                 # Update order status
-                order.status = 'PAYMENT_CONFIRMED'
-                order.save()
+                transition_order(order, 'PAYMENT_CONFIRMED')
                 
                 self.message_user(request, f"Payment for order {order.reference} successfully captured", level=messages.SUCCESS)
             else:
@@ -133,14 +317,14 @@ class OrderAdmin(admin.ModelAdmin):
         
         try:
             # Get the latest payment log
-            latest_log = order.payment_logs.order_by('-created_at').first()
+            latest_log = PaymentLog.objects.for_order(order).order_by('-created_at').first()
             
             if latest_log and latest_log.status == 'AUTHORIZED':
                 # Cancel the payment
                 response = api.cancel_payment(order.reference)
                 
                 # Log the cancel event
-                PaymentLog.objects.create(
+                log_payment_event(
                     order=order,
                     transaction_id=latest_log.transaction_id,
                     event_type='CANCEL',
@@ -150,8 +334,7 @@ class OrderAdmin(admin.ModelAdmin):
                 )
                 
                 # Update order status
-                order.status = 'SESSION_CANCELLED'
-                order.save()
+                transition_order(order, 'SESSION_CANCELLED')
                 
                 self.message_user(request, f"Payment for order {order.reference} successfully cancelled", level=messages.SUCCESS)
             else:
@@ -174,14 +357,14 @@ class OrderAdmin(admin.ModelAdmin):
         
         try:
             # Get the latest payment log
-            latest_log = order.payment_logs.order_by('-created_at').first()
+            latest_log = PaymentLog.objects.for_order(order).order_by('-created_at').first()
             
             if latest_log and latest_log.status == 'CAPTURED':
                 # Refund the payment
                 response = api.refund_payment(order.reference, amount=order.amount)
                 
                 # Log the refund event
-                PaymentLog.objects.create(
+                log_payment_event(
                     order=order,
                     transaction_id=latest_log.transaction_id,
                     event_type='REFUND',
@@ -191,8 +374,7 @@ class OrderAdmin(admin.ModelAdmin):
                 )
                 
                 # Update order status
-                order.status = 'REFUNDED'
-                order.save()
+                transition_order(order, 'REFUNDED')
                 
                 self.message_user(request, f"Payment for order {order.reference} successfully refunded", level=messages.SUCCESS)
             else:
@@ -257,25 +439,19 @@ class OrderAdmin(admin.ModelAdmin):
     amount_in_dkk.short_description = "Amount"
     
     def payment_status(self, obj):
-        try:
-            # Get the latest payment log
-            latest_log = obj.payment_logs.order_by('-created_at').first()
-            if latest_log:
-                status = latest_log.status
-                if status == 'AUTHORIZED':
-                    return format_html('<span style="color: green;">{}</span>', status)
-                elif status in ['CANCELLED', 'FAILED']:
-                    return format_html('<span style="color: red;">{}</span>', status)
-                return status
-            return "Unknown"
-        except Exception as e:
-            return f"Error: {str(e)}"
+        # Annotated by get_queryset
+        status = obj.latest_payment_status
+        if status == 'AUTHORIZED':
+            return format_html('<span style="color: green;">{}</span>', status)
+        elif status in ['CANCELLED', 'FAILED']:
+            return format_html('<span style="color: red;">{}</span>', status)
+        return status or "Unknown"
     payment_status.short_description = "Payment Status"
     
     def payment_actions(self, obj):
         """Display payment action buttons in the order detail view"""
         # Get the latest payment log to determine available actions
-        latest_log = obj.payment_logs.order_by('-created_at').first()
+        latest_log = PaymentLog.objects.for_order(obj).order_by('-created_at').first()
         if not latest_log:
             return "No payment information available"
         
@@ -327,13 +503,13 @@ class OrderAdmin(admin.ModelAdmin):
         for order in queryset:
             try:
                 # Get the latest payment log to check if it's in AUTHORIZED state
-                latest_log = order.payment_logs.order_by('-created_at').first()
+                latest_log = PaymentLog.objects.for_order(order).order_by('-created_at').first()
                 if latest_log and latest_log.status == 'AUTHORIZED':
                     # Capture the payment
                     response = api.capture_payment(order.reference, amount=order.amount)
                     
                     # Log the capture event
-                    PaymentLog.objects.create(
+                    log_payment_event(
                         order=order,
                         transaction_id=latest_log.transaction_id,
                         event_type='CAPTURE',
@@ -343,8 +519,7 @@ class OrderAdmin(admin.ModelAdmin):
                     )
                     
                     # Update order status
-                    order.status = 'PAYMENT_CONFIRMED'
-                    order.save()
+                    transition_order(order, 'PAYMENT_CONFIRMED')
                     
                     success_count += 1
                 else:
@@ -366,13 +541,13 @@ class OrderAdmin(admin.ModelAdmin):
         for order in queryset:
             try:
                 # Get the latest payment log to check if it's in AUTHORIZED state
-                latest_log = order.payment_logs.order_by('-created_at').first()
+                latest_log = PaymentLog.objects.for_order(order).order_by('-created_at').first()
                 if latest_log and latest_log.status == 'AUTHORIZED':
                     # Cancel the payment
                     response = api.cancel_payment(order.reference)
                     
                     # Log the cancel event
-                    PaymentLog.objects.create(
+                    log_payment_event(
                         order=order,
                         transaction_id=latest_log.transaction_id,
                         event_type='CANCEL',
@@ -382,8 +557,7 @@ class OrderAdmin(admin.ModelAdmin):
                     )
                     
                     # Update order status
-                    order.status = 'SESSION_CANCELLED'
-                    order.save()
+                    transition_order(order, 'SESSION_CANCELLED')
                     
                     success_count += 1
                 else:
@@ -405,13 +579,13 @@ class OrderAdmin(admin.ModelAdmin):
         for order in queryset:
             try:
                 # Get the latest payment log to check if it's in CAPTURED state
-                latest_log = order.payment_logs.order_by('-created_at').first()
+                latest_log = PaymentLog.objects.for_order(order).order_by('-created_at').first()
                 if latest_log and latest_log.status == 'CAPTURED':
                     # Refund the payment
                     response = api.refund_payment(order.reference, amount=order.amount)
                     
                     # Log the refund event
-                    PaymentLog.objects.create(
+                    log_payment_event(
                         order=order,
                         transaction_id=latest_log.transaction_id,
                         event_type='REFUND',
@@ -421,8 +595,7 @@ class OrderAdmin(admin.ModelAdmin):
                     )
                     
                     # Update order status
-                    order.status = 'REFUNDED'
-                    order.save()
+                    transition_order(order, 'REFUNDED')
                     
                     success_count += 1
                 else:
@@ -453,12 +626,26 @@ class OrderItemAdmin(admin.ModelAdmin):
     price_in_dkk.short_description = "Price"
 
 @admin.register(PaymentLog)
-class PaymentLogAdmin(admin.ModelAdmin):
-    list_display = ['order_reference', 'event_type', 'status', 'amount_in_dkk', 'created_at']
+class PaymentLogAdmin(KeysetPaginationMixin, admin.ModelAdmin):
+    list_display = ['order_reference', 'event_type', 'status', 'amount_in_dkk', 'repeat_count', 'created_at']
     list_filter = ['event_type', 'status', 'created_at']
     search_fields = ['order__reference', 'transaction_id']
-    readonly_fields = ['order', 'event_type', 'status', 'amount', 'transaction_id', 'created_at', 'response_data']
-    date_hierarchy = 'created_at'
+    fields = ['order', 'event_type', 'status', 'amount', 'transaction_id', 'created_at', 'repeat_count', 'last_seen_at', 'payload_display']
+    readonly_fields = fields
+    list_select_related = ['order']
+    list_defer = ['response_data', 'response_data_compact']
+    
+    def changelist_view(self, request, extra_context=None):
+        # On a partitioned table, open the list on recent logs so only recent partitions are read
+        # (the created_at filter still reaches older ones)
+        if partitions.is_enabled() and not request.GET and settings.PAYMENT_LOG_ADMIN_DAYS:
+            since = timezone.localdate() - datetime.timedelta(days=settings.PAYMENT_LOG_ADMIN_DAYS)
+            return HttpResponseRedirect(f"{request.path}?created_at__gte={since.isoformat()}")
+        return super().changelist_view(request, extra_context)
+    
+    def payload_display(self, obj):
+        return format_payload(obj)
+    payload_display.short_description = "Response data"
     
     def order_reference(self, obj):
         return obj.order.reference
@@ -472,3 +659,68 @@ class PaymentLogAdmin(admin.ModelAdmin):
     
     def has_add_permission(self, request):
         return False
+
+@admin.register(PaymentLogSummary)
+class PaymentLogSummaryAdmin(admin.ModelAdmin):
+    list_display = ['order_reference', 'log_count', 'last_event_type', 'last_status', 'first_created_at', 'last_created_at', 'archive_file']
+    list_filter = ['last_status', 'archived_at']
+    search_fields = ['order__reference', 'archive_file']
+    readonly_fields = [field.name for field in PaymentLogSummary._meta.fields]
+    
+    def order_reference(self, obj):
+        return obj.order.reference
+    order_reference.short_description = "Order Reference"
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    """Sales dashboard; reads only the precomputed rollup tables"""
+    change_list_template = 'admin/core/dailysalesrollup/change_list.html'
+    list_display = ['date', 'order_count', 'paid_order_count', 'revenue_in_dkk', 'average_basket_in_dkk', 'capture_rate_display', 'refund_rate_display']
+    date_hierarchy = 'date'
+    readonly_fields = [field.name for field in DailySalesRollup._meta.fields]
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            # Redirects and error responses carry no changelist
+            return response
+        
+        bounds = queryset.aggregate(start=Min('date'), end=Max('date'))
+        summary = summarize_rollups(queryset)
+        summary['revenue_in_dkk'] = f"{summary['revenue'] / 100:.2f} DKK"
+        summary['average_basket_in_dkk'] = f"{summary['average_basket'] / 100:.2f} DKK"
+        summary['captured_in_dkk'] = f"{summary['captured_amount'] / 100:.2f} DKK"
+        summary['refunded_in_dkk'] = f"{summary['refunded_amount'] / 100:.2f} DKK"
+        response.context_data['summary'] = summary
+        response.context_data['option_mix'] = summarize_options(bounds['start'], bounds['end']) if bounds['start'] else {}
+        return response
+    
+    def revenue_in_dkk(self, obj):
+        return f"{obj.revenue / 100:.2f} DKK"
+    revenue_in_dkk.short_description = "Revenue"
+    
+    def average_basket_in_dkk(self, obj):
+        return f"{obj.average_basket / 100:.2f} DKK"
+    average_basket_in_dkk.short_description = "Average Basket"
+    
+    def capture_rate_display(self, obj):
+        return f"{obj.capture_rate:.1%}"
+    capture_rate_display.short_description = "Capture Rate"
+    
+    def refund_rate_display(self, obj):
+        return f"{obj.refund_rate:.1%}"
+    refund_rate_display.short_description = "Refund Rate"
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,5 +1,21 @@
 from django.urls import path
+from django.utils.module_loading import import_string
+
+
+def lazy_view(dotted_path):
+    """Route to a view that is only imported on its first request.
+
+    api.views pulls in DRF (and through it requests, yaml, ...), which would
+    otherwise be imported by every worker while loading the URLconf.
+    """
+    def view(request, *args, **kwargs):
+        return import_string(dotted_path)(request, *args, **kwargs)
+    view.__name__ = dotted_path.rsplit('.', 1)[-1]
+    return view
+
 
 urlpatterns = [
-    # Add your API endpoints here
-]
\ No newline at end of file
+    path('analytics/sales/', lazy_view('api.views.sales_rollups'), name='sales_rollups'),
+    path('search/', lazy_view('api.views.search'), name='search'),
+    path('v1/orders/', lazy_view('api.views.orders_v1'), name='orders_v1'),
+]
@@ -1,137 +1,23 @@
 from django.shortcuts import render
-import requests
 import json
-import uuid
-import datetime
 from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from core.models import Order, Customer, OrderItem, PaymentLog
+from django.utils.dateparse import parse_date
+from core.models import Order, Customer, OrderItem, DailySalesRollup
+from core import keyset, search as core_search
+from core.exports import parse_export_filters
+from core.analytics import summarize_rollups, summarize_options
+from core.order_states import transition_order
+from core.payment_log_writer import log_payment_event
+from core.references import new_reference
+from payments import api  # Shared process-wide Vipps MobilePay client, created on first use
 import re
 
-class VippsMobilePayAPI:
-    """Helper class to handle Vipps MobilePay API calls"""
-    
-    # Base URLs
-    TEST_BASE_URL = "https://apitest.vipps.no"
-    PROD_BASE_URL = "https://api.vipps.no"
-    
-    def __init__(self):
-        # Get settings from Django settings
-        self.client_id = settings.VIPPS_CLIENT_ID
-        self.client_secret = settings.VIPPS_CLIENT_SECRET
-        self.subscription_key = settings.VIPPS_SUBSCRIPTION_KEY
-        self.merchant_serial_number = settings.VIPPS_MERCHANT_SERIAL_NUMBER
-        self.is_test = getattr(settings, 'VIPPS_TEST_MODE', True)
-        
-        # System headers
-        self.system_name = "MemorybearWebapp"
-        self.system_version = "1.0.0"
-        self.plugin_name = "MemorybearCheckout"
-        self.plugin_version = "1.0.0"
-        
-    @property
-    def base_url(self):
-        return self.TEST_BASE_URL if self.is_test else self.PROD_BASE_URL
-    
-    def get_headers(self):
-        """Return common headers for API requests"""
-        return {
-            "Content-Type": "application/json",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "Ocp-Apim-Subscription-Key": self.subscription_key,
-            "Merchant-Serial-Number": self.merchant_serial_number,
-            "Vipps-System-Name": self.system_name,
-            "Vipps-System-Version": self.system_version,
-            "Vipps-System-Plugin-Name": self.plugin_name,
-            "Vipps-System-Plugin-Version": self.plugin_version
-        }
-    
-    def create_checkout_session(self, amount, currency, reference, description, callback_url, return_url):
-        """Create a checkout session with Vipps MobilePay"""
-        url = f"{self.base_url}/checkout/v3/session"
-        
-        # Generate a unique authorization token for callbacks
-        callback_token = str(uuid.uuid4())
-        
-        payload = {
-            "merchantInfo": {
-                "callbackUrl": callback_url,
-                "returnUrl": return_url,
-                "callbackAuthorizationToken": callback_token
-            },
-            "transaction": {
-                "amount": {
-                    "value": amount,
-                    "currency": currency
-                },
-                "reference": reference,
-                "paymentDescription": description
-            }
-        }
-        
-        response = requests.post(url, headers=self.get_headers(), json=payload)
-        return response.json(), callback_token
-    
-    def get_session_details(self, reference):
-        """Get details of a checkout session"""
-        url = f"{self.base_url}/checkout/v3/session/{reference}"
-        response = requests.get(url, headers=self.get_headers())
-        return response.json()
-
-    def get_payment_details(self, reference):
-        """Get payment details from ePayment API"""
-        url = f"{self.base_url}/epayment/v1/{reference}"
-        response = requests.get(url, headers=self.get_headers())
-        return response.json()
-    
-    def cancel_payment(self, reference):
-        """Cancel a payment"""
-        url = f"{self.base_url}/epayment/v1/{reference}/cancel"
-        response = requests.post(url, headers=self.get_headers(), json={})
-        return response.json()
-    
-    def capture_payment(self, reference, amount=None, description=None):
-        """Capture a payment, either partially or fully"""
-        url = f"{self.base_url}/epayment/v1/{reference}/capture"
-        payload = {}
-        
-        if amount is not None:
-            payload["modificationAmount"] = {
-                "value": amount,
-                "currency": "NOK"  # You might want to make this dynamic
-            }
-            
-        if description is not None:
-            payload["description"] = description
-            
-        response = requests.post(url, headers=self.get_headers(), json=payload)
-        return response.json()
-    
-    def refund_payment(self, reference, amount=None, description=None):
-        """Refund a payment, either partially or fully"""
-        url = f"{self.base_url}/epayment/v1/{reference}/refund"
-        payload = {}
-        
-        if amount is not None:
-            payload["modificationAmount"] = {
-                "value": amount,
-                "currency": "NOK"  # You might want to make this dynamic
-            }
-            
-        if description is not None:
-            payload["description"] = description
-            
-        response = requests.post(url, headers=self.get_headers(), json=payload)
-        return response.json()
-
-# Initialize the API helper
-api = VippsMobilePayAPI()
-
 @api_view(['POST'])
 def create_checkout(request):
     """Create a checkout session and return the session token"""
@@ -147,15 +33,15 @@ def create_checkout(request):
                 status=400
             )
 
-        # Create a unique reference for this order
-        reference = data.get('reference', f"order-{uuid.uuid4().hex[:8]}")
+        # The backend always allocates the reference; client-supplied ones could collide
+        reference = new_reference()
         
         # Check if customer data is provided
         customer = None
         customer_data = data.get('customer', {})
         if customer_data and customer_data.get('email'):
             # Create or update customer
-            customer, created = Customer.objects.update_or_create(
+            customer, created = Customer.objects.update_or_create_if_changed(
                 email=customer_data.get('email'),
                 defaults={
                     'first_name': customer_data.get('firstName', ''),
@@ -212,7 +98,7 @@ def create_checkout(request):
             )
         
         # Log payment event
-        PaymentLog.objects.create(
+        log_payment_event(
             order=order,
             event_type='CHECKOUT_CREATED',
             status='CREATED',
@@ -262,30 +148,29 @@ def callback_handler(request):
             transaction_status = data.get('transactionStatus', {}).get('status')
             session_state = data.get('sessionState')
             
+            new_status = None
             if transaction_status:
                 if transaction_status == 'AUTHORIZED':
-                    order.status = 'PAYMENT_CONFIRMED'
+                    new_status = 'PAYMENT_CONFIRMED'
                 elif transaction_status == 'FAILED' or transaction_status == 'CANCELLED':
-                    order.status = 'PAYMENT_FAILED'
+                    new_status = 'PAYMENT_FAILED'
                 else:
-                    order.status = transaction_status
+                    new_status = transaction_status
                     
             elif session_state:
                 if session_state == 'SessionCompleted':
-                    order.status = 'SESSION_COMPLETED'
+                    new_status = 'SESSION_COMPLETED'
                 elif session_state == 'SessionFailed':
-                    order.status = 'SESSION_FAILED'
+                    new_status = 'SESSION_FAILED'
                 elif session_state == 'SessionCancelled':
-                    order.status = 'SESSION_CANCELLED'
+                    new_status = 'SESSION_CANCELLED'
                     
-            # Update order completed_at timestamp if payment confirmed
-            if order.status == 'PAYMENT_CONFIRMED':
-                order.completed_at = datetime.datetime.now()
-                
-            order.save()
+            # Only allowed transitions are applied; completed_at is set once payment is confirmed
+            if new_status:
+                transition_order(order, new_status, completed=new_status == 'PAYMENT_CONFIRMED')
             
             # Log the callback data
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='CALLBACK_RECEIVED',
                 status=order.status,
@@ -368,7 +253,7 @@ def create_customer(request):
             )
 
         # Create or update customer
-        customer, created = Customer.objects.update_or_create(
+        customer, created = Customer.objects.update_or_create_if_changed(
             email=data['email'],
             defaults={
                 'first_name': data['first_name'],
@@ -403,3 +288,145 @@ def health_check(request):
         "status": "healthy",
         "message": "API is running"
     })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_rollups(request):
+    """
+    Daily sales figures read from the precomputed rollup tables.
+    Optional query parameters: from, to (YYYY-MM-DD, inclusive).
+    """
+    raw_start = request.query_params.get('from')
+    raw_end = request.query_params.get('to')
+    try:
+        start = parse_date(raw_start) if raw_start else None
+        end = parse_date(raw_end) if raw_end else None
+    except ValueError:
+        start = end = False
+    if (raw_start and not start) or (raw_end and not end):
+        return Response({'error': 'Invalid date, use YYYY-MM-DD'}, status=400)
+    
+    queryset = DailySalesRollup.objects.all()
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    
+    days = [
+        {
+            'date': rollup.date,
+            'order_count': rollup.order_count,
+            'paid_order_count': rollup.paid_order_count,
+            'revenue': rollup.revenue,
+            'average_basket': rollup.average_basket,
+            'item_count': rollup.item_count,
+            'captured_amount': rollup.captured_amount,
+            'refunded_amount': rollup.refunded_amount,
+            'capture_rate': rollup.capture_rate,
+            'refund_rate': rollup.refund_rate,
+        }
+        for rollup in queryset
+    ]
+    
+    return Response({
+        'from': start,
+        'to': end,
+        'summary': summarize_rollups(queryset),
+        'options': summarize_options(start, end),
+        'days': days,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search(request):
+    """
+    Customers and orders matching a support search, from the search index (see core.search).
+    Query parameters: q (name, email, phone, address, city or order reference), limit (default 20, max 100).
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Missing q parameter'}, status=400)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'Invalid limit'}, status=400)
+    
+    customers = core_search.search_customers(query).order_by('-created_at')[:limit]
+    orders = core_search.search_orders(query).select_related('customer').order_by('-created_at')[:limit]
+    
+    return Response({
+        'query': query,
+        'customers': [
+            {
+                'id': customer.id,
+                'first_name': customer.first_name,
+                'last_name': customer.last_name,
+                'email': customer.email,
+                'phone': customer.phone,
+                'city': customer.city,
+            }
+            for customer in customers
+        ],
+        'orders': [
+            {
+                'id': order.id,
+                'reference': order.reference,
+                'status': order.status,
+                'amount': order.amount,
+                'customer_email': order.customer.email if order.customer else None,
+                'created_at': order.created_at,
+            }
+            for order in orders
+        ],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def orders_v1(request):
+    """
+    Orders, newest first, one page at a time (keyset pagination, see core.keyset).
+    Query parameters: cursor (next_cursor or previous_cursor of another page), limit (default 50, max 200),
+    from, to (YYYY-MM-DD or ISO datetime, to is inclusive for dates), status (comma-separated).
+    """
+    try:
+        filters = parse_export_filters(
+            date_from=request.query_params.get('from'),
+            date_to=request.query_params.get('to'),
+            status=request.query_params.get('status'),
+        )
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 200)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    
+    queryset = Order.objects.select_related('customer')
+    if filters['statuses']:
+        queryset = queryset.filter(status__in=filters['statuses'])
+    if filters['created_from']:
+        queryset = queryset.filter(created_at__gte=filters['created_from'])
+    if filters['created_before']:
+        queryset = queryset.filter(created_at__lt=filters['created_before'])
+    
+    try:
+        orders, next_cursor, previous_cursor = keyset.paginate(queryset, request.query_params.get('cursor'), limit)
+    except keyset.InvalidCursor as e:
+        return Response({'error': str(e)}, status=400)
+    
+    return Response({
+        'next_cursor': next_cursor,
+        'previous_cursor': previous_cursor,
+        'results': [
+            {
+                'id': order.id,
+                'reference': order.reference,
+                'status': order.status,
+                'amount': order.amount,
+                'currency': order.currency,
+                'payment_method': order.payment_method,
+                'shipping_method': order.shipping_method,
+                'customer_email': order.customer.email if order.customer else None,
+                'created_at': order.created_at,
+                'completed_at': order.completed_at,
+            }
+            for order in orders
+        ],
+    })
@@ -0,0 +1,247 @@
+"""Incremental sales rollups.
+
+Orders are attributed to the day they were created. A refresh only
+recomputes the days that have orders or payment logs written since the
+previous refresh, so its cost follows recent activity rather than the size
+of the order history.
+
+Rows are found by their created_at/updated_at, which are stamped before
+the rows commit: buffered payment logs wait up to PAYMENT_LOG_FLUSH_INTERVAL
+seconds, and a checkout request can run for IDEMPOTENCY_LOCK_TIMEOUT
+seconds. A refresh therefore looks back ``refresh_margin()`` before the
+previous one, so rows that committed after it read them are not missed.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    CAPTURE_EVENT_TYPES,
+    ORDER_LOG_MARGIN,
+    PAID_STATUSES,
+    REFUND_EVENT_TYPES,
+    DailyOptionRollup,
+    DailySalesRollup,
+    Order,
+    OrderItem,
+    PaymentLog,
+    PaymentLogSummary,
+)
+
+ROLLUP_OPTION_FIELDS = [option for option, _ in DailyOptionRollup.OPTION_CHOICES]
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def _created_range(days, prefix=''):
+    """Filter on the created_at range spanning ``days`` so the index applies"""
+    start, _ = _day_bounds(min(days))
+    _, end = _day_bounds(max(days))
+    return Q(**{f'{prefix}created_at__gte': start, f'{prefix}created_at__lt': end})
+
+
+def refresh_margin():
+    """How long before the previous refresh a refresh looks for changes"""
+    seconds = settings.PAYMENT_LOG_FLUSH_INTERVAL + settings.IDEMPOTENCY_LOCK_TIMEOUT
+    return datetime.timedelta(seconds=max(seconds, 300))
+
+
+def get_last_refresh():
+    """Return when the rollups were last refreshed, or None if never"""
+    return DailySalesRollup.objects.aggregate(last=Max('refreshed_at'))['last']
+
+
+def find_stale_days(since):
+    """Return the order days touched by orders or payment logs written after ``since``"""
+    order_days = (
+        Order.objects.filter(updated_at__gte=since)
+        .annotate(day=TruncDate('created_at'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+    log_days = (
+        PaymentLog.objects.filter(created_at__gte=since)
+        .annotate(day=TruncDate('order__created_at'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+    return set(order_days) | set(log_days)
+
+
+def find_all_days():
+    return set(
+        Order.objects.annotate(day=TruncDate('created_at'))
+        .values_list('day', flat=True)
+        .distinct()
+    )
+
+
+def compute_day_rollups(days, refreshed_at):
+    """Compute unsaved rollup rows for ``days`` with a handful of grouped queries"""
+    days = set(days)
+    paid = Q(status__in=PAID_STATUSES)
+
+    sales = {
+        day: DailySalesRollup(date=day, refreshed_at=refreshed_at)
+        for day in days
+    }
+
+    order_rows = (
+        Order.objects.filter(_created_range(days))
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(
+            order_count=Count('id'),
+            paid_order_count=Count('id', filter=paid),
+            revenue=Sum('amount', filter=paid),
+        )
+        .order_by()
+    )
+    for row in order_rows:
+        rollup = sales.get(row['day'])
+        if rollup:
+            rollup.order_count = row['order_count']
+            rollup.paid_order_count = row['paid_order_count']
+            rollup.revenue = row['revenue'] or 0
+
+    # Logs come after their order, so this bound lets PostgreSQL skip older PaymentLog partitions
+    logs_from = _day_bounds(min(days))[0] - ORDER_LOG_MARGIN
+    for event_types, count_field, amount_field in [
+        (CAPTURE_EVENT_TYPES, 'captured_order_count', 'captured_amount'),
+        (REFUND_EVENT_TYPES, 'refunded_order_count', 'refunded_amount'),
+    ]:
+        log_rows = (
+            PaymentLog.objects.filter(_created_range(days, prefix='order__'), event_type__in=event_types,
+                                      created_at__gte=logs_from)
+            .annotate(day=TruncDate('order__created_at'))
+            .values('day')
+            .annotate(orders=Count('order', distinct=True), total=Sum('amount'))
+            .order_by()
+        )
+        for row in log_rows:
+            rollup = sales.get(row['day'])
+            if rollup:
+                setattr(rollup, count_field, row['orders'])
+                setattr(rollup, amount_field, row['total'] or 0)
+
+        # Logs archived by core.retention are gone from PaymentLog; their amounts live on in the summaries.
+        # An order with both is only counted once, with its live logs above.
+        live_logs = PaymentLog.objects.filter(order=OuterRef('order'), event_type__in=event_types)
+        summary_rows = (
+            PaymentLogSummary.objects.filter(_created_range(days, prefix='order__'), **{f'{amount_field}__gt': 0})
+            .annotate(day=TruncDate('order__created_at'), live=Exists(live_logs))
+            .values('day')
+            .annotate(orders=Count('order', distinct=True, filter=Q(live=False)), total=Sum(amount_field))
+            .order_by()
+        )
+        for row in summary_rows:
+            rollup = sales.get(row['day'])
+            if rollup:
+                setattr(rollup, count_field, getattr(rollup, count_field) + row['orders'])
+                setattr(rollup, amount_field, getattr(rollup, amount_field) + (row['total'] or 0))
+
+    items = OrderItem.objects.filter(_created_range(days, prefix='order__'), order__status__in=PAID_STATUSES)
+    # Keyed like the unique constraint: NULL and '' both become 'unknown' and have to share one row
+    options = {}
+    for option in ROLLUP_OPTION_FIELDS:
+        item_rows = (
+            items.annotate(day=TruncDate('order__created_at'))
+            .values('day', option)
+            .annotate(item_count=Count('id'), quantity=Sum('quantity'))
+            .order_by()
+        )
+        for row in item_rows:
+            if row['day'] not in sales:
+                continue
+            value = row[option]
+            if option == 'has_vest':
+                value = 'yes' if value else 'no'
+                # Each item has exactly one has_vest value, so this also totals the day's items
+                sales[row['day']].item_count += row['item_count']
+            key = (row['day'], option, value or 'unknown')
+            rollup = options.get(key)
+            if rollup is None:
+                rollup = options[key] = DailyOptionRollup(date=key[0], option=option, value=key[2])
+            rollup.item_count += row['item_count']
+            rollup.quantity += row['quantity'] or 0
+
+    return list(sales.values()), list(options.values())
+
+
+def refresh_sales_rollups(full=False, since=None):
+    """Recompute the rollups for every day changed since the last refresh.
+
+    ``full`` rebuilds every day; ``since`` overrides the stored watermark
+    (and is used as given, without the margin). Returns the list of days
+    that were recomputed.
+    """
+    started_at = timezone.now()
+
+    if not full and since is None:
+        since = get_last_refresh()
+        if since is not None:
+            since -= refresh_margin()
+    if full or since is None:
+        days = find_all_days()
+    else:
+        days = find_stale_days(since)
+
+    if not days:
+        return []
+
+    sales, options = compute_day_rollups(days, refreshed_at=started_at)
+    with transaction.atomic():
+        DailyOptionRollup.objects.filter(date__in=days).delete()
+        DailySalesRollup.objects.filter(date__in=days).delete()
+        DailySalesRollup.objects.bulk_create(sales)
+        DailyOptionRollup.objects.bulk_create(options)
+    return sorted(days)
+
+
+def summarize_rollups(queryset):
+    """Aggregate a queryset of DailySalesRollup rows into period totals"""
+    totals = queryset.aggregate(
+        order_count=Sum('order_count'),
+        paid_order_count=Sum('paid_order_count'),
+        revenue=Sum('revenue'),
+        item_count=Sum('item_count'),
+        captured_order_count=Sum('captured_order_count'),
+        captured_amount=Sum('captured_amount'),
+        refunded_order_count=Sum('refunded_order_count'),
+        refunded_amount=Sum('refunded_amount'),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    summary = DailySalesRollup(**totals)
+    totals['average_basket'] = summary.average_basket
+    totals['capture_rate'] = summary.capture_rate
+    totals['refund_rate'] = summary.refund_rate
+    return totals
+
+
+def summarize_options(start=None, end=None):
+    """Return the option mix between two dates as {option: [{value, item_count, quantity}]}"""
+    queryset = DailyOptionRollup.objects.all()
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    rows = (
+        queryset.values('option', 'value')
+        .annotate(item_count=Sum('item_count'), quantity=Sum('quantity'))
+        .order_by('option', '-item_count')
+    )
+    mix = {option: [] for option in ROLLUP_OPTION_FIELDS}
+    for row in rows:
+        mix[row['option']].append({
+            'value': row['value'],
+            'item_count': row['item_count'],
+            'quantity': row['quantity'],
+        })
+    return mix
@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core'
\ No newline at end of file
+    name = 'core'
+
+    def ready(self):
+        from . import payment_log_writer, search
+        payment_log_writer.connect()
+        search.connect()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""Streaming order exports for accounting.
+
+Orders are read with a server-side cursor (``QuerySet.iterator``) and
+written out row by row, so memory use does not depend on how many orders
+are exported.
+"""
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import IntegerField, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import (
+    CAPTURE_EVENT_TYPES,
+    ORDER_LOG_MARGIN,
+    REFUND_EVENT_TYPES,
+    STATUS_CHOICES,
+    Order,
+    OrderItem,
+    PaymentLog,
+    PaymentLogSummary,
+)
+
+EXPORT_FORMATS = ['csv', 'jsonl']
+DEFAULT_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = [
+    'reference', 'created_at', 'completed_at', 'status', 'currency', 'amount',
+    'shipping_method', 'shipping_cost', 'payment_method',
+    'captured_amount', 'refunded_amount',
+    'customer_first_name', 'customer_last_name', 'customer_email', 'customer_phone',
+    'customer_address', 'customer_postal_code', 'customer_city',
+    'item_count', 'items',
+]
+
+ITEM_FIELDS = [
+    'name', 'price', 'quantity', 'fabric_type', 'body_fabric', 'head_fabric',
+    'under_arms_fabric', 'belly_fabric', 'has_vest', 'vest_fabric', 'face_style',
+]
+
+
+def _parse_bound(value, end_of_day=False):
+    """Parse a YYYY-MM-DD date or ISO datetime into an aware datetime"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        if end_of_day:
+            day += datetime.timedelta(days=1)
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_export_filters(date_from=None, date_to=None, status=None):
+    """Validate raw filter values and return keyword arguments for ``export_queryset``.
+
+    ``date_to`` is inclusive when given as a plain date. ``status`` may be a
+    comma-separated list. Raises ValueError on invalid input.
+    """
+    statuses = []
+    if status:
+        statuses = [s.strip().upper() for s in status.split(',') if s.strip()]
+        valid = {choice for choice, _ in STATUS_CHOICES}
+        unknown = [s for s in statuses if s not in valid]
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(unknown)}")
+    return {
+        'created_from': _parse_bound(date_from),
+        'created_before': _parse_bound(date_to, end_of_day=True),
+        'statuses': statuses,
+    }
+
+
+def _event_total(event_types):
+    """Subquery summing PaymentLog amounts of the given event types per order"""
+    totals = (
+        PaymentLog.objects
+        # The created_at bound lets PostgreSQL skip PaymentLog partitions older than the order
+        .filter(order=OuterRef('pk'), event_type__in=event_types,
+                created_at__gte=OuterRef('created_at') - ORDER_LOG_MARGIN)
+        .order_by()
+        .values('order')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def _archived_total(field):
+    """Subquery summing ``field`` of the order's PaymentLogSummary rows (logs moved out by core.retention)"""
+    totals = (
+        PaymentLogSummary.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum(field))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def export_queryset(created_from=None, created_before=None, statuses=None):
+    """Return the orders to export, filtered so the created_at/status indexes apply"""
+    queryset = Order.objects.all()
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if created_from:
+        queryset = queryset.filter(created_at__gte=created_from)
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+    return (
+        queryset
+        .select_related('customer')
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.only('order_id', *ITEM_FIELDS)))
+        .annotate(
+            captured_amount=_event_total(CAPTURE_EVENT_TYPES) + _archived_total('captured_amount'),
+            refunded_amount=_event_total(REFUND_EVENT_TYPES) + _archived_total('refunded_amount'),
+        )
+        .order_by('created_at', 'id')
+    )
+
+
+def iter_order_records(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one plain dict per order, streaming from the database in chunks"""
+    for order in queryset.iterator(chunk_size=chunk_size):
+        customer = order.customer
+        items = [{field: getattr(item, field) for field in ITEM_FIELDS} for item in order.items.all()]
+        yield {
+            'reference': order.reference,
+            'created_at': order.created_at,
+            'completed_at': order.completed_at,
+            'status': order.status,
+            'currency': order.currency,
+            'amount': order.amount,
+            'shipping_method': order.shipping_method,
+            'shipping_cost': order.shipping_cost,
+            'payment_method': order.payment_method,
+            'captured_amount': order.captured_amount,
+            'refunded_amount': order.refunded_amount,
+            'customer': {
+                'first_name': customer.first_name,
+                'last_name': customer.last_name,
+                'email': customer.email,
+                'phone': customer.phone,
+                'address': customer.address,
+                'postal_code': customer.postal_code,
+                'city': customer.city,
+            } if customer else None,
+            'items': items,
+        }
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(records):
+    """Yield CSV lines (header first) for the given order records"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        customer = record['customer'] or {}
+        yield writer.writerow([
+            record['reference'],
+            record['created_at'].isoformat() if record['created_at'] else '',
+            record['completed_at'].isoformat() if record['completed_at'] else '',
+            record['status'],
+            record['currency'],
+            record['amount'],
+            record['shipping_method'],
+            record['shipping_cost'],
+            record['payment_method'],
+            record['captured_amount'],
+            record['refunded_amount'],
+            customer.get('first_name', ''),
+            customer.get('last_name', ''),
+            customer.get('email', ''),
+            customer.get('phone', ''),
+            customer.get('address', ''),
+            customer.get('postal_code', ''),
+            customer.get('city', ''),
+            len(record['items']),
+            json.dumps(record['items'], separators=(',', ':')),
+        ])
+
+
+def iter_jsonl(records):
+    """Yield one JSON document per line for the given order records"""
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n'
+
+
+def iter_export(export_format, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the export of ``queryset`` in the requested format"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    records = iter_order_records(queryset, chunk_size=chunk_size)
+    if export_format == 'csv':
+        return iter_csv(records)
+    return iter_jsonl(records)
@@ -0,0 +1,124 @@
+"""In-memory cache of the HTML pages in the Next.js static export.
+
+Each page is read once (with any .br/.gz produced by compress_frontend)
+and served from memory afterwards. Every FRONTEND_PAGE_CHECK_INTERVAL
+seconds a page's file is stat-ed again, so deploying a new build replaces
+the cached copy without a restart.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+# Page paths look like "customize" or "checkout/complete"; anything else is not an export page
+_PAGE_PATH = re.compile(r'^[A-Za-z0-9_-]+(?:/[A-Za-z0-9_-]+)*$')
+
+
+class Page:
+    """One exported HTML page, its precompressed variants and validators"""
+
+    def __init__(self, path, stat_key, body, encoded, last_modified):
+        self.path = path
+        self.stat_key = stat_key
+        self.body = body
+        # Content-Encoding -> bytes, preferred encoding first
+        self.encoded = encoded
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+        self.last_modified = last_modified
+        self.checked_at = time.monotonic()
+
+    def negotiate(self, accept_encoding):
+        """Return (body, Content-Encoding or None) for a request's Accept-Encoding header"""
+        qualities = parse_accept_encoding(accept_encoding)
+        for encoding, encoded in self.encoded.items():
+            if qualities.get(encoding, qualities.get('*', 0)) > 0:
+                return encoded, encoding
+        return self.body, None
+
+
+def parse_accept_encoding(header):
+    """Map each coding in an Accept-Encoding header to its q-value; "gzip;q=0" means not gzip"""
+    qualities = {}
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _load(path, stat_key):
+    body = _read(path)
+    encoded = {}
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        compressed_path = path + suffix
+        # Ignore variants left over from an older build
+        if os.path.exists(compressed_path) and os.stat(compressed_path).st_mtime_ns >= stat_key[0]:
+            encoded[encoding] = _read(compressed_path)
+    return Page(path, stat_key, body, encoded, stat_key[0] / 1e9)
+
+
+def _page_file(name):
+    if name in ('', 'index'):
+        return os.path.join(settings.FRONTEND_BUILD_DIR, 'index.html')
+    if not _PAGE_PATH.match(name):
+        return None
+    return os.path.join(settings.FRONTEND_BUILD_DIR, f"{name}.html")
+
+
+_lock = threading.Lock()
+_pages = {}
+
+
+def get_page(name):
+    """Return the cached Page for an export page name, or None if there is no such page"""
+    page = _pages.get(name)
+    interval = getattr(settings, 'FRONTEND_PAGE_CHECK_INTERVAL', 2)
+    if page is not None and time.monotonic() - page.checked_at < interval:
+        return page
+
+    path = _page_file(name)
+    if path is None:
+        return None
+    try:
+        stat_key = _stat_key(path)
+    except OSError:
+        _pages.pop(name, None)
+        return None
+
+    with _lock:
+        page = _pages.get(name)
+        if page is not None and page.stat_key == stat_key:
+            page.checked_at = time.monotonic()
+            return page
+        page = _load(path, stat_key)
+        _pages[name] = page
+        return page
+
+
+def clear_pages():
+    """Drop every cached page, e.g. right after a frontend build"""
+    with _lock:
+        _pages.clear()
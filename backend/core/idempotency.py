@@ -0,0 +1,151 @@
+"""Inbound Idempotency-Key support for endpoints that create things.
+
+A client that sends an ``Idempotency-Key`` header gets the same response
+for every retry with that key: the first request runs the view and its
+response is stored as an IdempotencyResponse row for IDEMPOTENCY_KEY_TTL
+seconds, later ones replay it. While the first request is still running,
+retries wait for it (up to IDEMPOTENCY_WAIT seconds) instead of creating
+a second order and Vipps payment.
+
+Both the responses and the "running" lock live in the database, not a
+cache, so nothing can evict a response before its TTL is up. The lock's
+unique key makes taking it atomic on every database. Each request
+releases only its own IdempotencyLock row, so a request that outlived
+IDEMPOTENCY_LOCK_TIMEOUT cannot free a lock that another request has taken
+over since. Waiting requests only read; expired rows are deleted by the
+requests that store a new response.
+
+Server errors (5xx) are not stored, so a retry after a failed gateway call
+runs again. Reusing a key with a different request body is rejected with
+422.
+"""
+import datetime
+import functools
+import hashlib
+import re
+import secrets
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyLock, IdempotencyResponse
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+_KEY = re.compile(r'^[\x21-\x7e]{1,255}$')
+# How often a waiting request looks for the first request's response
+_POLL_INTERVAL = 0.05  # seconds
+
+
+def _stored(key):
+    return IdempotencyResponse.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return JsonResponse({
+            'success': False,
+            'error': f'{HEADER} was already used for a different request',
+        }, status=422)
+    response = HttpResponse(bytes(stored.content), status=stored.status, content_type=stored.content_type)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _store(key, fingerprint, response):
+    if response.status_code >= 500 or response.streaming:
+        return
+    now = timezone.now()
+    # Responses past their TTL (this key's included) and locks left behind by requests that died
+    IdempotencyResponse.objects.filter(expires_at__lte=now).delete()
+    IdempotencyLock.objects.filter(expires_at__lte=now).delete()
+    IdempotencyResponse.objects.create(
+        key=key,
+        fingerprint=fingerprint,
+        status=response.status_code,
+        content=response.content,
+        content_type=response.get('Content-Type'),
+        expires_at=now + datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    )
+
+
+def _create_lock(key, token, now):
+    try:
+        with transaction.atomic():
+            IdempotencyLock.objects.create(
+                key=key, token=token,
+                expires_at=now + datetime.timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def acquire_lock(key):
+    """Take the lock for ``key``; returns a token for ``release_lock``, or None if it is held"""
+    now = timezone.now()
+    locks = IdempotencyLock.objects.filter(key=key)
+    # Waiting requests only read, so polling does not compete with checkouts for SQLite's write lock
+    if locks.filter(expires_at__gt=now).exists():
+        return None
+    token = secrets.token_hex(16)
+    if _create_lock(key, token, now):
+        return token
+    # The holder died or ran past its timeout; take its lock over
+    if locks.filter(expires_at__lte=now).delete()[0] and _create_lock(key, token, now):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    IdempotencyLock.objects.filter(key=key, token=token).delete()
+
+
+def idempotent(view):
+    """Make a POST view safe to retry with the same Idempotency-Key"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not _KEY.match(key):
+            return JsonResponse({'success': False, 'error': f'Invalid {HEADER} header'}, status=400)
+
+        # Keys are scoped to the endpoint, so one key cannot replay another endpoint's response
+        digest = hashlib.sha256(f"{request.path}\n{key}".encode('utf-8')).hexdigest()
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        # Wait while another request with this key is running
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while True:
+            stored = _stored(digest)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            token = acquire_lock(digest)
+            if token is not None:
+                break
+            if time.monotonic() >= deadline:
+                response = JsonResponse({
+                    'success': False,
+                    'error': f'A request with this {HEADER} is still being processed',
+                }, status=409)
+                response['Retry-After'] = '1'
+                return response
+            time.sleep(_POLL_INTERVAL)
+
+        try:
+            # The first request may have finished between the lookup and taking the lock
+            stored = _stored(digest)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            response = view(request, *args, **kwargs)
+            _store(digest, fingerprint, response)
+            return response
+        finally:
+            release_lock(digest, token)
+
+    return wrapper
@@ -0,0 +1,101 @@
+"""Keyset (cursor) pagination for newest-first lists of orders and payment logs.
+
+OFFSET pagination reads and throws away every row before the page, so page
+10,000 costs 10,000 pages' worth of work, and it needs a COUNT(*) to draw
+the page links. Here a page continues from the (created_at, id) of the
+last row shown instead:
+
+    WHERE created_at < :created_at OR (created_at = :created_at AND id < :id)
+    ORDER BY created_at DESC, id DESC LIMIT :page_size
+
+That is a range scan on the created_at index, so every page costs the same
+as the first. The position is passed around as an opaque cursor. Totals
+come from ``approximate_count``, which reads planner statistics instead of
+counting.
+"""
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT, PREVIOUS = 'next', 'prev'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(obj, direction=NEXT):
+    """Cursor for the page after (NEXT) or before (PREVIOUS) ``obj``"""
+    token = json.dumps([direction, obj.created_at.isoformat(), obj.pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, created_at, pk) from a cursor; raises InvalidCursor"""
+    try:
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, created_at, pk = json.loads(token)
+        created_at = parse_datetime(created_at)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    if direction not in (NEXT, PREVIOUS) or created_at is None or type(pk) is not int:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return direction, created_at, pk
+
+
+def paginate(queryset, cursor=None, limit=50):
+    """Return (objects, next_cursor, previous_cursor) for one page of ``queryset``, newest first.
+
+    The cursors are None when there is no older or newer page.
+    """
+    direction = NEXT
+    if cursor:
+        direction, created_at, pk = decode_cursor(cursor)
+        if direction == NEXT:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk), created_at__lte=created_at,
+            )
+        else:
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk), created_at__gte=created_at,
+            )
+
+    # Going back, read the newer rows oldest first and flip them
+    ordering = ('-created_at', '-pk') if direction == NEXT else ('created_at', 'pk')
+    objects = list(queryset.order_by(*ordering)[:limit + 1])
+    more = len(objects) > limit
+    objects = objects[:limit]
+    if direction == PREVIOUS:
+        objects.reverse()
+
+    # The page we came from is always there in the other direction
+    has_older = more if direction == NEXT else bool(cursor)
+    has_newer = bool(cursor) if direction == NEXT else more
+    next_cursor = encode_cursor(objects[-1], NEXT) if objects and has_older else None
+    previous_cursor = encode_cursor(objects[0], PREVIOUS) if objects and has_newer else None
+    return objects, next_cursor, previous_cursor
+
+
+def approximate_count(model):
+    """Estimate the rows in ``model``'s table without counting them; None if there is no estimate"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # A partitioned table has no statistics of its own, so its partitions are added up.
+            # reltuples is -1 for tables that were never analyzed.
+            cursor.execute(
+                "SELECT sum(greatest(c.reltuples, 0))::bigint, bool_or(c.reltuples >= 0) FROM pg_class c "
+                "WHERE c.oid = %s::regclass OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                [table, table],
+            )
+            estimate, analyzed = cursor.fetchone()
+            return estimate if analyzed else None
+        if connection.vendor == 'sqlite':
+            # The id range, which overestimates by the rows deleted from it (e.g. archived logs)
+            cursor.execute(f"SELECT max(id) - min(id) + 1 FROM {connection.ops.quote_name(table)}")
+            return cursor.fetchone()[0] or 0
+    return None
@@ -0,0 +1,109 @@
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core import payload_codec
+from core.models import PaymentLog
+from core.sample_payloads import payment_log_corpus
+
+
+class Command(BaseCommand):
+    help = ('Compares table size, insert cost and read latency of PaymentLog payloads stored as '
+            'plain JSON text versus dictionary-compressed blobs, using scratch SQLite databases')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--reads', type=int, default=5000, help='Random point lookups per variant')
+        parser.add_argument('--source', choices=['auto', 'db', 'synthetic'], default='auto',
+                            help='Take payloads from PaymentLog or generate realistic ones')
+        parser.add_argument('--codec', choices=[codec for codec, _ in payload_codec.CODEC_CHOICES])
+        parser.add_argument('--dictionary-size', type=int, default=payload_codec.DEFAULT_DICTIONARY_SIZE)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        train_rows = max(rows // 5, 200)
+        corpus = self._load_corpus(options['source'], rows + train_rows, options['seed'])
+        training, corpus = corpus[:train_rows], corpus[train_rows:]
+
+        codec_name = options['codec'] or payload_codec.default_codec()
+        try:
+            dictionary = payload_codec.train_dictionary(
+                [payload_codec.encode_json(payload) for payload in training],
+                size=options['dictionary_size'],
+                codec=codec_name,
+            )
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+        with_dictionary = payload_codec.PayloadCodec(codec_name, dictionary)
+        without_dictionary = payload_codec.PayloadCodec(codec_name, b'')
+
+        variants = [
+            ('jsonfield', 'TEXT', json.dumps, json.loads),
+            (f'{codec_name}', 'BLOB', without_dictionary.compress, without_dictionary.decompress),
+            (f'{codec_name}+dict', 'BLOB', with_dictionary.compress, with_dictionary.decompress),
+        ]
+
+        self.stdout.write(f"{len(corpus)} payloads, {codec_name} dictionary of {len(dictionary)} bytes "
+                          f"trained on {len(training)} other payloads")
+        self.stdout.write(f"{'variant':<14}{'table size':>14}{'bytes/row':>11}{'insert us/row':>15}"
+                          f"{'read mean us':>14}{'read p95 us':>13}")
+        with tempfile.TemporaryDirectory() as scratch:
+            for name, column_type, encode, decode in variants:
+                result = self._measure(os.path.join(scratch, f"{name}.sqlite3"), column_type, corpus,
+                                       encode, decode, options['reads'], options['seed'])
+                self.stdout.write(
+                    f"{name:<14}{result['size'] / 1024:>11.0f} KB{result['size'] / len(corpus):>11.0f}"
+                    f"{result['insert_us']:>15.1f}{result['read_mean_us']:>14.1f}{result['read_p95_us']:>13.1f}"
+                )
+
+    def _load_corpus(self, source, count, seed):
+        if source in ('auto', 'db'):
+            logs = PaymentLog.objects.order_by('-id').only(
+                'response_data', 'response_data_compact', 'payload_dictionary'
+            )[:count]
+            payloads = [log.payload for log in logs if log.payload is not None]
+            if len(payloads) >= count or source == 'db':
+                if not payloads:
+                    raise CommandError("No PaymentLog payloads in the database")
+                return payloads
+        return payment_log_corpus(count, seed=seed)
+
+    def _measure(self, path, column_type, corpus, encode, decode, reads, seed):
+        connection = sqlite3.connect(path)
+        try:
+            connection.execute(f"CREATE TABLE payment_log (id INTEGER PRIMARY KEY, response_data {column_type})")
+
+            started = time.perf_counter()
+            for start in range(0, len(corpus), 500):
+                batch = [(encode(payload),) for payload in corpus[start:start + 500]]
+                connection.executemany("INSERT INTO payment_log (response_data) VALUES (?)", batch)
+                connection.commit()
+            insert_seconds = time.perf_counter() - started
+
+            connection.execute("VACUUM")
+            page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+            page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+
+            rng = random.Random(seed)
+            timings = []
+            for _ in range(reads):
+                row_id = rng.randint(1, len(corpus))
+                started = time.perf_counter()
+                value = connection.execute("SELECT response_data FROM payment_log WHERE id = ?", (row_id,)).fetchone()[0]
+                decode(value)
+                timings.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+        timings.sort()
+        return {
+            'size': page_count * page_size,
+            'insert_us': insert_seconds / len(corpus) * 1e6,
+            'read_mean_us': statistics.mean(timings) * 1e6,
+            'read_p95_us': timings[int(len(timings) * 0.95) - 1] * 1e6,
+        }
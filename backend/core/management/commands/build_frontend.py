@@ -0,0 +1,68 @@
+import hashlib
+import os
+import subprocess
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+# Build output and tooling caches that never affect what `npm run build` produces
+IGNORED_DIRS = {'node_modules', '.next', 'out', '.git', '.turbo'}
+BUILD_STAMP = '.build-hash'
+
+
+def frontend_dir():
+    return os.path.join(os.path.dirname(settings.BASE_DIR), 'frontend')
+
+
+def frontend_source_hash(directory):
+    """Hash every frontend input: sources, public assets, lockfile, configs and NEXT_PUBLIC_* env"""
+    digest = hashlib.sha256()
+    for current, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(name for name in dirnames if name not in IGNORED_DIRS)
+        for filename in sorted(filenames):
+            path = os.path.join(current, filename)
+            digest.update(os.path.relpath(path, directory).encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+    for name in sorted(os.environ):
+        if name.startswith('NEXT_PUBLIC_'):
+            digest.update(f"{name}={os.environ[name]}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Builds the Next.js static export and precompresses it, '
+            'skipping the build when no frontend input changed since the last one')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Build even if nothing changed')
+
+    def handle(self, *args, **options):
+        directory = frontend_dir()
+        out_dir = os.path.join(directory, 'out')
+        stamp_path = os.path.join(out_dir, BUILD_STAMP)
+
+        source_hash = frontend_source_hash(directory)
+        if not options['force'] and os.path.isdir(out_dir):
+            try:
+                with open(stamp_path) as f:
+                    if f.read().strip() == source_hash:
+                        self.stdout.write('Frontend unchanged since the last build, reusing out/.')
+                        return
+            except OSError:
+                pass
+
+        self.stdout.write('Building Next.js frontend...')
+        result = subprocess.run(['npm', 'run', 'build'], cwd=directory)
+        if result.returncode != 0:
+            raise CommandError(f"Frontend build failed (exit code {result.returncode})")
+        try:
+            call_command('compress_frontend', root=out_dir, stdout=self.stdout, stderr=self.stderr)
+        except Exception as e:
+            self.stderr.write(self.style.WARNING(f"Could not precompress the frontend build: {e}"))
+        # Written last, so an interrupted build is never mistaken for a finished one
+        with open(stamp_path, 'w') as f:
+            f.write(source_hash)
+        self.stdout.write(self.style.SUCCESS('Frontend build finished.'))
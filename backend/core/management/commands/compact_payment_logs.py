@@ -0,0 +1,44 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.retention import DEFAULT_BATCH_SIZE, archive_old_logs, collapse_status_checks
+
+
+class Command(BaseCommand):
+    help = 'Collapses repeated status-check payment logs and archives old logs to compressed JSONL files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.PAYMENT_LOG_RETENTION_DAYS,
+                            help='Archive logs older than this many days')
+        parser.add_argument('--collapse-after-hours', type=int, default=1,
+                            help='Only collapse status checks older than this many hours')
+        parser.add_argument('--archive-dir', default=settings.PAYMENT_LOG_ARCHIVE_DIR)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to leave room for other writers')
+        parser.add_argument('--full-collapse', action='store_true',
+                            help='Look at every status check again, not just those since the last run')
+        parser.add_argument('--skip-collapse', action='store_true')
+        parser.add_argument('--skip-archive', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['skip_collapse']:
+            removed = collapse_status_checks(
+                older_than=datetime.timedelta(hours=options['collapse_after_hours']),
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+                full=options['full_collapse'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Collapsed {removed} repeated status-check logs"))
+
+        if not options['skip_archive']:
+            archived, path = archive_old_logs(
+                days=options['days'],
+                archive_dir=options['archive_dir'],
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+            )
+            if archived:
+                self.stdout.write(self.style.SUCCESS(f"Archived {archived} logs to {path}"))
+            else:
+                self.stdout.write(f"No logs older than {options['days']} days to archive")
@@ -0,0 +1,52 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core import payload_codec
+from core.models import PaymentLog
+
+
+class Command(BaseCommand):
+    help = 'Trains a shared dictionary on PaymentLog payloads and moves existing payloads into the compact column'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--train', action='store_true', help='Train a new dictionary before compacting')
+        parser.add_argument('--codec', choices=[codec for codec, _ in payload_codec.CODEC_CHOICES])
+        parser.add_argument('--sample-size', type=int, default=5000, help='Payloads to train the dictionary on')
+        parser.add_argument('--dictionary-size', type=int, default=payload_codec.DEFAULT_DICTIONARY_SIZE)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        if options['train']:
+            try:
+                dictionary = payload_codec.train_from_payment_logs(
+                    sample_size=options['sample_size'],
+                    size=options['dictionary_size'],
+                    codec=options['codec'],
+                )
+            except (ValueError, RuntimeError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Trained {dictionary} from {dictionary.sample_count} payloads"))
+
+        payload_codec.reset_active_dictionary()
+        dictionary_id = payload_codec.get_active_dictionary_id()
+        if dictionary_id is None:
+            raise CommandError("No payload dictionary available, run with --train first")
+
+        pending = PaymentLog.objects.filter(response_data__isnull=False, response_data_compact__isnull=True).order_by('id')
+        converted = 0
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).only('id', 'response_data')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for log in batch:
+                log.compact(dictionary_id)
+            with transaction.atomic():
+                PaymentLog.objects.bulk_update(batch, ['response_data', 'response_data_compact', 'payload_dictionary'])
+            converted += len(batch)
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f"Compacted {converted} payment log payloads"))
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from whitenoise.compress import Compressor
+
+MANIFEST_NAME = '.asset-manifest.json'
+COMPRESSED_SUFFIXES = ('.br', '.gz')
+
+
+class Command(BaseCommand):
+    help = ('Precompresses the Next.js export with brotli and gzip so WhiteNoise serves the compressed '
+            'files directly; only files whose content hash changed since the last run are recompressed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', help='Export directory (defaults to FRONTEND_BUILD_DIR)')
+        parser.add_argument('--force', action='store_true', help='Recompress every file')
+
+    def handle(self, *args, **options):
+        root = options['root'] or settings.FRONTEND_BUILD_DIR
+        if not os.path.isdir(root):
+            raise CommandError(f"No frontend build at {root}; run `npm run build` in the frontend first")
+
+        manifest_path = os.path.join(root, MANIFEST_NAME)
+        previous = {} if options['force'] else self._load_manifest(manifest_path)
+        compressor = Compressor(quiet=True)
+        if not compressor.use_brotli:
+            self.stdout.write(self.style.WARNING("Brotli is not installed; writing gzip files only"))
+
+        manifest = {}
+        compressed = skipped = 0
+        for path in self._files(root):
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            entry = {'hash': digest, 'variants': []}
+
+            if compressor.should_compress(path):
+                known = previous.get(name)
+                if known and known['hash'] == digest and all(
+                    os.path.exists(path + suffix) for suffix in known['variants']
+                ):
+                    entry['variants'] = known['variants']
+                    # Keep the variants' mtime in step with a rebuilt but identical source file
+                    stat = os.stat(path)
+                    for suffix in known['variants']:
+                        os.utime(path + suffix, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                    skipped += 1
+                else:
+                    for suffix in COMPRESSED_SUFFIXES:
+                        if os.path.exists(path + suffix):
+                            os.remove(path + suffix)
+                    entry['variants'] = [os.path.splitext(output)[1] for output in compressor.compress(path)]
+                    compressed += 1
+            manifest[name] = entry
+
+        temporary_path = manifest_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temporary_path, manifest_path)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(manifest)} files hashed: {compressed} compressed, {skipped} unchanged"
+        ))
+
+    def _files(self, root):
+        for directory, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if filename.endswith(COMPRESSED_SUFFIXES) or filename.startswith(MANIFEST_NAME):
+                    continue
+                yield os.path.join(directory, filename)
+
+    def _load_manifest(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
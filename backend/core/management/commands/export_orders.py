@@ -0,0 +1,43 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from core.exports import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_queryset, iter_export, parse_export_filters
+
+
+class Command(BaseCommand):
+    help = 'Streams orders with customer, items and captured/refunded totals as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Comma-separated order statuses to include')
+        parser.add_argument('--output', '-o', help='File to write to (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_export_filters(
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+                status=options['status'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        lines = iter_export(options['format'], export_queryset(**filters), chunk_size=options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                count = self._write(lines, output)
+            if options['format'] == 'csv':
+                count -= 1  # header row
+            self.stderr.write(self.style.SUCCESS(f"Exported {count} orders to {options['output']}"))
+        else:
+            self._write(lines, sys.stdout)
+
+    def _write(self, lines, output):
+        count = 0
+        for line in lines:
+            output.write(line)
+            count += 1
+        return count
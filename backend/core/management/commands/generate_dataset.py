@@ -0,0 +1,92 @@
+import datetime
+import multiprocessing
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from core.search import rebuild
+from core.synthetic import MAX_CHUNKS, generate_chunk
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _run_chunk(arguments):
+    try:
+        return generate_chunk(*arguments)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Generates synthetic customers, orders, order items and payment logs for scale testing. '
+            'The same --seed, --customers, --chunk-size, --days and --until always produce the same data')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=365, help='Spread the data over this many days')
+        parser.add_argument('--until', help='Last day of the data (default today); fix it for reproducible runs')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1, help='Processes writing chunks in parallel (not on SQLite)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Customers per chunk, the unit of work handed to a worker')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT')
+        parser.add_argument('--skip-search-index', action='store_true', help='Do not rebuild the search index afterwards')
+
+    def handle(self, *args, **options):
+        if options['until']:
+            until = parse_date(options['until'])
+            if until is None:
+                raise CommandError(f"Invalid --until value: {options['until']}")
+        else:
+            until = timezone.localdate()
+        end = timezone.make_aware(datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min))
+        start = end - datetime.timedelta(days=options['days'])
+
+        customers, chunk_size, workers = options['customers'], options['chunk_size'], options['workers']
+        if customers < 1 or chunk_size < 1 or workers < 1:
+            raise CommandError("--customers, --chunk-size and --workers must be positive")
+        if workers > 1 and connection.vendor == 'sqlite':
+            # Parallel writers fail with "database is locked" and leave their committed chunks behind
+            self.stdout.write(self.style.WARNING("SQLite allows one writer at a time; using a single worker"))
+            workers = 1
+        chunks = [
+            (options['seed'], index, min(chunk_size, customers - first), start, end, options['batch_size'])
+            for index, first in enumerate(range(0, customers, chunk_size))
+        ]
+        if len(chunks) > MAX_CHUNKS:
+            raise CommandError(f"At most {MAX_CHUNKS} chunks; raise --chunk-size")
+
+        totals = {'customers': 0, 'orders': 0, 'items': 0, 'logs': 0}
+        started = time.perf_counter()
+
+        def add(counts):
+            for key, value in counts.items():
+                totals[key] += value
+            rows = sum(totals.values())
+            self.stdout.write(f"{totals['customers']}/{customers} customers, {rows} rows, "
+                              f"{rows / (time.perf_counter() - started) * 60:,.0f} rows/min")
+
+        if workers == 1:
+            for chunk in chunks:
+                add(generate_chunk(*chunk))
+        else:
+            # Forked workers must not share the parent's database connection
+            connections.close_all()
+            with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+                for counts in pool.imap_unordered(_run_chunk, chunks):
+                    add(counts)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {totals['customers']} customers, {totals['orders']} orders, {totals['items']} items and "
+            f"{totals['logs']} payment logs in {elapsed:.1f}s "
+            f"({sum(totals.values()) / elapsed * 60:,.0f} rows/min)"
+        ))
+
+        # bulk_create skips the signals that keep the search index current
+        if not options['skip_search_index']:
+            self.stdout.write(f"Indexed {rebuild()} customers and orders for search")
+        self.stdout.write("Run refresh_sales_rollups --full to include the new orders in the analytics.")
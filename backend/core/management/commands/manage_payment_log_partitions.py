@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core import partitions
+
+
+class Command(BaseCommand):
+    help = 'Creates the monthly PaymentLog partitions ahead of time (PostgreSQL with PAYMENT_LOG_PARTITIONING only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=settings.PAYMENT_LOG_PARTITION_MONTHS_AHEAD,
+                            help='Create partitions up to this many months after the current one')
+        parser.add_argument('--list', action='store_true', help='List the monthly partitions')
+        parser.add_argument('--convert', action='store_true',
+                            help='Partition the existing table, if it was migrated before partitioning was turned on')
+
+    def handle(self, *args, **options):
+        if not partitions.is_enabled():
+            self.stdout.write("PaymentLog partitioning is off (it needs PostgreSQL and PAYMENT_LOG_PARTITIONING)")
+            return
+
+        if options['convert']:
+            partitions.partition_table()
+        with connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                self.stdout.write("The PaymentLog table is not partitioned yet; run this command with --convert")
+                return
+
+        created = partitions.ensure_partitions(months_ahead=options['months_ahead'])
+        for name in created:
+            self.stdout.write(self.style.SUCCESS(f"Created partition {name}"))
+        if not created:
+            self.stdout.write("All partitions already exist")
+
+        if options['list']:
+            with connection.cursor() as cursor:
+                existing = partitions.attached_partitions(cursor)
+            for month in sorted(existing):
+                self.stdout.write(f"{month:%Y-%m}  {existing[month]}")
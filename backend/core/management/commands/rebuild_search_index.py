@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the customer and order search index (after bulk imports or schema changes to its table)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} customers and orders"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from core.analytics import refresh_sales_rollups
+import datetime
+
+
+class Command(BaseCommand):
+    help = 'Updates the daily sales rollups for every day changed since the last run (schedule e.g. every 5 minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild the rollups for every day')
+        parser.add_argument('--since', help='Recompute days touched since this date/datetime instead of the last run')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                day = parse_date(options['since'])
+                if day is None:
+                    raise CommandError(f"Invalid --since value: {options['since']}")
+                since = datetime.datetime.combine(day, datetime.time.min)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        days = refresh_sales_rollups(full=options['full'], since=since)
+        if days:
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {len(days)} day(s): {days[0]} to {days[-1]}"))
+        else:
+            self.stdout.write('Rollups are up to date.')
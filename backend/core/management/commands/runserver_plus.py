@@ -1,18 +1,36 @@
 import os
-import subprocess
-from django.core.management.base import BaseCommand
-from django.conf import settings
+import threading
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
 
 class Command(BaseCommand):
-    help = 'Builds Next.js frontend and runs Django server'
+    help = ('Builds the Next.js frontend (only when its sources changed, in the background) '
+            'and runs the Django development server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('addrport', nargs='?', help='Optional port number, or ipaddr:port')
+        parser.add_argument('--rebuild', action='store_true', help='Build the frontend even if nothing changed')
+        parser.add_argument('--skip-build', action='store_true', help='Never build the frontend')
+        parser.add_argument('--wait', action='store_true', help='Finish the build before starting Django')
 
     def handle(self, *args, **options):
-        # Build Next.js frontend
-        frontend_dir = os.path.join(os.path.dirname(settings.BASE_DIR), 'frontend')
-        self.stdout.write('Building Next.js frontend...')
-        subprocess.run(['npm', 'run', 'build'], cwd=frontend_dir, check=True)
+        # With autoreload, runserver re-runs this command in a child process on every code change;
+        # only the outer process decides about the build
+        if not options['skip_build'] and os.environ.get('RUN_MAIN') != 'true':
+            # Unchanged sources make this a quick no-op; otherwise Django starts while it builds
+            builder = threading.Thread(target=self._build_frontend, args=(options['rebuild'],), daemon=True)
+            builder.start()
+            if options['wait']:
+                builder.join()
 
         # Run Django server
         self.stdout.write('Starting Django server...')
-        from django.core.management import call_command
-        call_command('runserver', *args)
+        runserver_args = [options['addrport']] if options['addrport'] else []
+        call_command('runserver', *runserver_args)
+
+    def _build_frontend(self, force):
+        try:
+            call_command('build_frontend', force=force, stdout=self.stdout, stderr=self.stderr)
+        except CommandError as e:
+            self.stderr.write(self.style.ERROR(f"{e}; still serving the previous out/."))
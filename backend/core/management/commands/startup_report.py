@@ -0,0 +1,91 @@
+import collections
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, doing what a WSGI worker does before its first request
+COLD_START_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+phases = {}
+import django
+django.setup()
+phases['django.setup'] = time.perf_counter() - started
+mark = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+phases['urlconf'] = time.perf_counter() - mark
+mark = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+phases['wsgi application'] = time.perf_counter() - mark
+phases['total'] = time.perf_counter() - started
+sys.stdout.write(json.dumps(phases))
+"""
+
+
+class Command(BaseCommand):
+    help = ('Measures the cold start of a worker in fresh interpreters and breaks the '
+            'import time down per package and module (python -X importtime)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to measure; medians are reported')
+        parser.add_argument('--top', type=int, default=20, help='Number of modules to list')
+
+    def handle(self, *args, **options):
+        runs = [self._cold_start() for _ in range(max(options['runs'], 1))]
+
+        self.stdout.write(f"Cold start (median of {len(runs)} runs)")
+        for phase in runs[0][0]:
+            seconds = statistics.median(phases[phase] for phases, _ in runs)
+            self.stdout.write(f"  {phase:<20}{seconds * 1000:>9.1f} ms")
+
+        # (self us, cumulative us) per module, median over the runs
+        modules = collections.defaultdict(lambda: ([], []))
+        for _, imports in runs:
+            for name, self_us, cumulative_us in imports:
+                modules[name][0].append(self_us)
+                modules[name][1].append(cumulative_us)
+        module_times = {
+            name: (statistics.median(self_times), statistics.median(cumulative_times))
+            for name, (self_times, cumulative_times) in modules.items()
+        }
+
+        packages = collections.Counter()
+        for name, (self_us, _) in module_times.items():
+            packages[name.split('.')[0]] += self_us
+        total_us = sum(packages.values()) or 1
+
+        self.stdout.write(f"\nImport time by top-level package ({total_us / 1000:.1f} ms in total)")
+        for package, self_us in packages.most_common(options['top']):
+            self.stdout.write(f"  {package:<32}{self_us / 1000:>9.1f} ms{self_us / total_us:>7.1%}")
+
+        self.stdout.write("\nSlowest imports (cumulative, including what they import)")
+        slowest = sorted(module_times.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (self_us, cumulative_us) in slowest[:options['top']]:
+            self.stdout.write(f"  {name:<48}{cumulative_us / 1000:>9.1f} ms  (self {self_us / 1000:.1f} ms)")
+
+    def _cold_start(self):
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'core.settings'))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', COLD_START_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        try:
+            phases = json.loads(result.stdout)
+        except ValueError:
+            raise CommandError(f"Cold start failed:\n{result.stderr[-2000:]}")
+
+        imports = []
+        for line in result.stderr.splitlines():
+            # "import time:       self [us] |  cumulative | imported package"
+            if not line.startswith('import time:') or 'imported package' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            imports.append((name.strip(), int(self_us), int(cumulative_us)))
+        return phases, imports
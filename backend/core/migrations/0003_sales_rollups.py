@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_order_export_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOptionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('option', models.CharField(choices=[('fabric_type', 'Fabric Type'), ('has_vest', 'Vest'), ('face_style', 'Face Style')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('item_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Option Rollup',
+                'verbose_name_plural': 'Daily Option Rollups',
+                'ordering': ['-date', 'option', 'value'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('paid_order_count', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0, help_text='Amount of paid orders in øre (cents)')),
+                ('item_count', models.IntegerField(default=0, help_text='Items in paid orders')),
+                ('captured_order_count', models.IntegerField(default=0)),
+                ('captured_amount', models.BigIntegerField(default=0, help_text='Amount in øre (cents)')),
+                ('refunded_order_count', models.IntegerField(default=0)),
+                ('refunded_amount', models.BigIntegerField(default=0, help_text='Amount in øre (cents)')),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='core_order_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentlog',
+            index=models.Index(fields=['created_at'], name='core_paymentlog_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyoptionrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'option', 'value'), name='core_optionrollup_unique'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentlog',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentlog',
+            name='repeat_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='PaymentLogSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archive_file', models.CharField(max_length=255)),
+                ('log_count', models.IntegerField(default=0)),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('last_event_type', models.CharField(max_length=50)),
+                ('last_status', models.CharField(max_length=50)),
+                ('captured_amount', models.BigIntegerField(default=0, help_text='Amount in øre (cents)')),
+                ('refunded_amount', models.BigIntegerField(default=0, help_text='Amount in øre (cents)')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_log_summaries', to='core.order')),
+            ],
+            options={
+                'verbose_name': 'Payment Log Summary',
+                'verbose_name_plural': 'Payment Log Summaries',
+                'ordering': ['-last_created_at'],
+                'constraints': [models.UniqueConstraint(fields=('order', 'archive_file'), name='core_logsummary_unique')],
+            },
+        ),
+    ]
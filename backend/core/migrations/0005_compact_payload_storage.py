@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_payment_log_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codec', models.CharField(choices=[('zstd', 'zstd'), ('zlib', 'zlib')], max_length=10)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Payload Dictionary',
+                'verbose_name_plural': 'Payload Dictionaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='paymentlog',
+            name='response_data_compact',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentlog',
+            name='payload_dictionary',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.payloaddictionary'),
+        ),
+    ]
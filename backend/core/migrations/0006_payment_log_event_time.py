@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_compact_payload_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
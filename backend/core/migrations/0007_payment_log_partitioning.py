@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from core.partitions import partition_payment_logs, unpartition_payment_logs
+
+
+class Migration(migrations.Migration):
+    """Partition core_paymentlog by month on PostgreSQL when PAYMENT_LOG_PARTITIONING is on.
+
+    Nothing changes on SQLite or with the setting off. The table layout is
+    not part of Django's model state, so no model operations are needed.
+    """
+
+    dependencies = [
+        ('core', '0006_payment_log_event_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_payment_logs, unpartition_payment_logs),
+    ]
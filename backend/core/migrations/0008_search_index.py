@@ -0,0 +1,103 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:07
+
+import re
+
+from django.db import migrations, models
+
+# A copy of core.search as of this migration, so later changes there do not alter what it does
+FTS_TABLE = 'core_searchentry_fts'
+CUSTOMER_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'address', 'city']
+NON_DIGITS = re.compile(r'\D')
+
+SETUP = {
+    'sqlite': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"document, content='core_searchentry', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS core_searchentry_ai AFTER INSERT ON core_searchentry BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.id, new.document); END",
+        f"CREATE TRIGGER IF NOT EXISTS core_searchentry_ad AFTER DELETE ON core_searchentry BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.id, old.document); END",
+        f"CREATE TRIGGER IF NOT EXISTS core_searchentry_au AFTER UPDATE ON core_searchentry BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.id, old.document); "
+        f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.id, new.document); END",
+    ],
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS core_searchentry_document_trgm ON core_searchentry USING gin (document gin_trgm_ops)",
+    ],
+}
+TEARDOWN = {
+    'sqlite': [
+        "DROP TRIGGER IF EXISTS core_searchentry_ai",
+        "DROP TRIGGER IF EXISTS core_searchentry_ad",
+        "DROP TRIGGER IF EXISTS core_searchentry_au",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ],
+    'postgresql': [
+        "DROP INDEX IF EXISTS core_searchentry_document_trgm",
+    ],
+}
+
+
+def customer_document(customer):
+    values = [getattr(customer, name) or '' for name in CUSTOMER_FIELDS]
+    values.append(NON_DIGITS.sub('', customer.phone or ''))
+    return '\n'.join(values).lower()
+
+
+def order_document(order):
+    return (order.reference or '').lower()
+
+
+def _execute(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            cursor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    _execute(schema_editor, SETUP)
+
+
+def drop_index(apps, schema_editor):
+    _execute(schema_editor, TEARDOWN)
+
+
+def index_existing(apps, schema_editor):
+    Customer = apps.get_model('core', 'Customer')
+    Order = apps.get_model('core', 'Order')
+    SearchEntry = apps.get_model('core', 'SearchEntry')
+    for kind, queryset, document in [
+        ('customer', Customer.objects.only('id', *CUSTOMER_FIELDS), customer_document),
+        ('order', Order.objects.only('id', 'reference'), order_document),
+    ]:
+        SearchEntry.objects.bulk_create(
+            (SearchEntry(kind=kind, object_id=obj.pk, document=document(obj)) for obj in queryset.iterator()),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_payment_log_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('customer', 'Customer'), ('order', 'Order')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('document', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Search Entry',
+                'verbose_name_plural': 'Search Entries',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='core_searchentry_unique')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('token', models.CharField(max_length=32)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Idempotency Lock',
+                'verbose_name_plural': 'Idempotency Locks',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_idempotency_response'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Retention Watermark',
+                'verbose_name_plural': 'Retention Watermarks',
+            },
+        ),
+    ]
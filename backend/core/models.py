@@ -1,5 +1,10 @@
+import datetime
+
+from django.conf import settings
 from django.db import models
-import uuid
+from django.utils import timezone
+from . import payload_codec
+from .references import new_reference
 
 # Order status choices
 STATUS_CHOICES = [
@@ -15,6 +20,38 @@ STATUS_CHOICES = [
     ('REFUNDED', 'Refunded'),
 ]
 
+# PaymentLog event types that record money actually moving
+CAPTURE_EVENT_TYPES = ['PAYMENT_CAPTURED', 'PAYMENT_AUTO_CAPTURED', 'FRONTEND_CAPTURE_SUCCESS', 'CAPTURE']
+REFUND_EVENT_TYPES = ['PAYMENT_REFUNDED', 'REFUND']
+
+# PaymentLog event types written by status polling; repeats of these are collapsed by core.retention
+STATUS_CHECK_EVENT_TYPES = ['EPAYMENT_STATUS_CHECK', 'RETURN_URL_STATUS_CHECK', 'EPAYMENT_EVENTS_CHECK', 'MOBILEPAY_PAYMENT_STATUS']
+
+# Order statuses that count as a sale in the analytics rollups
+PAID_STATUSES = ['PAYMENT_CONFIRMED', 'SHIPPED', 'COMPLETED', 'REFUNDED']
+
+class CustomerManager(models.Manager):
+    def update_or_create_if_changed(self, email, defaults):
+        """Like ``update_or_create(email=..., defaults=...)``, but skips the UPDATE when nothing changed.
+
+        update_or_create always saves, and auto_now bumps updated_at, so every
+        checkout by a returning customer used to cost a write (and SQLite's
+        write lock). Only the fields that actually differ are written.
+        """
+        customer = self.filter(email=email).order_by('pk').first()
+        if customer is None:
+            return self.create(email=email, **defaults), True
+
+        changed = []
+        for name, value in defaults.items():
+            value = self.model._meta.get_field(name).to_python(value)
+            if getattr(customer, name) != value:
+                setattr(customer, name, value)
+                changed.append(name)
+        if changed:
+            customer.save(update_fields=changed + ['updated_at'])
+        return customer, False
+
 class Customer(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -26,6 +63,8 @@ class Customer(models.Model):
     marketing_consent = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CustomerManager()
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -73,11 +112,16 @@ class Order(models.Model):
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            models.Index(fields=['created_at'], name='core_order_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='core_order_status_created_idx'),
+            models.Index(fields=['updated_at'], name='core_order_updated_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Generate a reference if not provided
         if not self.reference:
-            self.reference = f"order-{uuid.uuid4().hex[:8]}"
+            self.reference = new_reference()
         super().save(*args, **kwargs)
 
 class OrderItem(models.Model):
@@ -103,6 +147,28 @@ class OrderItem(models.Model):
         verbose_name = "Order Item"
         verbose_name_plural = "Order Items"
 
+class PayloadDictionary(models.Model):
+    """Shared compression dictionary for compact PaymentLog payloads"""
+    codec = models.CharField(max_length=10, choices=payload_codec.CODEC_CHOICES)
+    data = models.BinaryField()
+    sample_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.codec} dictionary #{self.pk} ({len(self.data)} bytes)"
+    
+    class Meta:
+        verbose_name = "Payload Dictionary"
+        verbose_name_plural = "Payload Dictionaries"
+
+# Payment logs are written after their order is created; the margin allows for clock differences between hosts
+ORDER_LOG_MARGIN = datetime.timedelta(hours=1)
+
+class PaymentLogQuerySet(models.QuerySet):
+    def for_order(self, order):
+        """The order's logs, bounded by its created_at so a partitioned table only reads the months it needs"""
+        return self.filter(order=order, created_at__gte=order.created_at - ORDER_LOG_MARGIN)
+
 class PaymentLog(models.Model):
     order = models.ForeignKey(Order, related_name="payment_logs", on_delete=models.CASCADE)
     transaction_id = models.CharField(max_length=100, null=True, blank=True)
@@ -110,12 +176,207 @@ class PaymentLog(models.Model):
     amount = models.IntegerField(null=True, blank=True, help_text="Amount in øre (cents)")
     status = models.CharField(max_length=50)
     response_data = models.JSONField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when core.payment_log_writer gets round to inserting it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    # Set when identical repeated status checks are collapsed into this row
+    repeat_count = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    
+    # Optional compact storage of response_data (see core.payload_codec)
+    response_data_compact = models.BinaryField(null=True, blank=True, editable=False)
+    payload_dictionary = models.ForeignKey(PayloadDictionary, null=True, blank=True, on_delete=models.PROTECT, related_name="+")
+    
+    objects = PaymentLogQuerySet.as_manager()
     
     def __str__(self):
         return f"Payment log for {self.order.reference} - {self.event_type}"
     
+    @property
+    def payload(self):
+        """The logged response, decoded from the compact column when stored there"""
+        if self.response_data_compact is not None:
+            return payload_codec.get_codec(self.payload_dictionary_id).decompress(self.response_data_compact)
+        return self.response_data
+    
+    def compact(self, dictionary_id=None):
+        """Move response_data into the compact column; returns False if there is no dictionary"""
+        if self.response_data is None:
+            return False
+        dictionary_id = dictionary_id or payload_codec.get_active_dictionary_id()
+        if dictionary_id is None:
+            return False
+        self.response_data_compact = payload_codec.get_codec(dictionary_id).compress(self.response_data)
+        self.payload_dictionary_id = dictionary_id
+        self.response_data = None
+        return True
+    
+    def save(self, *args, **kwargs):
+        if getattr(settings, 'PAYMENT_LOG_COMPACT_STORAGE', False) and self.response_data_compact is None:
+            self.compact()
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = "Payment Log"
         verbose_name_plural = "Payment Logs"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='core_paymentlog_created_idx'),
+        ]
+
+class PaymentLogSummary(models.Model):
+    """What remains in the database of an order's archived payment logs.
+
+    One row per order per archive file written by core.retention.
+    """
+    order = models.ForeignKey(Order, related_name="payment_log_summaries", on_delete=models.CASCADE)
+    archive_file = models.CharField(max_length=255)
+    log_count = models.IntegerField(default=0)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    last_event_type = models.CharField(max_length=50)
+    last_status = models.CharField(max_length=50)
+    captured_amount = models.BigIntegerField(default=0, help_text="Amount in øre (cents)")
+    refunded_amount = models.BigIntegerField(default=0, help_text="Amount in øre (cents)")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.log_count} archived logs for {self.order.reference}"
+    
+    class Meta:
+        verbose_name = "Payment Log Summary"
+        verbose_name_plural = "Payment Log Summaries"
+        ordering = ['-last_created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'archive_file'], name='core_logsummary_unique'),
+        ]
+
+class DailySalesRollup(models.Model):
+    """Precomputed sales figures for all orders created on one day.
+
+    Maintained by the ``refresh_sales_rollups`` command (see core.analytics);
+    dashboards read these rows instead of aggregating orders and logs.
+    """
+    date = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    paid_order_count = models.IntegerField(default=0)
+    revenue = models.BigIntegerField(default=0, help_text="Amount of paid orders in øre (cents)")
+    item_count = models.IntegerField(default=0, help_text="Items in paid orders")
+    captured_order_count = models.IntegerField(default=0)
+    captured_amount = models.BigIntegerField(default=0, help_text="Amount in øre (cents)")
+    refunded_order_count = models.IntegerField(default=0)
+    refunded_amount = models.BigIntegerField(default=0, help_text="Amount in øre (cents)")
+    refreshed_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Sales rollup for {self.date}"
+    
+    @property
+    def average_basket(self):
+        if not self.paid_order_count:
+            return 0
+        return self.revenue / self.paid_order_count
+    
+    @property
+    def capture_rate(self):
+        if not self.order_count:
+            return 0.0
+        return self.captured_order_count / self.order_count
+    
+    @property
+    def refund_rate(self):
+        if not self.captured_order_count:
+            return 0.0
+        return self.refunded_order_count / self.captured_order_count
+    
+    class Meta:
+        verbose_name = "Daily Sales Rollup"
+        verbose_name_plural = "Daily Sales Rollups"
+        ordering = ['-date']
+
+class DailyOptionRollup(models.Model):
+    """Per-day count of paid order items for one value of a bear option"""
+    OPTION_CHOICES = [
+        ('fabric_type', 'Fabric Type'),
+        ('has_vest', 'Vest'),
+        ('face_style', 'Face Style'),
+    ]
+    
+    date = models.DateField()
+    option = models.CharField(max_length=20, choices=OPTION_CHOICES)
+    value = models.CharField(max_length=100)
+    item_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.option}={self.value} on {self.date}"
+    
+    class Meta:
+        verbose_name = "Daily Option Rollup"
+        verbose_name_plural = "Daily Option Rollups"
+        ordering = ['-date', 'option', 'value']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'option', 'value'], name='core_optionrollup_unique'),
+        ]
+
+class SearchEntry(models.Model):
+    """Lower-cased search text for one customer or order, kept in sync by core.search"""
+    KIND_CHOICES = [
+        ('customer', 'Customer'),
+        ('order', 'Order'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    document = models.TextField()
+    
+    def __str__(self):
+        return f"Search entry for {self.kind} #{self.object_id}"
+    
+    class Meta:
+        verbose_name = "Search Entry"
+        verbose_name_plural = "Search Entries"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='core_searchentry_unique'),
+        ]
+
+class IdempotencyLock(models.Model):
+    """Held by the one request running for an Idempotency-Key (see core.idempotency)"""
+    key = models.CharField(max_length=64, unique=True)
+    token = models.CharField(max_length=32)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Idempotency lock {self.key} until {self.expires_at}"
+    
+    class Meta:
+        verbose_name = "Idempotency Lock"
+        verbose_name_plural = "Idempotency Locks"
+
+class IdempotencyResponse(models.Model):
+    """The stored response replayed for retries with an Idempotency-Key (see core.idempotency)"""
+    key = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status = models.PositiveSmallIntegerField()
+    content = models.BinaryField()
+    content_type = models.CharField(max_length=100)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"Idempotency response {self.key} until {self.expires_at}"
+    
+    class Meta:
+        verbose_name = "Idempotency Response"
+        verbose_name_plural = "Idempotency Responses"
+
+class RetentionWatermark(models.Model):
+    """How far a PaymentLog retention job got, so the next run starts there (see core.retention)"""
+    name = models.CharField(max_length=50, unique=True)
+    position = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} up to {self.position}"
+    
+    class Meta:
+        verbose_name = "Retention Watermark"
+        verbose_name_plural = "Retention Watermarks"
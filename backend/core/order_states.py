@@ -0,0 +1,99 @@
+"""Order status state machine.
+
+Webhooks, status polls, the return page and admin actions can all report
+on the same order at once, and some of them arrive late or out of order.
+Status changes therefore go through ``transition_order``, a single
+conditional UPDATE:
+
+    UPDATE core_order SET status = ..., updated_at = ...
+    WHERE id = ... AND status IN (<statuses allowed to move there>)
+
+It never reads the row first and touches no other column. If a late or
+concurrent report would move an order backwards, for example a COMPLETED
+order back to PAYMENT_CONFIRMED, that report simply updates nothing. When
+the caller already has the Order loaded and its status can no longer lead
+to the target, for example on a repeated status poll, no statement is sent
+at all.
+"""
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order
+
+# Allowed transitions: status -> statuses it may move to. There are no cycles, so
+# an order never returns to a status it has left.
+TRANSITIONS = {
+    'CREATED': {
+        'PROCESSING', 'SESSION_COMPLETED', 'SESSION_FAILED', 'SESSION_CANCELLED',
+        'PAYMENT_CONFIRMED', 'PAYMENT_FAILED', 'COMPLETED',
+    },
+    'PROCESSING': {
+        'SESSION_COMPLETED', 'SESSION_FAILED', 'SESSION_CANCELLED',
+        'PAYMENT_CONFIRMED', 'PAYMENT_FAILED', 'COMPLETED',
+    },
+    'SESSION_COMPLETED': {'PAYMENT_CONFIRMED', 'PAYMENT_FAILED', 'COMPLETED'},
+    # Creating the payment may have failed only on our side (e.g. a timeout), so Vipps still decides
+    'SESSION_FAILED': {'PAYMENT_CONFIRMED', 'PAYMENT_FAILED', 'COMPLETED'},
+    'SESSION_CANCELLED': set(),
+    'PAYMENT_CONFIRMED': {'SESSION_CANCELLED', 'PAYMENT_FAILED', 'COMPLETED', 'SHIPPED', 'REFUNDED'},
+    'PAYMENT_FAILED': set(),
+    'COMPLETED': {'SHIPPED', 'REFUNDED'},
+    'SHIPPED': {'REFUNDED'},
+    'REFUNDED': set(),
+}
+
+# status -> statuses an order may be in to move there
+SOURCES = {
+    status: sorted(source for source, targets in TRANSITIONS.items() if status in targets)
+    for status in TRANSITIONS
+}
+
+
+def _reachable(status):
+    reached, pending = set(), list(TRANSITIONS[status])
+    while pending:
+        target = pending.pop()
+        if target not in reached:
+            reached.add(target)
+            pending.extend(TRANSITIONS[target])
+    return reached
+
+
+# status -> every status an order in it can still end up in
+REACHABLE = {status: _reachable(status) for status in TRANSITIONS}
+
+
+def can_transition(current, status):
+    return status in TRANSITIONS.get(current, ())
+
+
+def transition_order(order, status, completed=False):
+    """Move an order (an Order or its reference) to ``status`` if its current status allows it.
+
+    With ``completed=True`` the order's completed_at is set too, unless it
+    already has one. Returns True if the order changed. An Order instance
+    passed in is updated in memory to match.
+    """
+    if isinstance(order, Order) and status not in REACHABLE.get(order.status, ()):
+        # Even if the order moved on since it was loaded, it cannot get to ``status`` any more:
+        # skip the UPDATE (and the write lock it takes) for repeated polls and webhooks
+        return False
+
+    now = timezone.now()
+    changes = {'status': status, 'updated_at': now}
+    if completed:
+        changes['completed_at'] = Coalesce(F('completed_at'), now)
+
+    orders = Order.objects.filter(status__in=SOURCES.get(status, ()))
+    if isinstance(order, Order):
+        orders = orders.filter(pk=order.pk)
+    else:
+        orders = orders.filter(reference=order)
+    changed = orders.update(**changes) > 0
+
+    if changed and isinstance(order, Order):
+        order.status, order.updated_at = status, now
+        if completed and order.completed_at is None:
+            order.completed_at = now
+    return changed
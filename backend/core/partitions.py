@@ -0,0 +1,245 @@
+"""Monthly partitioning of the PaymentLog table on PostgreSQL.
+
+With PAYMENT_LOG_PARTITIONING on, migration 0007 rebuilds ``core_paymentlog``
+as a table partitioned by range of ``created_at``, one partition per month
+(``core_paymentlog_p202610``) plus a DEFAULT partition that catches rows
+outside every month that has a partition. Queries that filter on
+``created_at`` then only read the partitions they need (see
+``PaymentLog.objects.for_order``, the admin and the exports), and
+core.retention drops whole months instead of deleting them row by row.
+
+Partitions are created PAYMENT_LOG_PARTITION_MONTHS_AHEAD months in
+advance by the ``manage_payment_log_partitions`` command, which runs daily
+as a background job. If it falls behind, new rows land in the DEFAULT
+partition, and they are moved into their month's partition when that
+partition is created.
+
+The primary key becomes (id, created_at), because PostgreSQL requires the
+partition key in every unique constraint. ``id`` still comes from a
+sequence, so Django keeps treating it as the primary key.
+
+On SQLite, or with the setting off, everything here is a no-op.
+"""
+import datetime
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLE = 'core_paymentlog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+
+_PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+# Index definitions as returned by pg_get_indexdef, up to the table name
+_INDEX_TABLE = re.compile(r' ON (?:ONLY )?(?:"?\w+"?\.)?"?(\w+)"? ')
+
+
+def is_enabled():
+    """Whether PaymentLog should be partitioned on this database"""
+    return connection.vendor == 'postgresql' and getattr(settings, 'PAYMENT_LOG_PARTITIONING', False)
+
+
+def month_start(value):
+    """The first instant of ``value``'s month, in UTC"""
+    value = value.astimezone(datetime.timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def partition_month(name):
+    """The month a partition name stands for, or None for other tables"""
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return datetime.datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=datetime.timezone.utc)
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _literal(value):
+    # DDL cannot take query parameters; the bounds are datetimes built here, never user input
+    return f"'{value.isoformat()}'"
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+        [TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+def attached_partitions(cursor):
+    """Return {month: name} for the monthly partitions attached to the table"""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)",
+        [TABLE],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        month = partition_month(name)
+        if month is not None:
+            partitions[month] = name
+    return partitions
+
+
+def _create_partition(cursor, month):
+    start, end = month, add_months(month, 1)
+    name = partition_name(month)
+    with transaction.atomic():
+        # Rows for this month that already landed in the DEFAULT partition have to move first,
+        # otherwise PostgreSQL refuses to attach the new partition
+        cursor.execute(f"CREATE TABLE {_quote(name)} (LIKE {_quote(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {_quote(DEFAULT_PARTITION)} "
+            f"WHERE created_at >= {_literal(start)} AND created_at < {_literal(end)} RETURNING *) "
+            f"INSERT INTO {_quote(name)} SELECT * FROM moved"
+        )
+        cursor.execute(
+            f"ALTER TABLE {_quote(TABLE)} ATTACH PARTITION {_quote(name)} "
+            f"FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})"
+        )
+    return name
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    """Create the monthly partitions from this month up to ``months_ahead`` months ahead.
+
+    Returns the names of the partitions created.
+    """
+    if not is_enabled():
+        return []
+    if months_ahead is None:
+        months_ahead = settings.PAYMENT_LOG_PARTITION_MONTHS_AHEAD
+    current = month_start(now or timezone.now())
+
+    created = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        existing = attached_partitions(cursor)
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                created.append(_create_partition(cursor, month))
+    return created
+
+
+def partitions_before(cutoff):
+    """Return [(month, name)] for partitions holding only rows older than ``cutoff``, oldest first"""
+    if not is_enabled():
+        return []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        partitions = attached_partitions(cursor)
+    return sorted(
+        (month, name) for month, name in partitions.items()
+        if add_months(month, 1) <= cutoff
+    )
+
+
+def drop_partition(name):
+    """Drop a monthly partition with every row in it"""
+    if partition_month(name) is None:
+        raise ValueError(f"{name} is not a PaymentLog partition")
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {_quote(name)}")
+
+
+def _rebuild(schema_editor, partitioned):
+    """Recreate the PaymentLog table, partitioned or not, keeping its rows, indexes and foreign keys"""
+    quote = schema_editor.quote_name
+    old = f'{TABLE}_rebuild'
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor) == partitioned:
+            return
+
+        # Run the deferred foreign key checks of rows written earlier in this transaction;
+        # PostgreSQL refuses to drop a table with checks still pending
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(old)}")
+        # Plain indexes and foreign keys are recreated under their own names once the old table is gone
+        cursor.execute(
+            "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+            "WHERE i.indrelid = %s::regclass AND NOT i.indisprimary "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)",
+            [old],
+        )
+        indexes = [_INDEX_TABLE.sub(f' ON {quote(TABLE)} ', row[0], count=1) for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [old],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT min(created_at) FROM " + quote(old))
+        first = cursor.fetchone()[0]
+
+        like = f"(LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        if partitioned:
+            cursor.execute(f"CREATE TABLE {quote(TABLE)} {like} PARTITION BY RANGE (created_at)")
+        else:
+            cursor.execute(f"CREATE TABLE {quote(TABLE)} {like}")
+        # A copied id default would still use the old table's sequence, which goes with it
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id DROP DEFAULT")
+
+        if partitioned:
+            current = month_start(timezone.now())
+            month = month_start(first) if first else current
+            last = add_months(current, settings.PAYMENT_LOG_PARTITION_MONTHS_AHEAD)
+            while month <= last:
+                cursor.execute(
+                    f"CREATE TABLE {quote(partition_name(month))} PARTITION OF {quote(TABLE)} "
+                    f"FOR VALUES FROM ({_literal(month)}) TO ({_literal(add_months(month, 1))})"
+                )
+                month = add_months(month, 1)
+            cursor.execute(f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {quote(TABLE)} SELECT * FROM {quote(old)}")
+        # Dropping the old table also drops its id sequence, primary key, indexes and foreign keys,
+        # which frees their names for the new table
+        cursor.execute(f"DROP TABLE {quote(old)}")
+
+        # PostgreSQL requires the partition key in the primary key of a partitioned table
+        primary_key = 'id, created_at' if partitioned else 'id'
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(TABLE + '_pkey')} PRIMARY KEY ({primary_key})")
+
+        cursor.execute(f"CREATE SEQUENCE {quote(SEQUENCE)} OWNED BY {quote(TABLE)}.id")
+        cursor.execute(f"SELECT setval(%s, COALESCE((SELECT max(id) FROM {quote(TABLE)}), 0) + 1, false)", [SEQUENCE])
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}'::regclass)")
+        for index in indexes:
+            cursor.execute(index)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def partition_table():
+    """Partition an existing PaymentLog table, for when the setting is turned on after migration 0007"""
+    with connection.schema_editor() as schema_editor:
+        _rebuild(schema_editor, partitioned=True)
+
+
+def partition_payment_logs(apps, schema_editor):
+    if is_enabled():
+        _rebuild(schema_editor, partitioned=True)
+
+
+def unpartition_payment_logs(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        _rebuild(schema_editor, partitioned=False)
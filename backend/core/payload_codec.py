@@ -0,0 +1,185 @@
+"""Dictionary compression for PaymentLog payloads.
+
+Vipps responses repeat the same keys and nested structures, so a shared
+dictionary trained on existing payloads lets each row compress well on its
+own. zstd dictionaries are used when the optional ``zstandard`` package is
+installed; otherwise zlib with a preset dictionary built from the most
+common fragments of the training samples.
+"""
+import collections
+import json
+import re
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Optional, zlib is used when it is not installed
+    zstandard = None
+
+CODEC_ZSTD = 'zstd'
+CODEC_ZLIB = 'zlib'
+CODEC_CHOICES = [
+    (CODEC_ZSTD, 'zstd'),
+    (CODEC_ZLIB, 'zlib'),
+]
+
+COMPRESSION_LEVEL = 6
+DEFAULT_DICTIONARY_SIZE = 16384
+# zlib only ever looks back 32 KB, so a larger preset dictionary is wasted
+ZLIB_MAX_DICTIONARY_SIZE = 32768
+
+# How long a process trusts its cached idea of the active dictionary
+ACTIVE_DICTIONARY_TTL = 300
+
+# Values that differ between payloads (ids, amounts, tokens) split samples into reusable fragments
+_VOLATILE = re.compile(r'[0-9a-fA-F-]{6,}|\d+')
+
+
+def default_codec():
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def encode_json(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _build_zlib_dictionary(samples, size):
+    """Concatenate the fragments that save the most bytes, most valuable last"""
+    counts = collections.Counter()
+    for sample in samples:
+        text = sample.decode('utf-8', errors='ignore')
+        for fragment in set(_VOLATILE.split(text)):
+            if len(fragment) >= 3:
+                counts[fragment] += 1
+    ranked = sorted(counts.items(), key=lambda item: (item[1] - 1) * len(item[0]), reverse=True)
+
+    chosen = []
+    total = 0
+    for fragment, count in ranked:
+        if count < 2:
+            break
+        encoded = fragment.encode('utf-8')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    # zlib finds matches closest to the end of the dictionary most cheaply
+    return b''.join(reversed(chosen))
+
+
+def train_dictionary(samples, size=DEFAULT_DICTIONARY_SIZE, codec=None):
+    """Train a dictionary from a list of encoded payloads and return its bytes"""
+    codec = codec or default_codec()
+    if not samples:
+        raise ValueError("Cannot train a payload dictionary without samples")
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("The zstd codec requires the 'zstandard' package")
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Could not train zstd dictionary: {e}")
+    if codec == CODEC_ZLIB:
+        return _build_zlib_dictionary(samples, min(size, ZLIB_MAX_DICTIONARY_SIZE))
+    raise ValueError(f"Unknown payload codec: {codec}")
+
+
+class PayloadCodec:
+    """Compresses and decompresses JSON payloads with one shared dictionary"""
+
+    def __init__(self, codec, dictionary, level=COMPRESSION_LEVEL):
+        self.codec = codec
+        self.dictionary = bytes(dictionary)
+        self.level = level
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Payloads compressed with zstd require the 'zstandard' package")
+            self._zstd_dict = zstandard.ZstdCompressionDict(self.dictionary)
+            self._zstd_dict.precompute_compress(level=level)
+            # zstd (de)compressor objects must not be shared between threads
+            self._local = threading.local()
+        elif codec != CODEC_ZLIB:
+            raise ValueError(f"Unknown payload codec: {codec}")
+
+    def _zstd(self):
+        if not hasattr(self._local, 'compressor'):
+            self._local.compressor = zstandard.ZstdCompressor(
+                dict_data=self._zstd_dict, level=self.level, write_content_size=True, write_dict_id=False
+            )
+            self._local.decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict)
+        return self._local
+
+    def compress_bytes(self, raw):
+        if self.codec == CODEC_ZSTD:
+            return self._zstd().compressor.compress(raw)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self.dictionary)
+        return compressor.compress(raw) + compressor.flush()
+
+    def decompress_bytes(self, blob):
+        if self.codec == CODEC_ZSTD:
+            return self._zstd().decompressor.decompress(bytes(blob))
+        decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+        return decompressor.decompress(bytes(blob)) + decompressor.flush()
+
+    def compress(self, data):
+        return self.compress_bytes(encode_json(data))
+
+    def decompress(self, blob):
+        return json.loads(self.decompress_bytes(blob))
+
+
+_codecs = {}
+_codecs_lock = threading.Lock()
+_active = {'id': None, 'checked_at': 0.0}
+
+
+def get_codec(dictionary_id):
+    """Return the (cached) codec for a stored PayloadDictionary"""
+    codec = _codecs.get(dictionary_id)
+    if codec is None:
+        from .models import PayloadDictionary
+        with _codecs_lock:
+            codec = _codecs.get(dictionary_id)
+            if codec is None:
+                stored = PayloadDictionary.objects.get(pk=dictionary_id)
+                codec = PayloadCodec(stored.codec, stored.data)
+                _codecs[dictionary_id] = codec
+    return codec
+
+
+def get_active_dictionary_id():
+    """Return the id of the newest usable dictionary, or None if there is none"""
+    now = time.monotonic()
+    if now - _active['checked_at'] > ACTIVE_DICTIONARY_TTL:
+        from .models import PayloadDictionary
+        usable = [CODEC_ZLIB] + ([CODEC_ZSTD] if zstandard is not None else [])
+        _active['id'] = (
+            PayloadDictionary.objects.filter(codec__in=usable)
+            .order_by('-created_at', '-id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        _active['checked_at'] = now
+    return _active['id']
+
+
+def reset_active_dictionary():
+    """Forget the cached active dictionary, e.g. after training a new one"""
+    _active['checked_at'] = 0.0
+
+
+def train_from_payment_logs(sample_size=5000, size=DEFAULT_DICTIONARY_SIZE, codec=None):
+    """Train and store a new dictionary from the most recent PaymentLog payloads"""
+    from .models import PayloadDictionary, PaymentLog
+    codec = codec or default_codec()
+    logs = (
+        PaymentLog.objects.order_by('-id')
+        .only('response_data', 'response_data_compact', 'payload_dictionary')[:sample_size]
+    )
+    samples = [encode_json(payload) for payload in (log.payload for log in logs) if payload is not None]
+    data = train_dictionary(samples, size=size, codec=codec)
+    dictionary = PayloadDictionary.objects.create(codec=codec, data=data, sample_count=len(samples))
+    reset_active_dictionary()
+    return dictionary
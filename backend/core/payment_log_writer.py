@@ -0,0 +1,111 @@
+"""Buffered PaymentLog writer.
+
+Views record payment events through ``log_payment_event`` instead of
+``PaymentLog.objects.create``. Most events (status checks, checkout
+bookkeeping) are kept in a per-process buffer and written with one
+``bulk_create`` when the request finishes. They are also written when the
+buffer reaches PAYMENT_LOG_BUFFER_SIZE rows, by a timer thread
+PAYMENT_LOG_FLUSH_INTERVAL seconds after the first row was buffered, and
+when the process exits. The timer covers events logged outside a request
+(management commands, background jobs), which no request_finished would
+write. That turns several INSERTs and commits per request into one, issued
+after the response has been sent.
+
+Events that record money moving (captures and refunds) are durable: they
+are inserted right away, together with anything still buffered, so they
+are never lost with an unflushed buffer.
+"""
+import atexit
+import threading
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections
+
+from .models import CAPTURE_EVENT_TYPES, REFUND_EVENT_TYPES, PaymentLog
+
+DURABLE_EVENT_TYPES = frozenset(CAPTURE_EVENT_TYPES + REFUND_EVENT_TYPES)
+
+_lock = threading.Lock()
+_buffer = []
+_state = {'timer': None}
+
+
+def _write(logs):
+    # bulk_create bypasses PaymentLog.save(), which compacts payloads when that is switched on
+    if getattr(settings, 'PAYMENT_LOG_COMPACT_STORAGE', False):
+        for log in logs:
+            if log.response_data_compact is None:
+                log.compact()
+    try:
+        PaymentLog.objects.bulk_create(logs)
+    except DatabaseError:
+        # One bad row (e.g. its order was rolled back) must not take the others with it
+        for log in logs:
+            try:
+                PaymentLog.objects.bulk_create([log])
+            except DatabaseError as e:
+                print(f"Dropping payment log {log.event_type} for order {log.order_id}: {e}")
+
+
+def _take():
+    with _lock:
+        logs = _buffer[:]
+        _buffer.clear()
+        timer, _state['timer'] = _state['timer'], None
+    if timer is not None:
+        timer.cancel()
+    return logs
+
+
+def flush():
+    """Write every buffered log now"""
+    logs = _take()
+    if logs:
+        _write(logs)
+
+
+def log_payment_event(durable=None, **fields):
+    """Record a PaymentLog; takes the same fields as ``PaymentLog.objects.create``.
+
+    ``durable`` defaults to True for capture and refund events, which are
+    written before this returns. Other events are buffered.
+    """
+    log = PaymentLog(**fields)
+    if durable is None:
+        durable = log.event_type in DURABLE_EVENT_TYPES
+    if durable:
+        # Keep the buffered events ahead of this one, then insert it before returning;
+        # unlike buffered events, a failure here reaches the caller
+        flush()
+        log.save()
+        return log
+
+    with _lock:
+        _buffer.append(log)
+        due = len(_buffer) >= getattr(settings, 'PAYMENT_LOG_BUFFER_SIZE', 50)
+        if not due and _state['timer'] is None:
+            _state['timer'] = threading.Timer(getattr(settings, 'PAYMENT_LOG_FLUSH_INTERVAL', 2), _flush_on_timer)
+            _state['timer'].daemon = True
+            _state['timer'].start()
+    if due:
+        flush()
+    return log
+
+
+def _flush_on_timer():
+    try:
+        flush()
+    finally:
+        # Connections are per thread; don't leave this one open
+        connections.close_all()
+
+
+def _flush_after_request(**kwargs):
+    flush()
+
+
+def connect():
+    """Flush at the end of every request and when the process exits (called from CoreConfig.ready)"""
+    request_finished.connect(_flush_after_request, dispatch_uid='payment_log_writer')
+    atexit.register(flush)
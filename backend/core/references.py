@@ -0,0 +1,88 @@
+"""Order reference allocation.
+
+References look like ``order-01JAB3C4D5K0A2F7G8003``: a millisecond
+timestamp, a node id and a per-process sequence, each fixed-width in
+Crockford base32. Because the alphabet is in ASCII order, references sort
+by creation time, so new rows land at the end of the ``Order.reference``
+index. That gives good index locality.
+
+Uniqueness does not depend on chance:
+- Within a process, the sequence separates references made in the same
+  millisecond.
+- Across processes on one host, the node id contains the process id.
+- Across hosts, set ORDER_REFERENCE_NODE to a distinct number per host
+  (0-262143). Without it, 18 bits of a hash of the hostname are used.
+  Two hosts share those bits with a chance of 1 in 262,144. A collision
+  also needs the same process id, millisecond and sequence.
+"""
+import os
+import socket
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+PREFIX = 'order-'
+# Crockford base32: no I, L, O or U, and in ASCII order so fixed-width values sort numerically
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+TIME_CHARS = 10  # 50 bits of milliseconds since the Unix epoch
+NODE_CHARS = 8   # 18 bits of host + 22 bits of process id
+HOST_BITS = 18
+PROCESS_BITS = 22
+SEQUENCE_CHARS = 3
+MAX_SEQUENCE = 32 ** SEQUENCE_CHARS - 1
+
+# 'order-' plus 21 characters, well within the 50 characters Vipps allows in idempotency keys
+REFERENCE_LENGTH = len(PREFIX) + TIME_CHARS + NODE_CHARS + SEQUENCE_CHARS
+
+
+def _encode(value, width):
+    chars = []
+    for _ in range(width):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def _host_id():
+    configured = getattr(settings, 'ORDER_REFERENCE_NODE', None)
+    if configured is not None:
+        return int(configured) & ((1 << HOST_BITS) - 1)
+    return zlib.crc32(socket.gethostname().encode('utf-8')) & ((1 << HOST_BITS) - 1)
+
+
+def _node():
+    return _encode((_host_id() << PROCESS_BITS) | (os.getpid() & ((1 << PROCESS_BITS) - 1)), NODE_CHARS)
+
+
+def format_reference(millis, node, sequence):
+    """Build a reference from its parts (node is 40 bits: 18 of host, 22 of process)"""
+    return PREFIX + _encode(millis, TIME_CHARS) + _encode(node, NODE_CHARS) + _encode(sequence, SEQUENCE_CHARS)
+
+
+_lock = threading.Lock()
+# Per process: 'pid' notices a fork, so a worker never continues its master's sequence
+_state = {'pid': None, 'node': None, 'millis': 0, 'sequence': 0}
+
+
+def new_reference():
+    """Allocate a new, unique order reference"""
+    with _lock:
+        pid = os.getpid()
+        if _state['pid'] != pid:
+            _state.update(pid=pid, node=_node(), millis=0, sequence=0)
+
+        millis = time.time_ns() // 1_000_000
+        if millis > _state['millis']:
+            _state['millis'], _state['sequence'] = millis, 0
+        elif _state['sequence'] < MAX_SEQUENCE:
+            # Same millisecond, or the clock stepped back: never reuse an earlier slot
+            _state['sequence'] += 1
+        else:
+            # Sequence used up for this millisecond: move on to the next one
+            _state['millis'], _state['sequence'] = _state['millis'] + 1, 0
+
+        return (PREFIX + _encode(_state['millis'], TIME_CHARS) + _state['node']
+                + _encode(_state['sequence'], SEQUENCE_CHARS))
@@ -0,0 +1,343 @@
+"""PaymentLog retention: collapsing repeated status checks and archiving old logs.
+
+Both steps work in small batches, each committed in its own short
+transaction, so they can run while the site is taking traffic. On a
+partitioned PaymentLog table, whole months past the retention period are
+dropped as partitions once archived.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import partitions, payload_codec
+from .models import (
+    CAPTURE_EVENT_TYPES,
+    REFUND_EVENT_TYPES,
+    STATUS_CHECK_EVENT_TYPES,
+    Order,
+    PaymentLog,
+    PaymentLogSummary,
+    RetentionWatermark,
+)
+
+try:
+    import zstandard
+except ImportError:  # Optional, gzip is used when it is not installed
+    zstandard = None
+
+DEFAULT_BATCH_SIZE = 500
+COLLAPSE_WATERMARK = 'collapse_status_checks'
+
+ARCHIVE_FIELDS = [
+    'id', 'order_id', 'transaction_id', 'event_type', 'amount', 'status',
+    'response_data', 'created_at', 'repeat_count', 'last_seen_at',
+]
+
+
+def _archive_records(queryset):
+    """Return archive records for ``queryset``, with compact payloads decoded"""
+    records = list(queryset.values(*ARCHIVE_FIELDS, 'response_data_compact', 'payload_dictionary_id'))
+    for record in records:
+        blob = record.pop('response_data_compact')
+        dictionary_id = record.pop('payload_dictionary_id')
+        if blob is not None:
+            record['response_data'] = payload_codec.get_codec(dictionary_id).decompress(blob)
+    return records
+
+
+def _fingerprint(log):
+    """Identify the content of a status-check row, ignoring when it was written"""
+    payload = json.dumps(log.payload, sort_keys=True, cls=DjangoJSONEncoder)
+    key = f"{log.event_type}|{log.status}|{log.amount}|{log.transaction_id}|{payload}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def collapse_status_checks(older_than=datetime.timedelta(hours=1), batch_size=DEFAULT_BATCH_SIZE, pause=0, full=False):
+    """Collapse runs of identical status-check logs into their first row.
+
+    The kept row's ``repeat_count`` and ``last_seen_at`` record how many
+    rows it stands for and when the last one was written. Only rows older
+    than ``older_than`` are touched so live polling is left alone.
+
+    Each run only reads the rows written since the previous run got to (a
+    RetentionWatermark), plus the latest earlier row of each order and
+    event type so a run continuing across the watermark still collapses.
+    ``full`` reads every status check again. Returns the number of rows
+    removed.
+    """
+    cutoff = timezone.now() - older_than
+    since = None
+    if not full:
+        since = RetentionWatermark.objects.filter(name=COLLAPSE_WATERMARK).values_list('position', flat=True).first()
+    candidates = PaymentLog.objects.filter(event_type__in=STATUS_CHECK_EVENT_TYPES, created_at__lt=cutoff)
+    if since is not None:
+        candidates = candidates.filter(created_at__gte=since)
+        # The latest row of each status-check type written before the watermark, per order
+        latest_before = {
+            event_type: Subquery(
+                PaymentLog.objects.filter(order_id=OuterRef('pk'), event_type=event_type, created_at__lt=since)
+                .order_by('-created_at', '-id')
+                .values('id')[:1]
+            )
+            for event_type in STATUS_CHECK_EVENT_TYPES
+        }
+
+    removed = 0
+    last_order_id = 0
+    while True:
+        order_ids = list(
+            candidates.filter(order_id__gt=last_order_id)
+            .order_by('order_id')
+            .values_list('order_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not order_ids:
+            break
+        last_order_id = order_ids[-1]
+
+        logs = candidates.filter(order_id__in=order_ids)
+        if since is not None:
+            earlier = Order.objects.filter(pk__in=order_ids).values_list(*latest_before.values())
+            logs |= PaymentLog.objects.filter(id__in=[log_id for row in earlier for log_id in row if log_id is not None])
+        logs = (
+            logs
+            .order_by('order_id', 'created_at', 'id')
+            .only('id', 'order_id', 'transaction_id', 'event_type', 'amount', 'status', 'response_data',
+                  'response_data_compact', 'payload_dictionary', 'created_at', 'repeat_count', 'last_seen_at')
+        )
+
+        # Rows arrive order by order, so only the current order's latest rows are held
+        current_order_id, previous = None, {}
+        changed = {}
+        duplicate_ids = []
+        for log in logs.iterator(chunk_size=2000):
+            if log.order_id != current_order_id:
+                current_order_id, previous = log.order_id, {}
+            key = (log.order_id, log.event_type)
+            fingerprint = _fingerprint(log)
+            if key in previous and previous[key][0] == fingerprint:
+                kept = previous[key][1]
+                kept.repeat_count += log.repeat_count
+                kept.last_seen_at = log.last_seen_at or log.created_at
+                changed[kept.id] = kept
+                duplicate_ids.append(log.id)
+            else:
+                previous[key] = (fingerprint, log)
+
+        if duplicate_ids:
+            with transaction.atomic():
+                PaymentLog.objects.bulk_update(changed.values(), ['repeat_count', 'last_seen_at'])
+                PaymentLog.objects.filter(id__in=duplicate_ids).delete()
+            removed += len(duplicate_ids)
+
+        if pause:
+            time.sleep(pause)
+
+    # Rows are written within seconds of their created_at, so nothing older than the cutoff can still appear
+    RetentionWatermark.objects.update_or_create(name=COLLAPSE_WATERMARK, defaults={'position': cutoff})
+    return removed
+
+
+class ArchiveWriter:
+    """Append-only compressed JSONL file (zstd when available, else gzip)"""
+
+    def __init__(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        if zstandard is not None:
+            self.path = os.path.join(directory, f"{name}.jsonl.zst")
+            self._raw = open(self.path, 'xb')
+            self._stream = zstandard.ZstdCompressor(level=10).stream_writer(self._raw)
+        else:
+            self.path = os.path.join(directory, f"{name}.jsonl.gz")
+            self._raw = open(self.path, 'xb')
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb')
+
+    def write_records(self, records):
+        for record in records:
+            line = json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n'
+            self._stream.write(line.encode('utf-8'))
+
+    def sync(self):
+        """Make everything written so far durable on disk"""
+        if zstandard is not None:
+            self._stream.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self._stream.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+    def close(self):
+        self._stream.close()
+        if not self._raw.closed:
+            self._raw.close()
+
+
+def _summarize(records, batch=None):
+    """Fold archived records into {order_id: summary values}, adding to ``batch`` if given"""
+    batch = {} if batch is None else batch
+    for record in records:
+        summary = batch.setdefault(record['order_id'], {
+            'log_count': 0,
+            'first_created_at': record['created_at'],
+            'last_created_at': record['created_at'],
+            'last_event_type': record['event_type'],
+            'last_status': record['status'],
+            'captured_amount': 0,
+            'refunded_amount': 0,
+        })
+        summary['log_count'] += record['repeat_count']
+        summary['first_created_at'] = min(summary['first_created_at'], record['created_at'])
+        if record['created_at'] >= summary['last_created_at']:
+            summary['last_created_at'] = record['created_at']
+            summary['last_event_type'] = record['event_type']
+            summary['last_status'] = record['status']
+        if record['event_type'] in CAPTURE_EVENT_TYPES:
+            summary['captured_amount'] += record['amount'] or 0
+        elif record['event_type'] in REFUND_EVENT_TYPES:
+            summary['refunded_amount'] += record['amount'] or 0
+    return batch
+
+
+def _merge_summaries(batch, archive_file):
+    """Add summary values from ``_summarize`` to the per-order summary rows of ``archive_file``"""
+    existing = {
+        summary.order_id: summary
+        for summary in PaymentLogSummary.objects.filter(order_id__in=batch.keys(), archive_file=archive_file)
+    }
+    to_create = []
+    to_update = []
+    for order_id, values in batch.items():
+        summary = existing.get(order_id)
+        if summary is None:
+            to_create.append(PaymentLogSummary(order_id=order_id, archive_file=archive_file, **values))
+            continue
+        summary.log_count += values['log_count']
+        summary.captured_amount += values['captured_amount']
+        summary.refunded_amount += values['refunded_amount']
+        summary.first_created_at = min(summary.first_created_at, values['first_created_at'])
+        if values['last_created_at'] >= summary.last_created_at:
+            summary.last_created_at = values['last_created_at']
+            summary.last_event_type = values['last_event_type']
+            summary.last_status = values['last_status']
+        to_update.append(summary)
+
+    PaymentLogSummary.objects.bulk_create(to_create)
+    PaymentLogSummary.objects.bulk_update(to_update, [
+        'log_count', 'captured_amount', 'refunded_amount',
+        'first_created_at', 'last_created_at', 'last_event_type', 'last_status',
+    ])
+
+
+def archive_old_logs(days=None, archive_dir=None, batch_size=DEFAULT_BATCH_SIZE, pause=0):
+    """Move logs older than ``days`` into a compressed JSONL archive file.
+
+    Each batch is written and fsynced to the archive before it is deleted,
+    so an interrupted run can at worst archive a batch twice, never lose it.
+    On a partitioned table (see core.partitions), months that lie entirely
+    before the cutoff are archived and then dropped as a whole partition
+    instead of being deleted row by row. The captured and refunded amounts of
+    archived logs stay on their PaymentLogSummary rows, which the exports and
+    the sales rollups add to the live logs.
+    Returns (archived row count, archive path or None).
+    """
+    if days is None:
+        days = settings.PAYMENT_LOG_RETENTION_DAYS
+    if archive_dir is None:
+        archive_dir = settings.PAYMENT_LOG_ARCHIVE_DIR
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    candidates = PaymentLog.objects.filter(created_at__lt=cutoff).order_by('id')
+
+    writer = None
+    archived = 0
+
+    def write(records):
+        nonlocal writer
+        if writer is None:
+            writer = ArchiveWriter(archive_dir, f"payment-logs-{timezone.now():%Y%m%dT%H%M%S}")
+        writer.write_records(records)
+        writer.sync()
+        return os.path.basename(writer.path)
+
+    try:
+        for month, name in partitions.partitions_before(cutoff):
+            month_logs = PaymentLog.objects.filter(
+                created_at__gte=month, created_at__lt=partitions.add_months(month, 1),
+            ).order_by('id')
+            # Batches are only read and archived; their summaries are kept here and stored together
+            # with the DROP, so the summaries never count rows that are still in the table
+            summaries = {}
+            archive_file = None
+            last_id = 0
+            while True:
+                records = _archive_records(month_logs.filter(id__gt=last_id)[:batch_size])
+                if not records:
+                    break
+                last_id = records[-1]['id']
+                archive_file = write(records)
+                _summarize(records, summaries)
+                archived += len(records)
+
+                if pause:
+                    time.sleep(pause)
+
+            # The DROP locks the table only until this short transaction commits
+            with transaction.atomic():
+                if summaries:
+                    _merge_summaries(summaries, archive_file)
+                partitions.drop_partition(name)
+
+        last_id = 0
+        while True:
+            records = _archive_records(candidates.filter(id__gt=last_id)[:batch_size])
+            if not records:
+                break
+            last_id = records[-1]['id']
+
+            archive_file = write(records)
+            with transaction.atomic():
+                _merge_summaries(_summarize(records), archive_file)
+                PaymentLog.objects.filter(id__in=[record['id'] for record in records]).delete()
+            archived += len(records)
+
+            if pause:
+                time.sleep(pause)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return archived, writer.path if writer else None
+
+
+def iter_archive(path):
+    """Yield the records stored in an archive file written by ArchiveWriter"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst archives requires the 'zstandard' package")
+        with open(path, 'rb') as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw)
+            buffer = b''
+            while True:
+                chunk = reader.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if line:
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+    else:
+        with gzip.open(path, 'rb') as archive:
+            for line in archive:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,117 @@
+"""Realistic Vipps/MobilePay ePayment payloads for benchmarks and test data.
+
+The shapes follow what the ePayment API returns for payment lookups,
+captures, refunds, event logs and webhooks, and what the views in
+core/views.py store in ``PaymentLog.response_data``.
+"""
+import datetime
+import random
+import uuid
+
+CURRENCY = "DKK"
+MERCHANT_SERIAL_NUMBER = "2087"
+
+
+def _amount(value):
+    return {"currency": CURRENCY, "value": value}
+
+
+def _aggregate(authorized=0, captured=0, refunded=0, cancelled=0):
+    return {
+        "authorizedAmount": _amount(authorized),
+        "cancelledAmount": _amount(cancelled),
+        "capturedAmount": _amount(captured),
+        "refundedAmount": _amount(refunded),
+    }
+
+
+def _timestamp(when):
+    return when.strftime('%Y-%m-%dT%H:%M:%S.') + f"{when.microsecond // 1000:03d}Z"
+
+
+def payment_details(reference, amount, state, rng=random, psp_reference=None):
+    """Body of GET /epayment/v1/payments/{reference}"""
+    captured = amount if state == "CAPTURED" else 0
+    authorized = amount if state in ("AUTHORIZED", "CAPTURED") else 0
+    return {
+        "aggregate": _aggregate(authorized=authorized, captured=captured),
+        "amount": _amount(amount),
+        "state": state,
+        "paymentMethod": {"type": "WALLET", "cardBin": rng.choice(["457100", "540185", "492942", "522334"])},
+        "profile": {"sub": str(uuid.UUID(int=rng.getrandbits(128)))},
+        "pspReference": psp_reference or str(rng.randrange(10 ** 9, 10 ** 10)),
+        "redirectUrl": f"https://landing.vipps.no/?token=eyJraWQiOiJqd3RrZXkiLCJhbGciOiJSUzI1NiJ9.{uuid.UUID(int=rng.getrandbits(128)).hex}",
+        "reference": reference,
+        "paymentDescription": f"Order {reference}",
+    }
+
+
+def modification_response(reference, amount, state="AUTHORIZED", captured=0, refunded=0, rng=random):
+    """Body returned by the capture, refund and cancel endpoints"""
+    return {
+        "amount": _amount(amount),
+        "state": state,
+        "aggregate": _aggregate(authorized=amount, captured=captured, refunded=refunded),
+        "pspReference": str(rng.randrange(10 ** 9, 10 ** 10)),
+        "reference": reference,
+    }
+
+
+def webhook_event(reference, amount, name, when, rng=random):
+    """Body of an ePayment webhook callback"""
+    return {
+        "msn": MERCHANT_SERIAL_NUMBER,
+        "reference": reference,
+        "pspReference": str(rng.randrange(10 ** 9, 10 ** 10)),
+        "name": name,
+        "amount": _amount(amount),
+        "timestamp": _timestamp(when),
+        "idempotencyKey": None,
+        "success": True,
+    }
+
+
+def event_log(reference, amount, names, start, rng=random):
+    """Body of GET /epayment/v1/payments/{reference}/events"""
+    events = []
+    when = start
+    for name in names:
+        when += datetime.timedelta(seconds=rng.randint(5, 120))
+        event = webhook_event(reference, amount, name, when, rng=rng)
+        event.pop("msn")
+        events.append(event)
+    return events
+
+
+def checkout_created(reference, rng=random):
+    """Body of POST /epayment/v1/payments"""
+    return {
+        "redirectUrl": f"https://landing.vipps.no/?token=eyJraWQiOiJqd3RrZXkiLCJhbGciOiJSUzI1NiJ9.{uuid.UUID(int=rng.getrandbits(128)).hex}",
+        "reference": reference,
+    }
+
+
+def payment_log_corpus(count, seed=0):
+    """Return ``count`` payloads with roughly the mix stored by the views:
+    mostly status polls, plus webhooks, captures, event lookups and refunds.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    corpus = []
+    while len(corpus) < count:
+        reference = f"order-{rng.getrandbits(32):08x}"
+        amount = rng.choice([49900, 59900, 69900, 79900]) + rng.choice([0, 25000]) + rng.choice([0, 4900])
+        psp_reference = str(rng.randrange(10 ** 9, 10 ** 10))
+        corpus.append(checkout_created(reference, rng=rng))
+        for _ in range(rng.randint(2, 12)):
+            corpus.append(payment_details(reference, amount, "CREATED", rng=rng, psp_reference=psp_reference))
+        corpus.append(webhook_event(reference, amount, "AUTHORIZED", start, rng=rng))
+        corpus.append(modification_response(reference, amount, captured=amount, rng=rng))
+        for _ in range(rng.randint(1, 6)):
+            corpus.append(payment_details(reference, amount, "CAPTURED", rng=rng, psp_reference=psp_reference))
+        if rng.random() < 0.2:
+            corpus.append(event_log(reference, amount, ["CREATED", "AUTHORIZED", "CAPTURED"], start, rng=rng))
+        if rng.random() < 0.05:
+            corpus.append(modification_response(reference, amount, captured=amount, refunded=amount, rng=rng))
+        start += datetime.timedelta(minutes=rng.randint(1, 90))
+    return corpus[:count]
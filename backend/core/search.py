@@ -0,0 +1,219 @@
+"""Indexed search over customers and order references.
+
+Every customer and order has a SearchEntry row holding its lower-cased
+search text. For a customer that is name, email, phone (also as bare
+digits), address and city; for an order it is the reference. The rows are
+kept in sync by post_save/post_delete signals. Bulk writes bypass those,
+so run the ``rebuild_search_index`` command after them.
+
+Queries match substrings, so partial emails ("jens@exa") and parts of a
+reference work. A query that looks like a phone number is reduced to its
+digits, and an international prefix (+45 or 0045) is dropped, so
+"+45 12 34 56 78" finds both "12345678" and "+4512345678". Each term of
+a multi-word query has to match.
+
+The index behind the entries depends on the database:
+- SQLite: an FTS5 table with the trigram tokenizer, maintained by triggers.
+- PostgreSQL: a pg_trgm GIN index, which serves LIKE '%term%' directly.
+
+Terms shorter than three characters cannot use a trigram index and fall
+back to a LIKE over the entries that the longer terms matched.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+
+from .models import Customer, Order, SearchEntry
+
+FTS_TABLE = 'core_searchentry_fts'
+# Trigram indexes can only look up terms of at least this many characters
+MIN_INDEXED_LENGTH = 3
+
+_PHONE = re.compile(r'^\+?[\d\s().-]+$')
+_NON_DIGITS = re.compile(r'\D')
+_SEPARATORS = re.compile(r'[\s().-]')
+# Customers are in Denmark; their numbers are stored with or without this country code
+COUNTRY_CODE = '45'
+_INTERNATIONAL_PREFIX = re.compile(rf'^(?:\+|00){COUNTRY_CODE}')
+CUSTOMER_FIELDS = ['first_name', 'last_name', 'email', 'phone', 'address', 'city']
+
+_SQLITE_SETUP = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"document, content='core_searchentry', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS core_searchentry_ai AFTER INSERT ON core_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.id, new.document); END",
+    f"CREATE TRIGGER IF NOT EXISTS core_searchentry_ad AFTER DELETE ON core_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.id, old.document); END",
+    f"CREATE TRIGGER IF NOT EXISTS core_searchentry_au AFTER UPDATE ON core_searchentry BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.id, old.document); "
+    f"INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.id, new.document); END",
+]
+_SQLITE_TEARDOWN = [
+    "DROP TRIGGER IF EXISTS core_searchentry_ai",
+    "DROP TRIGGER IF EXISTS core_searchentry_ad",
+    "DROP TRIGGER IF EXISTS core_searchentry_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+_POSTGRESQL_SETUP = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_searchentry_document_trgm ON core_searchentry USING gin (document gin_trgm_ops)",
+]
+_POSTGRESQL_TEARDOWN = [
+    "DROP INDEX IF EXISTS core_searchentry_document_trgm",
+]
+
+# Whether the FTS5 table exists; looked up once per process
+_state = {'fts': None}
+
+
+def customer_document(customer):
+    values = [getattr(customer, name) or '' for name in CUSTOMER_FIELDS]
+    values.append(_NON_DIGITS.sub('', customer.phone or ''))
+    return '\n'.join(values).lower()
+
+
+def order_document(order):
+    return (order.reference or '').lower()
+
+
+def install_index(db):
+    """Create the search index for SearchEntry on the ``db`` connection (safe to run again)"""
+    vendor = db.vendor
+    if vendor == 'sqlite':
+        # Django rebuilds SQLite tables on some schema changes, which drops these triggers;
+        # rebuild_search_index puts them back
+        statements = _SQLITE_SETUP
+    elif vendor == 'postgresql':
+        statements = _POSTGRESQL_SETUP
+    else:
+        return
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _state['fts'] = None
+
+
+def uninstall_index(db):
+    statements = {'sqlite': _SQLITE_TEARDOWN, 'postgresql': _POSTGRESQL_TEARDOWN}.get(db.vendor, [])
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    _state['fts'] = None
+
+
+def _has_fts():
+    if _state['fts'] is None:
+        _state['fts'] = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+    return _state['fts']
+
+
+def _terms(query):
+    query = query.strip().lower()
+    if _PHONE.match(query):
+        # The number without the country code is in the document however the phone was stored
+        digits = _NON_DIGITS.sub('', _INTERNATIONAL_PREFIX.sub('', _SEPARATORS.sub('', query)))
+        if len(digits) >= MIN_INDEXED_LENGTH:
+            return [digits]
+    return query.split()
+
+
+def matching_ids(kind, query):
+    """Return the ids of the ``kind`` objects matching every term of ``query``, as a subquery"""
+    terms = _terms(query)
+    entries = SearchEntry.objects.filter(kind=kind)
+    if not terms:
+        return entries.none().values('object_id')
+
+    if _has_fts():
+        indexed = [term for term in terms if len(term) >= MIN_INDEXED_LENGTH]
+        if indexed:
+            # Each term as a quoted FTS5 string, so user input is never parsed as query syntax
+            match = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in indexed)
+            entries = entries.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+        terms = [term for term in terms if len(term) < MIN_INDEXED_LENGTH]
+
+    for term in terms:
+        entries = entries.filter(document__contains=term)
+    return entries.values('object_id')
+
+
+def search_customers(query, queryset=None):
+    queryset = Customer.objects.all() if queryset is None else queryset
+    return queryset.filter(pk__in=matching_ids('customer', query))
+
+
+def search_orders(query, queryset=None):
+    """Orders whose reference, or whose customer, matches ``query``"""
+    queryset = Order.objects.all() if queryset is None else queryset
+    return queryset.filter(
+        Q(pk__in=matching_ids('order', query)) | Q(customer_id__in=matching_ids('customer', query))
+    )
+
+
+def index_customer(customer):
+    SearchEntry.objects.update_or_create(
+        kind='customer', object_id=customer.pk, defaults={'document': customer_document(customer)},
+    )
+
+
+def index_order(order):
+    SearchEntry.objects.update_or_create(
+        kind='order', object_id=order.pk, defaults={'document': order_document(order)},
+    )
+
+
+def rebuild(batch_size=2000):
+    """Recreate every search entry from the customers and orders; returns the number written"""
+    written = 0
+    with transaction.atomic():
+        install_index(connection)
+        SearchEntry.objects.all().delete()
+        for kind, queryset, document in [
+            ('customer', Customer.objects.only('id', *CUSTOMER_FIELDS), customer_document),
+            ('order', Order.objects.only('id', 'reference'), order_document),
+        ]:
+            batch = []
+            for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(SearchEntry(kind=kind, object_id=obj.pk, document=document(obj)))
+                if len(batch) >= batch_size:
+                    SearchEntry.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            SearchEntry.objects.bulk_create(batch)
+            written += len(batch)
+        if _has_fts():
+            # Also repairs an index that missed writes while its triggers were gone
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return written
+
+
+def _customer_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(CUSTOMER_FIELDS):
+        return
+    index_customer(instance)
+
+
+def _order_saved(sender, instance, created, **kwargs):
+    # The reference never changes once the order exists
+    if created:
+        index_order(instance)
+
+
+def _customer_deleted(sender, instance, **kwargs):
+    SearchEntry.objects.filter(kind='customer', object_id=instance.pk).delete()
+
+
+def _order_deleted(sender, instance, **kwargs):
+    SearchEntry.objects.filter(kind='order', object_id=instance.pk).delete()
+
+
+def connect():
+    """Keep the search entries in sync with customers and orders (called from CoreConfig.ready)"""
+    post_save.connect(_customer_saved, sender=Customer, dispatch_uid='search_customer_saved')
+    post_save.connect(_order_saved, sender=Order, dispatch_uid='search_order_saved')
+    post_delete.connect(_customer_deleted, sender=Customer, dispatch_uid='search_customer_deleted')
+    post_delete.connect(_order_deleted, sender=Order, dispatch_uid='search_order_deleted')
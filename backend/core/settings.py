@@ -20,6 +20,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load environment variables from .env file
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 
+# Next.js static export (`npm run build` in the frontend)
+FRONTEND_BUILD_DIR = os.getenv('FRONTEND_BUILD_DIR', os.path.join(BASE_DIR, 'frontend', 'out'))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -53,6 +56,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves static files before sessions, CSRF and auth ever run for them
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +65,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this for static files
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -69,7 +73,7 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [
-            os.path.join(BASE_DIR, 'frontend', 'out'),  # Next.js static export
+            FRONTEND_BUILD_DIR,  # Next.js static export
             os.path.join(BASE_DIR, 'core', 'templates'),  # Django templates
         ],
         'APP_DIRS': True,
@@ -94,8 +98,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections between requests, so the one opened by core.warmup is reused
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),  # seconds
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# PostgreSQL instead of SQLite when POSTGRES_DB is set (requires the 'psycopg' package)
+if os.getenv('POSTGRES_DB'):
+    DATABASES['default'].update({
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB'),
+        'USER': os.getenv('POSTGRES_USER', ''),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', ''),
+        'PORT': os.getenv('POSTGRES_PORT', ''),
+    })
 
 
 # Password validation
@@ -131,10 +148,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATICFILES_DIRS = [
-    os.path.join(BASE_DIR, 'frontend', 'out', '_next'),  # Next.js static files
+    os.path.join(FRONTEND_BUILD_DIR, '_next'),  # Next.js static files
 ]
 STATIC_URL = '/_next/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # collectstatic writes .br/.gz next to each file for WhiteNoise to serve
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage',
+    },
+}
+# Also serve the rest of the export (images, models, ...) from the WhiteNoise fast path;
+# run `manage.py compress_frontend` after each build to precompress it.
+WHITENOISE_ROOT = FRONTEND_BUILD_DIR if os.path.isdir(FRONTEND_BUILD_DIR) else None
+# Next.js puts a content hash in every file under _next/static/, so they never change
+WHITENOISE_IMMUTABLE_FILE_TEST = r'^/_next/static/'
+# Exported HTML pages are served from memory (see core.frontend_pages); how often each
+# process checks for a new build, and how long shared caches may reuse a page
+FRONTEND_PAGE_CHECK_INTERVAL = float(os.getenv('FRONTEND_PAGE_CHECK_INTERVAL', '2'))  # seconds
+FRONTEND_PAGE_SHARED_MAX_AGE = int(os.getenv('FRONTEND_PAGE_SHARED_MAX_AGE', '60'))  # seconds
 
 # Vipps/MobilePay API settings from environment variables
 VIPPS_CLIENT_ID = os.getenv('VIPPS_CLIENT_ID')
@@ -143,6 +178,53 @@ VIPPS_SUBSCRIPTION_KEY = os.getenv('VIPPS_SUBSCRIPTION_KEY')
 VIPPS_MERCHANT_SERIAL_NUMBER = os.getenv('VIPPS_MERCHANT_SERIAL_NUMBER')
 VIPPS_TEST_MODE = os.getenv('VIPPS_TEST_MODE', 'True').lower() in ('true', '1', 't')
 
+# Shared Vipps HTTP client (see payments.client)
+VIPPS_HTTP_TIMEOUT = int(os.getenv('VIPPS_HTTP_TIMEOUT', '15'))  # seconds
+VIPPS_HTTP_POOL_SIZE = int(os.getenv('VIPPS_HTTP_POOL_SIZE', '10'))
+
+# Worker warm-up (see core.warmup): timeout for pre-opening Vipps connections, and how many to open
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '5'))  # seconds
+WARMUP_VIPPS_CONNECTIONS = int(os.getenv('WARMUP_VIPPS_CONNECTIONS', '2'))
+
+# How often each process checks whether the cached product catalog is stale (see products.catalog)
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', '5'))  # seconds
+# Server-side carts (see products.carts) are kept in the database and expire after CART_TTL seconds unused
+CART_TTL = int(os.getenv('CART_TTL', str(14 * 24 * 3600)))  # seconds
+# Idempotency-Key responses for checkout creation (see core.idempotency): how long they are kept,
+# how long a request may hold its key, and how long a concurrent retry waits for it
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))  # seconds
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '60'))  # seconds
+IDEMPOTENCY_WAIT = float(os.getenv('IDEMPOTENCY_WAIT', '25'))  # seconds
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# Order references (see core.references): give each host a distinct number 0-262143 when several
+# hosts create orders; otherwise it is derived from the hostname
+ORDER_REFERENCE_NODE = os.getenv('ORDER_REFERENCE_NODE')
+# Reject pickup-point shipping without a pickupPointId (off until the storefront sends one)
+CHECKOUT_REQUIRE_PICKUP_POINT = os.getenv('CHECKOUT_REQUIRE_PICKUP_POINT', 'False').lower() in ('true', '1', 't')
+
+# PaymentLog retention (see core.retention)
+PAYMENT_LOG_RETENTION_DAYS = int(os.getenv('PAYMENT_LOG_RETENTION_DAYS', '90'))
+PAYMENT_LOG_ARCHIVE_DIR = os.getenv('PAYMENT_LOG_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive', 'payment_logs'))
+# Monthly partitions for PaymentLog on PostgreSQL (see core.partitions); applied by migration 0007,
+# so turn it on before migrating. Partitions are kept this many months ahead.
+PAYMENT_LOG_PARTITIONING = os.getenv('PAYMENT_LOG_PARTITIONING', 'False').lower() in ('true', '1', 't')
+PAYMENT_LOG_PARTITION_MONTHS_AHEAD = int(os.getenv('PAYMENT_LOG_PARTITION_MONTHS_AHEAD', '3'))
+# With partitioning on, the PaymentLog admin list opens on this many days of logs
+PAYMENT_LOG_ADMIN_DAYS = int(os.getenv('PAYMENT_LOG_ADMIN_DAYS', '30'))
+# The order change page shows this many of the order's latest payment logs; older ones load on demand
+ADMIN_ORDER_LOG_PAGE_SIZE = int(os.getenv('ADMIN_ORDER_LOG_PAGE_SIZE', '20'))
+# Buffered PaymentLog writes (see core.payment_log_writer): rows are written at request end, or
+# sooner once this many are waiting or the oldest has waited this long
+PAYMENT_LOG_BUFFER_SIZE = int(os.getenv('PAYMENT_LOG_BUFFER_SIZE', '50'))
+PAYMENT_LOG_FLUSH_INTERVAL = float(os.getenv('PAYMENT_LOG_FLUSH_INTERVAL', '2'))  # seconds
+# Store new PaymentLog payloads dictionary-compressed (see core.payload_codec)
+PAYMENT_LOG_COMPACT_STORAGE = os.getenv('PAYMENT_LOG_COMPACT_STORAGE', 'False').lower() in ('true', '1', 't')
+
 # MobilePay specific settings
 # Note: For ePayment API, we use the Vipps test environment, not MobilePay's separate endpoint
 MOBILEPAY_API_ENDPOINT = 'https://apitest.vipps.no' if VIPPS_TEST_MODE else 'https://api.vipps.no'
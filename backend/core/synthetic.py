@@ -0,0 +1,351 @@
+"""Synthetic customers, orders and payment logs for scale testing.
+
+``generate_chunk`` writes one chunk of customers together with their
+orders, order items and payment logs. The rows follow the shape of real
+traffic:
+- repeat customers
+- the status mix of orders
+- the catalog's fabric options and the vest add-on
+- a long tail of status polls per order
+- the Vipps payloads from core.sample_payloads
+
+Customers and orders are written with ``bulk_create``, which returns their
+ids. Items and payment logs make up most of the rows. They are built as
+plain tuples and written with ``executemany``, because building and
+preparing a model instance per row costs more than the INSERT itself.
+
+Each chunk has its own random generator, seeded from the run's seed and
+the chunk number. The same seed, counts and end date therefore produce
+the same rows however many worker processes share the chunks. Only the
+database ids depend on the order in which the chunks were written.
+
+Order references are built from the order's (synthetic) creation time,
+with the chunk number in the node id. They sort by created_at like real
+ones and cannot collide with each other. Running the same seed twice
+into one database does collide, so generate into an empty database.
+"""
+import contextlib
+import datetime
+import random
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .models import Customer, Order, OrderItem, PaymentLog
+from .references import HOST_BITS, MAX_SEQUENCE, PROCESS_BITS, format_reference
+from . import payload_codec, sample_payloads
+
+# Node ids of synthetic references: the highest host id, then the chunk number and the high bits of the order index
+SYNTHETIC_HOST = (1 << HOST_BITS) - 1
+
+FIRST_NAMES = [
+    'Anne', 'Kirsten', 'Mette', 'Hanne', 'Helle', 'Anna', 'Susanne', 'Lene', 'Maria', 'Marianne',
+    'Lone', 'Camilla', 'Pia', 'Louise', 'Charlotte', 'Ida', 'Emma', 'Sofie', 'Freja', 'Julie',
+    'Peter', 'Michael', 'Lars', 'Jens', 'Thomas', 'Henrik', 'Søren', 'Christian', 'Martin', 'Jan',
+    'Niels', 'Anders', 'Rasmus', 'Morten', 'Jesper', 'Mads', 'Frederik', 'Mikkel', 'Emil', 'Oliver',
+]
+LAST_NAMES = [
+    'Nielsen', 'Jensen', 'Hansen', 'Pedersen', 'Andersen', 'Christensen', 'Larsen', 'Sørensen',
+    'Rasmussen', 'Jørgensen', 'Petersen', 'Madsen', 'Kristensen', 'Olsen', 'Thomsen', 'Christiansen',
+    'Poulsen', 'Johansen', 'Møller', 'Mortensen', 'Knudsen', 'Jakobsen', 'Mikkelsen', 'Olesen',
+]
+# The weight is the last value of every tuple in these tables
+EMAIL_DOMAINS = [('gmail.com', 40), ('hotmail.com', 20), ('outlook.dk', 10), ('yahoo.dk', 5), ('live.dk', 8),
+                 ('mail.dk', 7), ('jubii.dk', 3), ('icloud.com', 7)]
+STREETS = [
+    'Vestergade', 'Østergade', 'Nørregade', 'Søndergade', 'Algade', 'Kirkevej', 'Skolevej', 'Møllevej',
+    'Stationsvej', 'Bakkevej', 'Engvej', 'Skovvej', 'Birkevej', 'Egevej', 'Strandvejen', 'Havnegade',
+]
+# (postal code, city, weight): roughly by population
+CITIES = [
+    ('1050', 'København K', 20), ('2100', 'København Ø', 10), ('2200', 'København N', 10), ('8000', 'Aarhus C', 14),
+    ('5000', 'Odense C', 9), ('9000', 'Aalborg', 8), ('6700', 'Esbjerg', 4), ('8900', 'Randers C', 4),
+    ('6000', 'Kolding', 4), ('8700', 'Horsens', 4), ('7100', 'Vejle', 4), ('4000', 'Roskilde', 4),
+    ('7400', 'Herning', 3), ('3400', 'Hillerød', 3), ('4700', 'Næstved', 3), ('8800', 'Viborg', 3),
+]
+
+# (status, how far the payment got, weight)
+STATUS_MIX = [
+    ('COMPLETED', 'captured', 52),
+    ('SHIPPED', 'captured', 14),
+    ('PAYMENT_CONFIRMED', 'captured', 8),
+    ('REFUNDED', 'refunded', 3),
+    ('CREATED', 'abandoned', 9),
+    ('PROCESSING', 'abandoned', 1),
+    ('SESSION_CANCELLED', 'cancelled', 6),
+    ('PAYMENT_FAILED', 'failed', 5),
+    ('SESSION_FAILED', 'error', 2),
+]
+
+# From the default catalog (products migration 0002): (name, fabric count, price in øre)
+FABRIC_OPTIONS = [
+    ('1 type of fabric', 1, 49900), ('2 types of fabric', 2, 59900),
+    ('3 types of fabric', 3, 69900), ('4 types of fabric', 4, 79900),
+]
+FABRIC_WEIGHTS = [15, 30, 35, 20]
+VEST_PRICE = 25000
+VEST_SHARE = 0.3
+FACE_STYLES = ['Face 1', 'Face 2', 'Face 3']
+GARMENTS = [
+    'skjorte', 'sweater', 'strikbluse', 'kjole', 'flonelsskjorte', 'uldtrøje', 'cardigan', 'slips',
+    'nattøj', 'jakke', 't-shirt', 'tørklæde', 'bukser', 'nederdel', 'hættetrøje', 'arbejdsskjorte',
+]
+OWNERS = ['Fars', 'Mors', 'Mormors', 'Morfars', 'Farmors', 'Farfars', 'Min mands', 'Min kones', 'Onkel Bents', 'Tante Ruths']
+COLOURS = ['blå', 'rød', 'grøn', 'ternede', 'stribede', 'grå', 'sorte', 'hvide', 'brune', 'blomstrede']
+# (shipping method, cost in øre, weight)
+SHIPPING = [('home', 4900, 60), ('pickup', 3900, 40)]
+
+# Chunk numbers share the 22 process bits of the node id with the high bits of the order index
+MAX_CHUNKS = 1 << 12
+
+ITEM_FIELDS = [
+    'order', 'name', 'price', 'quantity', 'fabric_type', 'body_fabric', 'head_fabric',
+    'under_arms_fabric', 'belly_fabric', 'has_vest', 'vest_fabric', 'face_style',
+]
+LOG_FIELDS = [
+    'order', 'transaction_id', 'event_type', 'amount', 'status', 'response_data', 'created_at',
+    'repeat_count', 'response_data_compact', 'payload_dictionary',
+]
+
+
+@contextlib.contextmanager
+def explicit_timestamps():
+    """Let bulk_create store the generated created_at/updated_at instead of the current time"""
+    fields = [
+        field for model in (Customer, Order) for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _adapter(field):
+    """The conversion ``field``'s values need before the database takes them, or None"""
+    ops = connection.ops
+    if isinstance(field, models.DateTimeField):
+        return ops.adapt_datetimefield_value
+    if isinstance(field, models.JSONField):
+        return lambda value: None if value is None else ops.adapt_json_value(value, field.encoder)
+    return None
+
+
+def insert_rows(model, field_names, rows, batch_size=2000):
+    """INSERT ``rows`` (tuples in ``field_names`` order) into ``model``'s table without building instances"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    adapters = [(index, _adapter(field)) for index, field in enumerate(fields) if _adapter(field)]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        for first in range(0, len(rows), batch_size):
+            batch = []
+            for row in rows[first:first + batch_size]:
+                row = list(row)
+                for index, adapt in adapters:
+                    row[index] = adapt(row[index])
+                batch.append(row)
+            cursor.executemany(sql, batch)
+
+
+class ChunkGenerator:
+    """Builds the rows of one chunk; all randomness comes from ``rng``"""
+
+    def __init__(self, rng, chunk, start, end):
+        self.rng = rng
+        self.chunk = chunk
+        self.start = start
+        self.end = end
+        self.span = (end - start).total_seconds()
+        self.order_count = 0
+        # Compact storage as PaymentLog.save() would do it, which executemany bypasses
+        self.dictionary_id = None
+        if getattr(settings, 'PAYMENT_LOG_COMPACT_STORAGE', False):
+            self.dictionary_id = payload_codec.get_active_dictionary_id()
+        self.codec = payload_codec.get_codec(self.dictionary_id) if self.dictionary_id else None
+
+    def _weighted(self, choices):
+        return self.rng.choices(choices, weights=[choice[-1] for choice in choices])[0]
+
+    def customer(self):
+        rng = self.rng
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        domain = self._weighted(EMAIL_DOMAINS)[0]
+        local = f"{first}.{last}" if rng.random() < 0.5 else f"{first}{rng.randint(1, 9999)}"
+        postal_code, city, _ = self._weighted(CITIES)
+        # Growth: sign-ups lean towards the end of the period
+        created_at = self.start + datetime.timedelta(seconds=self.span * rng.random() ** 0.7)
+        return Customer(
+            first_name=first,
+            last_name=last,
+            email=f"{local}@{domain}".lower(),
+            phone=f"+45{rng.randint(20000000, 99999999)}",
+            address=f"{rng.choice(STREETS)} {rng.randint(1, 180)}{rng.choice(['', '', '', ', 1. tv', ', 2. th', ', st.'])}",
+            postal_code=postal_code,
+            city=city,
+            marketing_consent=rng.random() < 0.35,
+            created_at=created_at,
+            updated_at=created_at,
+        )
+
+    def orders_for(self, customer):
+        """The customer's first order when signing up, and any repeat orders weeks or months later"""
+        rng = self.rng
+        roll = rng.random()
+        count = 1 if roll < 0.75 else 2 if roll < 0.93 else 3 if roll < 0.98 else rng.randint(4, 8)
+        created_at = customer.created_at
+        orders = []
+        for _ in range(count):
+            if created_at >= self.end:
+                break
+            orders.append(self.order(customer, created_at))
+            created_at += datetime.timedelta(days=rng.expovariate(1 / 90))
+        return orders
+
+    def order(self, customer, created_at):
+        rng = self.rng
+        status, outcome, _ = self._weighted(STATUS_MIX)
+        shipping_method, shipping_cost, _ = self._weighted(SHIPPING)
+
+        index = self.order_count
+        self.order_count += 1
+        high, sequence = divmod(index, MAX_SEQUENCE + 1)
+        node = (SYNTHETIC_HOST << PROCESS_BITS) | (self.chunk << 10) | (high & 0x3FF)
+        items = self.items()
+        finished = created_at + datetime.timedelta(minutes=rng.uniform(1, 20))
+
+        order = Order(
+            reference=format_reference(int(created_at.timestamp() * 1000), node, sequence),
+            customer=customer,
+            callback_token=f"{rng.getrandbits(128):032x}",
+            amount=sum(item[1] * item[2] for item in items) + shipping_cost,
+            status=status,
+            shipping_method=shipping_method,
+            shipping_cost=shipping_cost,
+            pickup_point_id=str(rng.randint(1000, 99999)) if shipping_method == 'pickup' else None,
+            payment_method='mobilepay' if rng.random() < 0.9 else 'card',
+            created_at=created_at,
+            updated_at=created_at if outcome == 'abandoned' else finished,
+            completed_at=finished if outcome in ('captured', 'refunded') else None,
+        )
+        return order, outcome, items
+
+    def _fabric(self):
+        rng = self.rng
+        return f"{rng.choice(OWNERS)} {rng.choice(COLOURS)} {rng.choice(GARMENTS)}"
+
+    def items(self):
+        """Item rows without their order id, in ITEM_FIELDS order"""
+        rng = self.rng
+        roll = rng.random()
+        count = 1 if roll < 0.85 else 2 if roll < 0.97 else 3
+        items = []
+        for _ in range(count):
+            name, fabric_count, price = rng.choices(FABRIC_OPTIONS, weights=FABRIC_WEIGHTS)[0]
+            fabrics = [self._fabric() for _ in range(fabric_count)]
+            # Body, head, under arms and belly, from as many fabrics as were ordered
+            parts = [fabrics[min(part, fabric_count - 1)] for part in range(4)]
+            has_vest = rng.random() < VEST_SHARE
+            items.append((
+                'MemoryBear', price + (VEST_PRICE if has_vest else 0), 1 if rng.random() < 0.95 else 2, name,
+                *parts, has_vest, self._fabric() if has_vest else None, rng.choice(FACE_STYLES),
+            ))
+        return items
+
+    def _polls(self):
+        # Mostly a handful of status polls, with a long tail of payment pages left open
+        return min(int(self.rng.paretovariate(1.6) * 2), 400)
+
+    def logs(self, order, outcome):
+        """Log rows for the order, in LOG_FIELDS order"""
+        rng = self.rng
+        reference, amount = order.reference, order.amount
+        psp_reference = str(rng.randrange(10 ** 9, 10 ** 10))
+        when = order.created_at
+        logs = []
+
+        def log(event_type, status, payload, log_amount=None, seconds=(1, 30)):
+            nonlocal when
+            when += datetime.timedelta(seconds=rng.uniform(*seconds))
+            compact = None
+            if self.codec is not None:
+                compact, payload = self.codec.compress(payload), None
+            logs.append((
+                order.pk, psp_reference if event_type != 'EPAYMENT_CHECKOUT_CREATED' else None, event_type,
+                log_amount, status, payload, when, 1, compact, self.dictionary_id if compact is not None else None,
+            ))
+
+        if outcome == 'error':
+            log('EPAYMENT_CHECKOUT_ERROR', 'ERROR', {'error': 'Failed to create payment session', 'status': 502})
+            return logs
+
+        log('EPAYMENT_CHECKOUT_CREATED', 'CREATED', sample_payloads.checkout_created(reference, rng=rng), amount)
+        state = {'cancelled': 'ABORTED', 'failed': 'TERMINATED'}.get(outcome, 'CREATED')
+        for _ in range(self._polls()):
+            log('EPAYMENT_STATUS_CHECK', state,
+                sample_payloads.payment_details(reference, amount, state, rng=rng, psp_reference=psp_reference),
+                seconds=(2, 15))
+
+        if outcome == 'cancelled':
+            log('PAYMENT_CANCELLED', 'CANCELLED', sample_payloads.webhook_event(reference, amount, 'ABORTED', when, rng=rng))
+        elif outcome == 'failed':
+            log('EPAYMENT_CALLBACK', 'PAYMENT_FAILED', sample_payloads.webhook_event(reference, amount, 'TERMINATED', when, rng=rng))
+        elif outcome in ('captured', 'refunded'):
+            log('EPAYMENT_CALLBACK', 'AUTHORIZED', sample_payloads.webhook_event(reference, amount, 'AUTHORIZED', when, rng=rng))
+            log('PAYMENT_CAPTURED', 'CAPTURED',
+                sample_payloads.modification_response(reference, amount, captured=amount, rng=rng), amount)
+            for _ in range(rng.randint(0, 4)):
+                log('RETURN_URL_STATUS_CHECK', 'CAPTURED',
+                    sample_payloads.payment_details(reference, amount, 'CAPTURED', rng=rng, psp_reference=psp_reference))
+            if rng.random() < 0.2:
+                log('EPAYMENT_EVENTS_CHECK', 'CAPTURED',
+                    sample_payloads.event_log(reference, amount, ['CREATED', 'AUTHORIZED', 'CAPTURED'], order.created_at, rng=rng))
+            if outcome == 'refunded':
+                log('REFUND', 'REFUNDED',
+                    sample_payloads.modification_response(reference, amount, captured=amount, refunded=amount, rng=rng),
+                    amount, seconds=(86400, 30 * 86400))
+        return logs
+
+
+def generate_chunk(seed, chunk, customers, start, end, batch_size=2000):
+    """Write chunk number ``chunk``: ``customers`` customers created between ``start`` and ``end``, and their orders.
+
+    Returns the number of rows written per model.
+    """
+    if not 0 <= chunk < MAX_CHUNKS:
+        raise ValueError(f"Chunk numbers go up to {MAX_CHUNKS - 1}")
+    generator = ChunkGenerator(random.Random(f"{seed}:{chunk}"), chunk, start, end)
+    counts = {'customers': 0, 'orders': 0, 'items': 0, 'logs': 0}
+    # Customers per transaction. This bounds the rows held in memory, and keeps each write transaction short
+    # so the running site is not kept waiting for the database (SQLite's single writer lock in particular).
+    # Generating the rows, not committing them, sets the pace: larger groups are no faster.
+    group_size = max(batch_size // 4, 1)
+
+    with explicit_timestamps():
+        for first in range(0, customers, group_size):
+            group = [generator.customer() for _ in range(min(group_size, customers - first))]
+            orders = [order for customer in group for order in generator.orders_for(customer)]
+            with transaction.atomic():
+                Customer.objects.bulk_create(group, batch_size=batch_size)
+                # bulk_create takes customer_id from the customers it just saved
+                Order.objects.bulk_create([order for order, _, _ in orders], batch_size=batch_size)
+
+                items, logs = [], []
+                for order, outcome, order_items in orders:
+                    items.extend((order.pk, *item) for item in order_items)
+                    logs.extend(generator.logs(order, outcome))
+                insert_rows(OrderItem, ITEM_FIELDS, items, batch_size)
+                insert_rows(PaymentLog, LOG_FIELDS, logs, batch_size)
+
+            counts['customers'] += len(group)
+            counts['orders'] += len(orders)
+            counts['items'] += len(items)
+            counts['logs'] += len(logs)
+    return counts
@@ -0,0 +1,568 @@
+import datetime
+import hashlib
+import tempfile
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from products import carts
+from products.catalog import get_catalog
+
+from . import frontend_pages, idempotency, keyset, partitions, payment_log_writer, references, search
+from .analytics import refresh_sales_rollups, summarize_rollups
+from .exports import export_queryset, iter_order_records
+from .order_states import transition_order
+from .models import (
+    Customer, DailyOptionRollup, DailySalesRollup, IdempotencyLock, IdempotencyResponse, Order, OrderItem, PaymentLog,
+    PaymentLogSummary, RetentionWatermark,
+)
+from .retention import archive_old_logs, collapse_status_checks
+
+
+def make_order(**fields):
+    fields.setdefault('callback_token', 'token')
+    fields.setdefault('amount', 54800)
+    return Order.objects.create(**fields)
+
+
+class SalesRollupTests(TestCase):
+    def test_missing_and_blank_option_values_share_one_row(self):
+        order = make_order(status='COMPLETED')
+        OrderItem.objects.create(order=order, name='MemoryBear', price=49900, fabric_type=None)
+        OrderItem.objects.create(order=order, name='MemoryBear', price=49900, quantity=2, fabric_type='')
+
+        refresh_sales_rollups(full=True)
+
+        row = DailyOptionRollup.objects.get(option='fabric_type')
+        self.assertEqual(row.value, 'unknown')
+        self.assertEqual(row.item_count, 2)
+        self.assertEqual(row.quantity, 3)
+        # The refresh that failed before must keep working afterwards
+        self.assertEqual(len(refresh_sales_rollups(full=True)), 1)
+
+    def test_log_stamped_before_the_last_refresh_but_written_after_it_is_counted(self):
+        order = make_order(status='COMPLETED')
+        refresh_sales_rollups(full=True)
+        refreshed_at = DailySalesRollup.objects.get().refreshed_at
+
+        # A buffered capture: its event time is before the refresh, its INSERT after it
+        PaymentLog.objects.create(order=order, event_type='CAPTURE', status='CAPTURED', amount=54800,
+                                  created_at=refreshed_at - datetime.timedelta(seconds=1))
+        refresh_sales_rollups()
+
+        self.assertEqual(DailySalesRollup.objects.get().captured_amount, 54800)
+
+
+class ArchivedLogTotalsTests(TestCase):
+    """Captures and refunds still count once their logs have been archived"""
+
+    def setUp(self):
+        created_at = timezone.now() - datetime.timedelta(days=400)
+        self.order = make_order(status='REFUNDED')
+        Order.objects.filter(pk=self.order.pk).update(created_at=created_at)
+        for event_type, status, amount in [
+            ('EPAYMENT_STATUS_CHECK', 'CREATED', None),
+            ('PAYMENT_CAPTURED', 'CAPTURED', 54800),
+            ('REFUND', 'REFUNDED', 20000),
+        ]:
+            created_at += datetime.timedelta(minutes=1)
+            PaymentLog.objects.create(order=self.order, event_type=event_type, status=status, amount=amount,
+                                      created_at=created_at)
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+
+    def totals(self):
+        refresh_sales_rollups(full=True)
+        rollups = summarize_rollups(DailySalesRollup.objects.all())
+        record, = iter_order_records(export_queryset())
+        return {
+            'rollup': (rollups['captured_order_count'], rollups['captured_amount'],
+                       rollups['refunded_order_count'], rollups['refunded_amount']),
+            'export': (record['captured_amount'], record['refunded_amount']),
+        }
+
+    def test_totals_survive_archival(self):
+        before = self.totals()
+        self.assertEqual(before, {'rollup': (1, 54800, 1, 20000), 'export': (54800, 20000)})
+
+        archived, _ = archive_old_logs(days=365, archive_dir=self.archive_dir)
+
+        self.assertEqual(archived, 3)
+        self.assertFalse(PaymentLog.objects.exists())
+        self.assertEqual(self.totals(), before)
+
+    def test_order_with_live_and_archived_captures_is_counted_once(self):
+        archive_old_logs(days=365, archive_dir=self.archive_dir)
+        PaymentLog.objects.create(order=self.order, event_type='CAPTURE', status='CAPTURED', amount=100)
+
+        totals = self.totals()
+
+        self.assertEqual(totals['rollup'][:2], (1, 54900))
+        self.assertEqual(totals['export'][0], 54900)
+        self.assertEqual(PaymentLogSummary.objects.get().captured_amount, 54800)
+
+
+class CollapseStatusCheckTests(TestCase):
+    def setUp(self):
+        self.order = make_order()
+        self.start = timezone.now() - datetime.timedelta(hours=2)
+
+    def check(self, minutes, state='AUTHORIZED', created_at=None):
+        return PaymentLog.objects.create(
+            order=self.order, event_type='EPAYMENT_STATUS_CHECK', status=state, response_data={'state': state},
+            created_at=created_at or self.start + datetime.timedelta(minutes=minutes),
+        )
+
+    def collapse(self, **kwargs):
+        return collapse_status_checks(older_than=datetime.timedelta(0), batch_size=1, **kwargs)
+
+    def test_runs_of_identical_checks_keep_their_first_row(self):
+        first = self.check(0, 'CREATED')
+        self.check(1, 'CREATED')
+        authorized = self.check(2)
+        self.check(3)
+        last = self.check(4)
+
+        self.assertEqual(self.collapse(), 3)
+        rows = {log.pk: log for log in PaymentLog.objects.all()}
+        self.assertEqual(sorted(rows), [first.pk, authorized.pk])
+        self.assertEqual((rows[first.pk].repeat_count, rows[authorized.pk].repeat_count), (2, 3))
+        self.assertEqual(rows[authorized.pk].last_seen_at, last.created_at)
+
+    def test_later_runs_only_read_new_rows_and_continue_earlier_runs(self):
+        kept = self.check(0)
+        self.check(1)
+        self.collapse()
+
+        # Written before the watermark after it was set: only a full run looks at it again.
+        # The next row continues the run it ends.
+        late = self.check(2)
+        self.check(3, created_at=RetentionWatermark.objects.get().position)
+        self.assertEqual(self.collapse(), 1)
+        self.assertEqual(PaymentLog.objects.get(pk=kept.pk).repeat_count, 2)
+        self.assertEqual(PaymentLog.objects.get(pk=late.pk).repeat_count, 2)
+
+        self.assertEqual(self.collapse(full=True), 1)
+        self.assertEqual(PaymentLog.objects.get().repeat_count, 4)
+
+@skipUnless(connection.vendor == 'postgresql', "PaymentLog partitioning needs PostgreSQL (set POSTGRES_DB)")
+@override_settings(PAYMENT_LOG_PARTITIONING=True, PAYMENT_LOG_PARTITION_MONTHS_AHEAD=2)
+class PaymentLogPartitionTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.old_month = partitions.add_months(partitions.month_start(self.now), -4)
+        self.order = make_order()
+        self.old_log = self.log(created_at=self.old_month + datetime.timedelta(days=3))
+        # Whatever the migrations did, start from a plain table
+        with connection.schema_editor() as schema_editor:
+            partitions.unpartition_payment_logs(None, schema_editor)
+        partitions.partition_table()
+
+    def log(self, **fields):
+        fields.setdefault('event_type', 'EPAYMENT_STATUS_CHECK')
+        fields.setdefault('status', 'CREATED')
+        return PaymentLog.objects.create(order=self.order, **fields)
+
+    def query(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def table_state(self):
+        with connection.cursor() as cursor:
+            partitioned = partitions.is_partitioned(cursor)
+            months = sorted(partitions.attached_partitions(cursor))
+        primary_key = self.query(
+            "SELECT a.attname FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+            "WHERE i.indrelid = %s::regclass AND i.indisprimary ORDER BY a.attname",
+            [partitions.TABLE],
+        )
+        indexes = {row[0] for row in self.query("SELECT indexname FROM pg_indexes WHERE tablename = %s", [partitions.TABLE])}
+        return partitioned, months, [row[0] for row in primary_key], indexes
+
+    def test_round_trip_keeps_rows_keys_and_indexes(self):
+        partitioned, months, primary_key, indexes = self.table_state()
+        self.assertTrue(partitioned)
+        current = partitions.month_start(self.now)
+        self.assertEqual(months[0], self.old_month)
+        self.assertEqual(months[-1], partitions.add_months(current, 2))
+        self.assertEqual(len(months), 7)
+        self.assertEqual(primary_key, ['created_at', 'id'])
+        self.assertIn('core_paymentlog_created_idx', indexes)
+
+        new_log = self.log()
+        self.assertGreater(new_log.pk, self.old_log.pk)
+
+        with connection.schema_editor() as schema_editor:
+            partitions.unpartition_payment_logs(None, schema_editor)
+        partitioned, months, primary_key, unpartitioned_indexes = self.table_state()
+        self.assertFalse(partitioned)
+        self.assertEqual(months, [])
+        self.assertEqual(primary_key, ['id'])
+        self.assertEqual(unpartitioned_indexes, indexes)
+        self.assertEqual(set(PaymentLog.objects.values_list('pk', flat=True)), {self.old_log.pk, new_log.pk})
+        self.assertGreater(self.log().pk, new_log.pk)
+
+    def test_foreign_key_to_order_is_kept(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PaymentLog.objects.create(order_id=self.order.pk + 1000, event_type='CAPTURE', status='CAPTURED')
+            # Django creates foreign keys as deferred constraints
+            self.query("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def test_partitions_are_created_ahead_and_take_over_default_rows(self):
+        future_month = partitions.add_months(partitions.month_start(self.now), 6)
+        future_log = self.log(created_at=future_month + datetime.timedelta(days=1))
+        self.assertEqual(self.query(f"SELECT id FROM {partitions.DEFAULT_PARTITION}"), [(future_log.pk,)])
+
+        self.assertEqual(partitions.ensure_partitions(), [])
+        created = partitions.ensure_partitions(months_ahead=1, now=future_month)
+
+        self.assertEqual(created, [partitions.partition_name(future_month), partitions.partition_name(
+            partitions.add_months(future_month, 1))])
+        self.assertEqual(self.query(f"SELECT id FROM {partitions.DEFAULT_PARTITION}"), [])
+        self.assertEqual(self.query(f"SELECT id FROM {created[0]}"), [(future_log.pk,)])
+
+    def test_drop_partition_removes_only_its_month(self):
+        recent_log = self.log()
+        partitions.drop_partition(partitions.partition_name(self.old_month))
+
+        self.assertEqual(list(PaymentLog.objects.values_list('pk', flat=True)), [recent_log.pk])
+        with self.assertRaises(ValueError):
+            partitions.drop_partition('core_order')
+
+    def test_for_order_only_reads_partitions_from_the_order_month(self):
+        plan = PaymentLog.objects.for_order(self.order).explain()
+
+        self.assertIn(partitions.partition_name(partitions.month_start(self.now)), plan)
+        self.assertNotIn(partitions.partition_name(self.old_month), plan)
+
+    def test_archival_drops_old_months_and_keeps_their_totals(self):
+        self.log(event_type='CAPTURE', status='CAPTURED', amount=54800, created_at=self.old_log.created_at)
+        recent_log = self.log()
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+
+        archived, _ = archive_old_logs(days=60, archive_dir=archive_dir.name, batch_size=1)
+
+        self.assertEqual(archived, 2)
+        with connection.cursor() as cursor:
+            self.assertNotIn(self.old_month, partitions.attached_partitions(cursor))
+        self.assertEqual(list(PaymentLog.objects.values_list('pk', flat=True)), [recent_log.pk])
+        summary = PaymentLogSummary.objects.get()
+        self.assertEqual((summary.log_count, summary.captured_amount), (2, 54800))
+
+
+@override_settings(IDEMPOTENCY_WAIT=0)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        @idempotency.idempotent
+        def view(request):
+            self.calls += 1
+            return JsonResponse({'order': self.calls}, status=201)
+
+        self.view = view
+
+    def post(self, body='{"amount": 54800}', key='key-1'):
+        request = RequestFactory().post('/checkout/', body, content_type='application/json',
+                                        headers={idempotency.HEADER: key})
+        return self.view(request)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post()
+        retry = self.post()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((retry.status_code, retry.content), (201, first.content))
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], 'true')
+        self.assertFalse(first.has_header(idempotency.REPLAYED_HEADER))
+        self.assertFalse(IdempotencyLock.objects.exists())
+
+    def test_reusing_a_key_for_another_body_is_rejected(self):
+        self.post()
+        response = self.post(body='{"amount": 1}')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_request_gets_409_while_the_key_is_held(self):
+        digest = hashlib.sha256(b"/checkout/\nkey-1").hexdigest()
+        token = idempotency.acquire_lock(digest)
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.calls, 0)
+        idempotency.release_lock(digest, token)
+        self.assertEqual(self.post().status_code, 201)
+
+    def test_lock_is_only_released_by_its_holder(self):
+        first = idempotency.acquire_lock('key')
+        self.assertIsNotNone(first)
+        self.assertIsNone(idempotency.acquire_lock('key'))
+
+        # The first holder ran past its timeout and someone else took the key over
+        IdempotencyLock.objects.filter(key='key').update(expires_at=timezone.now())
+        second = idempotency.acquire_lock('key')
+        self.assertIsNotNone(second)
+        idempotency.release_lock('key', first)
+
+        self.assertEqual(IdempotencyLock.objects.get().token, second)
+
+    def test_waiting_for_a_held_key_only_reads(self):
+        token = idempotency.acquire_lock('key')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(idempotency.acquire_lock('key'))
+
+        self.assertEqual([query['sql'].split()[0] for query in queries], ['SELECT'])
+        idempotency.release_lock('key', token)
+
+    def test_expired_response_is_not_replayed_and_is_cleaned_up(self):
+        self.post(key='old')
+        IdempotencyResponse.objects.update(expires_at=timezone.now())
+
+        self.assertFalse(self.post(key='old').has_header(idempotency.REPLAYED_HEADER))
+        self.post(key='new')
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(IdempotencyResponse.objects.count(), 2)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        defaults = {'first_name': 'Jens', 'last_name': 'Hansen', 'address': 'Vestergade 1', 'postal_code': '8000',
+                    'city': 'Aarhus C'}
+        self.national = Customer.objects.create(email='jens@example.dk', phone='12345678', **defaults)
+        self.international = Customer.objects.create(email='jens.h@example.dk', phone='+45 12 34 56 78', **defaults)
+        self.other = Customer.objects.create(email='anne@example.dk', phone='87654321', **defaults)
+
+    def found(self, query):
+        return set(search.search_customers(query))
+
+    def test_phone_numbers_match_with_or_without_country_code(self):
+        both = {self.national, self.international}
+        for query in ['12345678', '12 34 56 78', '+45 1234 5678', '+4512345678', '0045 12 34 56 78', '3456']:
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), both)
+
+    def test_every_term_has_to_match(self):
+        self.assertEqual(self.found('jens@exa'), {self.national})
+        self.assertEqual(self.found('hansen anne'), {self.other})
+        self.assertEqual(self.found('hansen nobody'), set())
+
+    def test_orders_match_on_reference_and_customer(self):
+        order = make_order(customer=self.other)
+        make_order(customer=self.national)
+
+        self.assertEqual(set(search.search_orders(order.reference.upper())), {order})
+        self.assertEqual(set(search.search_orders('anne@')), {order})
+
+
+class ReferenceTests(TestCase):
+    def test_references_are_unique_and_sort_by_creation(self):
+        allocated = [references.new_reference() for _ in range(2000)]
+
+        self.assertEqual(len(set(allocated)), len(allocated))
+        self.assertEqual(sorted(allocated), allocated)
+        self.assertTrue(all(len(reference) == references.REFERENCE_LENGTH for reference in allocated))
+
+    def test_hosts_differ_in_more_than_one_byte(self):
+        # Host ids that agree in their low byte still give different references
+        made = {
+            references.format_reference(1, (host << references.PROCESS_BITS) | 42, 0)
+            for host in [0x00FF, 0x01FF, 0x3FFFF]
+        }
+        self.assertEqual(len(made), 3)
+
+    @override_settings(ORDER_REFERENCE_NODE='70000')
+    def test_configured_node_keeps_its_high_bits(self):
+        self.assertEqual(references._host_id(), 70000)
+
+
+class OrderTransitionTests(TestCase):
+    def test_forward_moves_are_applied(self):
+        order = make_order()
+
+        self.assertTrue(transition_order(order, 'PAYMENT_CONFIRMED'))
+        self.assertTrue(transition_order(order.reference, 'COMPLETED', completed=True))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'COMPLETED')
+        self.assertIsNotNone(order.completed_at)
+
+    def test_backward_moves_are_refused(self):
+        order = make_order(status='COMPLETED')
+
+        self.assertFalse(transition_order(order, 'PAYMENT_CONFIRMED'))
+        self.assertFalse(transition_order(order.reference, 'CREATED'))
+        self.assertFalse(transition_order(order.reference, 'PAYMENT_FAILED'))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'COMPLETED')
+
+    def test_stale_instance_cannot_undo_a_newer_status(self):
+        order = make_order(status='PAYMENT_CONFIRMED')
+        stale = Order.objects.get(pk=order.pk)
+        transition_order(order, 'REFUNDED')
+
+        # The stale copy still says PAYMENT_CONFIRMED, from where COMPLETED would be allowed
+        self.assertFalse(transition_order(stale, 'COMPLETED'))
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'REFUNDED')
+        self.assertEqual(stale.status, 'PAYMENT_CONFIRMED')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        start = timezone.now() - datetime.timedelta(days=1)
+        self.orders = [make_order() for _ in range(7)]
+        # Two orders share a created_at, so the id has to break the tie
+        times = [start, start, start + datetime.timedelta(minutes=1)] + [
+            start + datetime.timedelta(minutes=minutes) for minutes in range(2, 6)
+        ]
+        for order, created_at in zip(self.orders, times):
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        self.newest_first = list(Order.objects.order_by('-created_at', '-pk'))
+
+    def test_next_and_previous_cursors_walk_every_row_once(self):
+        pages, cursor = [], None
+        while True:
+            objects, next_cursor, previous_cursor = keyset.paginate(Order.objects.all(), cursor, limit=3)
+            self.assertEqual(previous_cursor is None, cursor is None)
+            pages.append(objects)
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([order for page in pages for order in page], self.newest_first)
+
+        # Back from the last page to the one before it
+        objects, next_cursor, previous_cursor = keyset.paginate(Order.objects.all(), previous_cursor, limit=3)
+        self.assertEqual(objects, pages[1])
+        self.assertIsNotNone(next_cursor)
+        self.assertIsNotNone(previous_cursor)
+        objects, _, previous_cursor = keyset.paginate(Order.objects.all(), previous_cursor, limit=3)
+        self.assertEqual(objects, pages[0])
+        self.assertIsNone(previous_cursor)
+
+    def test_invalid_cursors_are_rejected(self):
+        valid = keyset.encode_cursor(self.newest_first[0])
+        for cursor in ['not-a-cursor', valid[:-3], keyset.encode_cursor(self.newest_first[0], 'sideways'),
+                       'WyJuZXh0IiwiMjAyNi0xMC0xOSIsIjEiXQ']:
+            with self.subTest(cursor=cursor), self.assertRaises(keyset.InvalidCursor):
+                keyset.paginate(Order.objects.all(), cursor)
+
+
+class OrderAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.dk', 'password'))
+        defaults = {'first_name': 'Jens', 'last_name': 'Hansen', 'phone': '12345678', 'address': 'Vej 1',
+                    'postal_code': '8000', 'city': 'Aarhus'}
+        self.customers = [Customer.objects.create(email=f'customer{index}@example.dk', **defaults) for index in range(5)]
+        self.order = make_order(customer=self.customers[0])
+
+    def test_change_page_does_not_list_every_customer(self):
+        response = self.client.get(f'/admin/core/order/{self.order.pk}/change/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, f'<option value="{self.customers[1].pk}"')
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def add_orders_with_logs(self, count):
+        for customer in self.customers[:count]:
+            order = make_order(customer=customer)
+            PaymentLog.objects.create(order=order, event_type='AUTHORIZE', status='AUTHORIZED',
+                                      response_data={'payload': 'x' * 100})
+
+    def test_changelist_queries_do_not_grow_with_the_page(self):
+        for path in ['/admin/core/order/', '/admin/core/paymentlog/']:
+            with self.subTest(path=path):
+                self.add_orders_with_logs(1)
+                few = self.count_queries(path)
+                self.add_orders_with_logs(5)
+                self.assertEqual(self.count_queries(path), few)
+
+    def test_order_list_shows_the_latest_payment_status(self):
+        PaymentLog.objects.create(order=self.order, event_type='AUTHORIZE', status='AUTHORIZED')
+        PaymentLog.objects.create(order=self.order, event_type='CAPTURE', status='CAPTURED')
+
+        response = self.client.get('/admin/core/order/')
+
+        self.assertContains(response, '<td class="field-payment_status">CAPTURED</td>', html=True)
+
+
+class CartCheckoutTests(TestCase):
+    def setUp(self):
+        self.token = carts.new_token()
+        cart = carts.empty_cart()
+        carts.add_item(cart, {'fabricType': 'fabric-1', 'quantity': 1}, get_catalog().price_tables)
+        carts.save_cart(self.token, cart)
+
+    def checkout(self):
+        return self.client.post('/mobilepay/checkout/', {'cartToken': self.token, 'returnUrl': 'https://example.dk/done'},
+                                content_type='application/json')
+
+    @mock.patch('core.views.api.create_mobilepay_checkout', return_value=({}, 'callback', 'https://example.dk/pay'))
+    def test_cart_can_only_be_checked_out_once(self, create_payment):
+        self.assertEqual(self.checkout().status_code, 200)
+        self.assertEqual(self.checkout().status_code, 404)
+        self.assertEqual(create_payment.call_count, 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @mock.patch('core.views.api.create_mobilepay_checkout', side_effect=RuntimeError('gateway down'))
+    def test_cart_is_kept_when_the_payment_fails(self, create_payment):
+        self.assertEqual(self.checkout().status_code, 500)
+        self.assertEqual(len(carts.get_cart(self.token)[1]), 1)
+
+
+@override_settings(PAYMENT_LOG_FLUSH_INTERVAL=0.05)
+class PaymentLogWriterTests(TransactionTestCase):
+    def test_events_logged_outside_a_request_are_written_by_the_timer(self):
+        order = make_order()
+        payment_log_writer.log_payment_event(order=order, event_type='STATUS_CHECK', status='CREATED')
+        payment_log_writer.log_payment_event(order=order, event_type='STATUS_CHECK', status='AUTHORIZED')
+        timer = payment_log_writer._state['timer']
+        self.assertEqual(PaymentLog.objects.count(), 0)
+
+        # Reading while the timer thread writes would trip SQLite's shared-cache table lock
+        timer.join(5)
+        self.assertEqual(PaymentLog.objects.count(), 2)
+        self.assertIsNone(payment_log_writer._state['timer'])
+
+    def test_durable_event_writes_the_buffer_and_stops_the_timer(self):
+        order = make_order()
+        payment_log_writer.log_payment_event(order=order, event_type='STATUS_CHECK', status='AUTHORIZED')
+        timer = payment_log_writer._state['timer']
+        payment_log_writer.log_payment_event(order=order, event_type='CAPTURE', status='CAPTURED', amount=54800)
+
+        self.assertEqual(PaymentLog.objects.count(), 2)
+        timer.join()
+        self.assertEqual(PaymentLog.objects.count(), 2)
+
+
+class FrontendPageEncodingTests(SimpleTestCase):
+    def test_encodings_refused_with_q_zero_are_not_served(self):
+        page = frontend_pages.Page('index.html', None, b'plain', {'br': b'brotli', 'gzip': b'gzipped'}, 0)
+        cases = {
+            '': (b'plain', None),
+            'gzip, deflate, br': (b'brotli', 'br'),
+            'br;q=0, gzip': (b'gzipped', 'gzip'),
+            'gzip;q=0': (b'plain', None),
+            'BR;Q=0.5': (b'brotli', 'br'),
+            '*;q=0.1, br;q=0': (b'gzipped', 'gzip'),
+            '*;q=0': (b'plain', None),
+            'xbr, gzipx': (b'plain', None),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(page.negotiate(header), expected)
@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib import admin
 from .views import (
     create_checkout,
@@ -16,8 +16,11 @@ from .views import (
     capture_payment_frontend,
     get_payment_events_view,
     index_view,
+    frontend_page_view,
     checkout_callback_handler,
     checkout_complete,
+    export_orders_view,
+    readiness_view,
 )
 
 urlpatterns = [
@@ -27,6 +30,7 @@ urlpatterns = [
     path('', index_view, name='index'),
     
     # API endpoints
+    path('api/products/', include('products.urls')),
     path('api/', include('api.urls')),
     
     # Checkout endpoints
@@ -55,6 +59,15 @@ urlpatterns = [
     # MobilePay test page
     path('mobilepay/test/', mobilepay_test_page, name='mobilepay_test_page'),
     
+    # Accounting exports
+    path('exports/orders/', export_orders_view, name='export_orders'),
+    
+    # Load balancer readiness check (see core.warmup)
+    path('health/ready/', readiness_view, name='readiness'),
+
     # Frontend capture endpoint
     path('payments/<str:reference>/capture/', capture_payment_frontend, name='capture_payment_frontend'),
+
+    # Other pages of the Next.js export (e.g. /customize -> customize.html); keep last
+    re_path(r'^(?P<page>[A-Za-z0-9_-]+(?:/[A-Za-z0-9_-]+)*)/?$', frontend_page_view, name='frontend_page'),
 ]
\ No newline at end of file
@@ -1,672 +1,70 @@
 from django.shortcuts import render
-import requests
 import json
-import uuid
 import datetime
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponsePermanentRedirect, JsonResponse, StreamingHttpResponse
+from django.urls import Resolver404, resolve
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-from django.views.generic import TemplateView
-from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition, require_http_methods
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.decorators import method_decorator
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils import timezone
 from .models import Order, Customer, OrderItem, PaymentLog
+from .frontend_pages import get_page
+from .idempotency import idempotent
+from .order_states import transition_order
+from .payment_log_writer import log_payment_event
+from .references import new_reference
+from .warmup import start_warm_up, warm_up_status
+from .exports import export_queryset, iter_export, parse_export_filters, EXPORT_FORMATS
+from payments import api  # Shared process-wide Vipps MobilePay client, created on first use
+from products.carts import CartNotFound, cart_items, delete_cart, get_cart
+from products.catalog import get_catalog
+from products.pricing import CartPrice, PricingError, price_cart
 
-class VippsMobilePayAPI:
-    """Helper class to handle Vipps MobilePay API calls"""
-    
-    # Base URLs
-    TEST_BASE_URL = "https://apitest.vipps.no"
-    PROD_BASE_URL = "https://api.vipps.no"
-    
-    def __init__(self):
-        # Get settings from Django settings
-        self.client_id = settings.VIPPS_CLIENT_ID
-        self.client_secret = settings.VIPPS_CLIENT_SECRET
-        self.subscription_key = settings.VIPPS_SUBSCRIPTION_KEY
-        self.merchant_serial_number = settings.VIPPS_MERCHANT_SERIAL_NUMBER
-        self.is_test = getattr(settings, 'VIPPS_TEST_MODE', True)
-        
-        # MobilePay specific settings
-        self.mobilepay_api_endpoint = settings.MOBILEPAY_API_ENDPOINT
-        self.checkout_return_url = settings.MOBILEPAY_CHECKOUT_RETURN_URL
-        self.checkout_callback_url = settings.MOBILEPAY_CHECKOUT_CALLBACK_URL
-        
-        # System headers
-        self.system_name = "MemorybearWebapp"
-        self.system_version = "1.0.0"
-        self.plugin_name = "MemorybearCheckout"
-        self.plugin_version = "1.0.0"
-        
-    @property
-    def base_url(self):
-        return self.TEST_BASE_URL if self.is_test else self.PROD_BASE_URL
-    
-    @property
-    def mobilepay_url(self):
-        return self.mobilepay_api_endpoint
-    
-    def get_headers(self):
-        """Return common headers for API requests"""
-        return {
-            "Content-Type": "application/json",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "Ocp-Apim-Subscription-Key": self.subscription_key,
-            "Merchant-Serial-Number": self.merchant_serial_number,
-            "Vipps-System-Name": self.system_name,
-            "Vipps-System-Version": self.system_version,
-            "Vipps-System-Plugin-Name": self.plugin_name,
-            "Vipps-System-Plugin-Version": self.plugin_version
-        }
-    
-    def get_epayment_headers(self):
-        """Return headers specifically formatted for ePayment API"""
-        return {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.client_id}",  # ePayment might use this format
-            "Ocp-Apim-Subscription-Key": self.subscription_key,
-            "Merchant-Serial-Number": self.merchant_serial_number,
-            "Vipps-System-Name": self.system_name,
-            "Vipps-System-Version": self.system_version,
-            "Vipps-System-Plugin-Name": self.plugin_name,
-            "Vipps-System-Plugin-Version": self.plugin_version
-        }
-    
-    def create_checkout_session(self, amount, currency, reference, description, callback_url, return_url):
-        """Create a checkout session with Vipps MobilePay"""
-        url = f"{self.base_url}/checkout/v3/session"
-        
-        # Generate a unique authorization token for callbacks
-        callback_token = str(uuid.uuid4())
-        
-        payload = {
-            "merchantInfo": {
-                "callbackUrl": callback_url,
-                "returnUrl": return_url,
-                "callbackAuthorizationToken": callback_token
-            },
-            "transaction": {
-                "amount": {
-                    "value": amount,
-                    "currency": currency
-                },
-                "reference": reference,
-                "paymentDescription": description
-            }
-        }
-        
-        try:
-            response = requests.post(url, headers=self.get_headers(), json=payload)
-            response.raise_for_status()  # Raise an error for bad responses
-            return response.json(), callback_token
-        except requests.exceptions.RequestException as e:
-            # Log the error for debugging
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response content: {e.response.content}")
-            # Re-raise as a more general error
-            raise Exception(f"Failed to connect to Vipps/MobilePay API: {str(e)}")
-    
-    def get_session_details(self, reference):
-        """Get details of a checkout session"""
-        url = f"{self.base_url}/checkout/v3/session/{reference}"
-        try:
-            response = requests.get(url, headers=self.get_headers())
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response content: {e.response.content}")
-            raise Exception(f"Failed to get session details: {str(e)}")
-
-    def get_payment_details(self, reference):
-        """Get payment details from ePayment API"""
-        try:
-            # First, get an access token
-            token_url = f"{self.base_url}/accesstoken/get"
-            token_headers = {
-                "Content-Type": "application/json",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "Ocp-Apim-Subscription-Key": self.subscription_key
-            }
-            
-            token_response = requests.post(token_url, headers=token_headers)
-            token_response.raise_for_status()
-            token_data = token_response.json()
-            access_token = token_data.get("access_token")
-            
-            if not access_token:
-                raise Exception("Failed to obtain access token")
-            
-            # Now get the payment details with the access token
-            # Use the payments endpoint - make sure we're hitting the right URL
-            url = f"{self.base_url}/epayment/v1/payments/{reference}"
-            
-            print(f"Fetching payment details from: {url}")
-            
-            # Ensure all required headers are present and correctly formatted
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Merchant-Serial-Number": self.merchant_serial_number,
-                "Vipps-System-Name": self.system_name,
-                "Vipps-System-Version": self.system_version,
-                "Vipps-System-Plugin-Name": self.plugin_name,
-                "Vipps-System-Plugin-Version": self.plugin_version
-            }
-            
-            print(f"Using MSN: {self.merchant_serial_number}")
-            
-            response = requests.get(url, headers=headers)
-            
-            # Log response details for debugging
-            print(f"Response status code: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Response content: {response.content}")
-            else:
-                # Print structure of successful response for debugging
-                try:
-                    data = response.json()
-                    print(f"Payment details structure: {json.dumps(data, indent=2)}")
-                    
-                    # Log specific important fields to check their presence and format
-                    print(f"Payment state: {data.get('state')}")
-                    if 'summary' in data:
-                        print(f"Payment summary: {json.dumps(data['summary'], indent=2)}")
-                    else:
-                        print("Payment summary field not found")
-                    
-                    # Check if the authorizedAmount is available and in the expected format
-                    authorized_amount = None
-                    if 'summary' in data and 'authorizedAmount' in data['summary']:
-                        authorized_amount = data['summary']['authorizedAmount']
-                        print(f"Authorized amount: {authorized_amount}")
-                    elif 'amount' in data:
-                        authorized_amount = data['amount']
-                        print(f"Using amount field: {authorized_amount}")
-                    else:
-                        print("No amount field found in the response")
-                except Exception as parse_error:
-                    print(f"Error parsing response JSON: {str(parse_error)}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.content}")
-            
-            # Check for common errors and provide better error messages
-            if hasattr(e, 'response'):
-                if e.response.status_code == 404:
-                    error_msg = f"Payment with reference '{reference}' not found. Verify the reference is correct and exists in the MobilePay system."
-                elif e.response.status_code == 401:
-                    error_msg = "Authorization failed. Check your API keys and credentials."
-                elif e.response.status_code == 403:
-                    error_msg = "Access forbidden. Your account may not have permission to access this payment."
-                else:
-                    error_msg = f"Failed to get payment details: {str(e)}"
-                raise Exception(error_msg)
-            else:
-                raise Exception(f"Failed to get payment details: {str(e)}")
-    
-    def cancel_payment(self, reference):
-        """Cancel a payment"""
-        url = f"{self.base_url}/epayment/v1/payments/{reference}/cancel"
-        try:
-            # First, get an access token
-            token_url = f"{self.base_url}/accesstoken/get"
-            token_headers = {
-                "Content-Type": "application/json",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "Ocp-Apim-Subscription-Key": self.subscription_key
-            }
-            
-            token_response = requests.post(token_url, headers=token_headers)
-            token_response.raise_for_status()
-            token_data = token_response.json()
-            access_token = token_data.get("access_token")
-            
-            if not access_token:
-                raise Exception("Failed to obtain access token")
-            
-            # Generate a shorter idempotency key - max 50 chars
-            short_uuid = str(uuid.uuid4()).replace('-', '')[:8]
-            idempotency_key = f"cnl-{reference}-{short_uuid}"
-            
-            # Make sure the key doesn't exceed 50 chars
-            if len(idempotency_key) > 50:
-                # Further shorten if needed
-                ref_max_len = 50 - 13  # 'cnl-' (4) + '-' (1) + short_uuid (8)
-                idempotency_key = f"cnl-{reference[:ref_max_len]}-{short_uuid}"
-            
-            print(f"Using idempotency key: {idempotency_key} (length: {len(idempotency_key)})")
-            
-            # Use the access token for the API call
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Merchant-Serial-Number": self.merchant_serial_number,
-                "Idempotency-Key": idempotency_key,
-                "Vipps-System-Name": self.system_name,
-                "Vipps-System-Version": self.system_version,
-                "Vipps-System-Plugin-Name": self.plugin_name,
-                "Vipps-System-Plugin-Version": self.plugin_version
-            }
-            
-            print(f"Cancelling payment at: {url}")
-            response = requests.post(url, headers=headers, json={})
-            
-            # Log response details for debugging
-            print(f"Response status code: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Response content: {response.content}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.content}")
-            raise Exception(f"Failed to cancel payment: {str(e)}")
-    
-    def capture_payment(self, reference, amount=None, description=None):
-        """Capture a payment, either partially or fully"""
-        url = f"{self.base_url}/epayment/v1/payments/{reference}/capture"
-        payload = {}
-        
-        if amount is not None:
-            payload["modificationAmount"] = {
-                "value": amount,
-                "currency": "DKK"  # Using DKK as default currency
-            }
-            
-        if description is not None:
-            payload["description"] = description
-            
-        try:
-            # First, get an access token
-            token_url = f"{self.base_url}/accesstoken/get"
-            token_headers = {
-                "Content-Type": "application/json",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "Ocp-Apim-Subscription-Key": self.subscription_key
-            }
-            
-            token_response = requests.post(token_url, headers=token_headers)
-            token_response.raise_for_status()
-            token_data = token_response.json()
-            access_token = token_data.get("access_token")
-            
-            if not access_token:
-                raise Exception("Failed to obtain access token")
-            
-            # Generate a shorter idempotency key - max 50 chars
-            # Use first 8 chars of UUID instead of the full UUID
-            short_uuid = str(uuid.uuid4()).replace('-', '')[:8]
-            idempotency_key = f"cap-{reference}-{short_uuid}"
-            
-            # Make sure the key doesn't exceed 50 chars
-            if len(idempotency_key) > 50:
-                # Further shorten if needed
-                ref_max_len = 50 - 13  # 'cap-' (4) + '-' (1) + short_uuid (8)
-                idempotency_key = f"cap-{reference[:ref_max_len]}-{short_uuid}"
-            
-            print(f"Using idempotency key: {idempotency_key} (length: {len(idempotency_key)})")
-            
-            # Use the access token for the API call
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Merchant-Serial-Number": self.merchant_serial_number,
-                "Idempotency-Key": idempotency_key,  # Use the shortened key we generated above
-                "Vipps-System-Name": self.system_name,
-                "Vipps-System-Version": self.system_version,
-                "Vipps-System-Plugin-Name": self.plugin_name,
-                "Vipps-System-Plugin-Version": self.plugin_version
-            }
-            
-            print(f"Capturing payment at: {url}")
-            print(f"Capture payload: {json.dumps(payload)}")
-            
-            response = requests.post(url, headers=headers, json=payload)
-            
-            # Log response details for debugging
-            print(f"Response status code: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Response content: {response.content}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.content}")
-            raise Exception(f"Failed to capture payment: {str(e)}")
-    
-    def refund_payment(self, reference, amount=None, description=None):
-        """Refund a payment, either partially or fully"""
-        url = f"{self.base_url}/epayment/v1/payments/{reference}/refund"
-        payload = {}
-        
-        if amount is not None:
-            payload["modificationAmount"] = {
-                "value": amount,
-                "currency": "DKK"  # Using DKK as default currency
-            }
-            
-        if description is not None:
-            payload["description"] = description
-            
-        try:
-            # First, get an access token
-            token_url = f"{self.base_url}/accesstoken/get"
-            token_headers = {
-                "Content-Type": "application/json",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "Ocp-Apim-Subscription-Key": self.subscription_key
-            }
-            
-            token_response = requests.post(token_url, headers=token_headers)
-            token_response.raise_for_status()
-            token_data = token_response.json()
-            access_token = token_data.get("access_token")
-            
-            if not access_token:
-                raise Exception("Failed to obtain access token")
-            
-            # Generate a idempotency key.
-            short_uuid = str(uuid.uuid4()).replace('-', '')[:8]
-            idempotency_key = f"ref-{reference}-{short_uuid}"
-            
-            # Make sure the key doesn't exceed 50 chars
-            if len(idempotency_key) > 50:
-                # Further shorten if needed
-                ref_max_len = 50 - 13  # 'ref-' (4) + '-' (1) + short_uuid (8)
-                idempotency_key = f"ref-{reference[:ref_max_len]}-{short_uuid}"
-            
-            print(f"Using idempotency key: {idempotency_key} (length: {len(idempotency_key)})")
-            
-            # Use the access token for the API call
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Merchant-Serial-Number": self.merchant_serial_number,
-                "Idempotency-Key": idempotency_key,
-                "Vipps-System-Name": self.system_name,
-                "Vipps-System-Version": self.system_version,
-                "Vipps-System-Plugin-Name": self.plugin_name,
-                "Vipps-System-Plugin-Version": self.plugin_version
-            }
-            
-            print(f"Refunding payment at: {url}")
-            print(f"Refund payload: {json.dumps(payload)}")
-            
-            response = requests.post(url, headers=headers, json=payload)
-            
-            # Log response details for debugging
-            print(f"Response status code: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Response content: {response.content}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.content}")
-            raise Exception(f"Failed to refund payment: {str(e)}")
-
-    def create_mobilepay_checkout(self, amount, reference, description, return_url=None, callback_url=None, customer_phone=None):
-        """Create a MobilePay checkout session using the ePayment API"""
-        try:
-            # First, get an access token - note that the endpoint is accesstoken (lowercase t)
-            token_url = f"{self.base_url}/accesstoken/get"
-            token_headers = {
-                "Content-Type": "application/json",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "Ocp-Apim-Subscription-Key": self.subscription_key
-            }
-            
-            print(f"Getting access token from: {token_url}")
-            print(f"Using client_id: {self.client_id}")
-            # Don't log the full client_secret for security reasons
-            print(f"Using client_secret: {self.client_secret[:4]}...{self.client_secret[-4:]}")
-            print(f"Using subscription_key: {self.subscription_key[:4]}...{self.subscription_key[-4:]}")
-            
-            token_response = requests.post(token_url, headers=token_headers)
-            
-            print(f"Token response status code: {token_response.status_code}")
-            if token_response.status_code != 200:
-                print(f"Token response content: {token_response.content}")
-                
-            token_response.raise_for_status()
-            token_data = token_response.json()
-            print(f"Token response keys: {token_data.keys()}")
-            
-            access_token = token_data.get("access_token")
-            
-            if not access_token:
-                print("Failed to obtain access token. Token data:", token_data)
-                raise Exception("Failed to obtain access token")
-                
-            print(f"Successfully obtained access token: {access_token[:10]}...")
-                
-            # Now create the payment with the access token
-            url = f"{self.base_url}/epayment/v1/payments"
-            
-            # Use default URLs if not provided
-            if return_url is None:
-                return_url = self.checkout_return_url
-            if callback_url is None:
-                callback_url = self.checkout_callback_url
-            
-            
-            payload = {
-                "amount": {
-                    "value": amount,
-                    "currency": "DKK"
-                },
-                "paymentMethod": {
-                    "type": "WALLET"
-                },
-                # Required for wallet payments
-                "customerInteraction": "CUSTOMER_PRESENT",
-                "reference": reference,
-                "paymentDescription": description,
-                "returnUrl": return_url,
-                "userFlow": "WEB_REDIRECT",
-                "webhookUrl": callback_url
-            }
-            
-            # Generate a idempotency key - max 50 chars
-            # Use the reference itself as it should be unique per request
-            idempotency_key = reference
-            
-            # Make sure it's not too long
-            if len(idempotency_key) > 50:
-                idempotency_key = reference[:50]
-            
-            print(f"Using idempotency key: {idempotency_key} (length: {len(idempotency_key)})")
-            
-            # Use the access token in the Authorization header
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Merchant-Serial-Number": self.merchant_serial_number,
-                "Idempotency-Key": idempotency_key,
-                "Vipps-System-Name": self.system_name,
-                "Vipps-System-Version": self.system_version,
-                "Vipps-System-Plugin-Name": self.plugin_name,
-                "Vipps-System-Plugin-Version": self.plugin_version
-            }
-            
-            print(f"Creating payment at: {url}")
-            print(f"Payment payload: {json.dumps(payload)}")
-            print(f"Using Merchant-Serial-Number: {self.merchant_serial_number}")
-            
-            response = requests.post(url, headers=headers, json=payload)
-            
-            print(f"Payment response status code: {response.status_code}")
-            if response.status_code != 200 and response.status_code != 201:
-                print(f"Payment response content: {response.content}")
-                
-            response.raise_for_status()
-            
-            response_data = response.json()
-            print(f"Payment response keys: {response_data.keys()}")
-            redirect_url = response_data.get("redirectUrl")
-            print(f"Redirect URL: {redirect_url}")
-            
-            return response_data, None, redirect_url
-            
-        except requests.exceptions.RequestException as e:
-            print(f"API Error (ePayment): {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.content}")
-            raise Exception(f"Failed to create ePayment session: {str(e)}")
+def price_checkout(data):
+    """Validate and price the posted cart against the product catalog.
 
-    def _format_phone_number(self, phone):
-        """Format phone number to the expected format for MobilePay"""
-        if not phone:
-            return None
-        
-        # Remove any spaces, dashes, etc.
-        phone = ''.join(c for c in phone if c.isdigit() or c == '+')
-        
-        # If it starts with 00, replace with +
-        if phone.startswith('00'):
-            phone = '+' + phone[2:]
-        
-        # If it doesn't have a country code, add Danish country code
-        if not phone.startswith('+'):
-            # If it starts with 0, remove the 0
-            if phone.startswith('0'):
-                phone = phone[1:]
-            # Add Danish country code
-            if not phone.startswith('45'):
-                phone = '45' + phone
-            
-        # Ensure it's in the expected format
-        if phone.startswith('+'):
-            return phone
-        else:
-            return f"+{phone}"
+    Returns a products.pricing.CartPrice. Only item-less test payments may
+    name their own amount, and only in DEBUG.
+    """
+    items = data.get('items') or []
+    if not items and settings.DEBUG and 'amount' in data:
+        return CartPrice((), data['amount'], 0, data['amount'], None)
+    return price_cart(
+        get_catalog().price_tables,
+        items,
+        data.get('shippingMethod', 'home'),
+        pickup_point_id=data.get('pickupPointId'),
+        require_pickup_point=settings.CHECKOUT_REQUIRE_PICKUP_POINT,
+    )
 
-    def get_mobilepay_payment_status(self, payment_id):
-        """Get status of a MobilePay payment"""
-        url = f"{self.mobilepay_url}/v1/payments/{payment_id}"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "x-ibm-client-id": self.client_id,
-            "x-api-key": self.subscription_key
-        }
-        
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"MobilePay API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response content: {e.response.content}")
-            raise Exception(f"Failed to get MobilePay payment status: {str(e)}")
+def use_stored_cart(data):
+    """Check out the server-side cart named by cartToken instead of posted items"""
+    token = data.get('cartToken')
+    if token:
+        data['items'] = cart_items(get_cart(token), get_catalog())
 
-    def get_payment_events(self, reference):
-        """Get payment event log from ePayment API"""
-        try:
-            # First, get an access token
-            token_url = f"{self.base_url}/accesstoken/get"
-            token_headers = {
-                "Content-Type": "application/json",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "Ocp-Apim-Subscription-Key": self.subscription_key
-            }
-            
-            token_response = requests.post(token_url, headers=token_headers)
-            token_response.raise_for_status()
-            token_data = token_response.json()
-            access_token = token_data.get("access_token")
-            
-            if not access_token:
-                raise Exception("Failed to obtain access token")
-            
-            # Now get the payment events with the access token
-            url = f"{self.base_url}/epayment/v1/payments/{reference}/events"
-            
-            print(f"Fetching payment events from: {url}")
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}",
-                "Ocp-Apim-Subscription-Key": self.subscription_key,
-                "Merchant-Serial-Number": self.merchant_serial_number,
-                "Vipps-System-Name": self.system_name,
-                "Vipps-System-Version": self.system_version,
-                "Vipps-System-Plugin-Name": self.plugin_name,
-                "Vipps-System-Plugin-Version": self.plugin_version
-            }
-            
-            response = requests.get(url, headers=headers)
-            
-            # Log response details for debugging
-            print(f"Response status code: {response.status_code}")
-            if response.status_code != 200:
-                print(f"Response content: {response.content}")
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response content: {e.response.content}")
-            
-            # Check for common errors and provide better error messages
-            if hasattr(e, 'response'):
-                if e.response.status_code == 404:
-                    error_msg = f"Payment events for reference '{reference}' not found. Verify the reference is correct and exists in the MobilePay system."
-                elif e.response.status_code == 401:
-                    error_msg = "Authorization failed. Check your API keys and credentials."
-                elif e.response.status_code == 403:
-                    error_msg = "Access forbidden. Your account may not have permission to access this payment."
-                else:
-                    error_msg = f"Failed to get payment events: {str(e)}"
-                raise Exception(error_msg)
-            else:
-                raise Exception(f"Failed to get payment events: {str(e)}")
+def close_stored_cart(data):
+    """Delete the checked-out cart once its order and payment exist, so the token cannot buy it twice"""
+    token = data.get('cartToken')
+    if token:
+        delete_cart(token)
 
-# Initialize the API helper
-api = VippsMobilePayAPI()
+def pricing_error_response(error):
+    return JsonResponse({'success': False, 'error': str(error), 'errors': error.errors}, status=400)
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@idempotent
 def create_checkout(request):
     """Create a checkout session and return the session token"""
     try:
         data = json.loads(request.body)
         
         # Validate required fields
-        required_fields = ['amount', 'currency']
+        required_fields = ['currency']
         missing_fields = [field for field in required_fields if field not in data]
         if missing_fields:
             return JsonResponse(
@@ -674,15 +72,24 @@ def create_checkout(request):
                 status=400
             )
 
-        # Create a unique reference for this order
-        reference = data.get('reference', f"order-{uuid.uuid4().hex[:8]}")
+        # Prices come from the catalog, never from the client
+        try:
+            use_stored_cart(data)
+            price = price_checkout(data)
+        except PricingError as e:
+            return pricing_error_response(e)
+        except CartNotFound:
+            return JsonResponse({'success': False, 'error': 'Cart not found or expired'}, status=404)
+
+        # The backend always allocates the reference; client-supplied ones could collide
+        reference = new_reference()
         
         # Check if customer data is provided
         customer = None
         customer_data = data.get('customer', {})
         if customer_data and customer_data.get('email'):
             # Create or update customer
-            customer, created = Customer.objects.update_or_create(
+            customer, created = Customer.objects.update_or_create_if_changed(
                 email=customer_data.get('email'),
                 defaults={
                     'first_name': customer_data.get('firstName', ''),
@@ -702,7 +109,7 @@ def create_checkout(request):
         # Create checkout session with Vipps/MobilePay
         try:
             result, callback_token = api.create_checkout_session(
-                amount=data['amount'],
+                amount=price.total,
                 currency=data['currency'],
                 reference=reference,
                 description=data.get('description', 'Purchase from Mindebamsen'),
@@ -721,41 +128,42 @@ def create_checkout(request):
             reference=reference,
             customer=customer,
             callback_token=callback_token,
-            amount=data['amount'],
+            amount=price.total,
             currency=data['currency'],
             status='CREATED',
             shipping_method=data.get('shippingMethod', 'home'),
-            shipping_cost=data.get('shippingCost', 4900),  # in øre, default to 49 DKK
-            pickup_point_id=data.get('pickupPointId', None),
+            shipping_cost=price.shipping_cost,
+            pickup_point_id=price.pickup_point_id,
             payment_method=data.get('paymentMethod', 'mobilepay'),
             comments=data.get('comments', None)
         )
         
         # Store order items if provided
         items_data = data.get('items', [])
-        for item_data in items_data:
+        for item_data, line in zip(items_data, price.lines):
             OrderItem.objects.create(
                 order=order,
-                name=item_data.get('name', 'MemoryBear'),
-                price=item_data.get('price', 0),  # Already in øre from the frontend
-                quantity=item_data.get('quantity', 1),
+                name=item_data.get('name') or 'MemoryBear',
+                price=line.unit_price,
+                quantity=line.quantity,
                 fabric_type=item_data.get('fabricType', None),
                 body_fabric=item_data.get('bodyFabric', None),
                 head_fabric=item_data.get('headFabric', None),
                 under_arms_fabric=item_data.get('underArmsFabric', None),
                 belly_fabric=item_data.get('bellyFabric', None),
-                has_vest=item_data.get('hasVest', False),
+                has_vest=line.has_vest,
                 vest_fabric=item_data.get('vestFabric', None),
                 face_style=item_data.get('faceStyle', None)
             )
         
         # Log payment event
-        PaymentLog.objects.create(
+        log_payment_event(
             order=order,
             event_type='CHECKOUT_CREATED',
             status='CREATED',
             response_data=result
         )
+        close_stored_cart(data)
         
         return JsonResponse(result)
         
@@ -875,11 +283,10 @@ def capture_payment_view(request, reference):
         # Update order status
         try:
             order = Order.objects.get(reference=reference)
-            order.status = 'COMPLETED'
-            order.save()
+            transition_order(order, 'COMPLETED', completed=True)
             
             # Log capture event
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='PAYMENT_CAPTURED',
                 status='COMPLETED',
@@ -907,11 +314,10 @@ def refund_payment_view(request, reference):
         # Update order status
         try:
             order = Order.objects.get(reference=reference)
-            order.status = 'REFUNDED'
-            order.save()
+            transition_order(order, 'REFUNDED')
             
             # Log refund event
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='PAYMENT_REFUNDED',
                 status='REFUNDED',
@@ -935,11 +341,10 @@ def cancel_payment_view(request, reference):
         # Update order status
         try:
             order = Order.objects.get(reference=reference)
-            order.status = 'PAYMENT_FAILED'
-            order.save()
+            transition_order(order, 'PAYMENT_FAILED')
             
             # Log cancel event
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='PAYMENT_CANCELLED',
                 status='PAYMENT_FAILED',
@@ -1010,7 +415,7 @@ def checkout_complete(request):
                             )
                             
                             # Log the capture
-                            PaymentLog.objects.create(
+                            log_payment_event(
                                 order=order,
                                 event_type='PAYMENT_AUTO_CAPTURED',
                                 status='COMPLETED',
@@ -1018,9 +423,7 @@ def checkout_complete(request):
                                 response_data=capture_result
                             )
                             
-                            # Update order status to COMPLETED since we've captured
-                            order.status = 'COMPLETED'
-                            order.completed_at = datetime.datetime.now()
+                            # The order is marked COMPLETED below, since we've captured
                             payment_status = 'CAPTURED'  # Update the status for the template
                             print(f"Payment auto-captured successfully for order {reference}")
                         else:
@@ -1028,20 +431,16 @@ def checkout_complete(request):
                     except Exception as capture_error:
                         print(f"Failed to auto-capture payment for order {reference}: {str(capture_error)}")
                 
-                # Update order status based on payment state if we didn't capture
-                if payment_status == 'AUTHORIZED' and order.status != 'COMPLETED':
-                    order.status = 'PAYMENT_CONFIRMED'
+                # Update order status based on payment state; never moves it backwards
+                if payment_status == 'AUTHORIZED':
+                    transition_order(order, 'PAYMENT_CONFIRMED')
                 elif payment_status == 'CAPTURED':
-                    order.status = 'COMPLETED'
-                    if not order.completed_at:
-                        order.completed_at = datetime.datetime.now()
+                    transition_order(order, 'COMPLETED', completed=True)
                 elif payment_status in ['FAILED', 'CANCELLED', 'TERMINATED']:
-                    order.status = 'PAYMENT_FAILED'
-                
-                order.save()
+                    transition_order(order, 'PAYMENT_FAILED')
                 
                 # Log the payment check
-                PaymentLog.objects.create(
+                log_payment_event(
                     order=order,
                     event_type='RETURN_URL_STATUS_CHECK',
                     status=payment_status,
@@ -1067,21 +466,22 @@ def checkout_complete(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@idempotent
 def create_mobilepay_checkout(request):
     """Create a MobilePay checkout session using the ePayment API"""
     try:
         data = json.loads(request.body)
         
-        # Validate required fields
-        required_fields = ['amount']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return JsonResponse(
-                {'error': f'Missing required fields: {", ".join(missing_fields)}'},
-                status=400
-            )
+        # Prices come from the catalog, never from the client
+        try:
+            use_stored_cart(data)
+            price = price_checkout(data)
+        except PricingError as e:
+            return pricing_error_response(e)
+        except CartNotFound:
+            return JsonResponse({'success': False, 'error': 'Cart not found or expired'}, status=404)
 
-        reference = data.get('reference', f"order-{uuid.uuid4().hex[:8]}")
+        reference = new_reference()
         
         customer = None
         customer_data = data.get('customer', {})
@@ -1091,7 +491,7 @@ def create_mobilepay_checkout(request):
             customer_phone = customer_data.get('phone')
             
             if customer_data.get('email'):
-                customer, created = Customer.objects.update_or_create(
+                customer, created = Customer.objects.update_or_create_if_changed(
                     email=customer_data.get('email'),
                     defaults={
                         'first_name': customer_data.get('firstName', ''), # Use camelCase to match frontend
@@ -1107,35 +507,35 @@ def create_mobilepay_checkout(request):
         order = Order.objects.create(
             reference=reference,
             customer=customer,
-            amount=data['amount'],
+            amount=price.total,
             currency=data.get('currency', 'DKK'),
             status='CREATED',
             shipping_method=data.get('shippingMethod', 'home'), # Use camelCase to match frontend
-            shipping_cost=data.get('shippingCost', 4900), # Use camelCase to match frontend
+            shipping_cost=price.shipping_cost,
             payment_method='mobilepay', # Keep as 'mobilepay' internally
             comments=data.get('comments', ''),
-            pickup_point_id=data.get('pickupPointId'), # Keep camelCase if frontend sends this
+            pickup_point_id=price.pickup_point_id,
              # Remove callback_token creation here, ePayment doesn't return one this way
         )
         
         items_data = data.get('items', [])
-        for item_data in items_data:
+        for item_data, line in zip(items_data, price.lines):
              OrderItem.objects.create(
                  order=order,
-                 name=item_data.get('name', 'Product'),
-                 price=item_data.get('price', 0),
-                 quantity=item_data.get('quantity', 1),
+                 name=item_data.get('name') or 'Product',
+                 price=line.unit_price,
+                 quantity=line.quantity,
                  fabric_type=item_data.get('fabricType'),
                  body_fabric=item_data.get('bodyFabric'),
                  head_fabric=item_data.get('headFabric'),
                  under_arms_fabric=item_data.get('underArmsFabric'),
                  belly_fabric=item_data.get('bellyFabric'),
-                 has_vest=item_data.get('hasVest', False),
+                 has_vest=line.has_vest,
                  vest_fabric=item_data.get('vestFabric'),
                  face_style=item_data.get('faceStyle'),
              )
         
-        PaymentLog.objects.create(
+        log_payment_event(
             order=order,
             event_type='CHECKOUT_CREATED',
             status='CREATED',
@@ -1154,7 +554,7 @@ def create_mobilepay_checkout(request):
                     return_url += f"?reference={reference}"
             
             checkout_data, callback_token, redirect_url = api.create_mobilepay_checkout(
-                amount=data['amount'],
+                amount=price.total,
                 reference=reference,
                 description=data.get('description', f"Order {reference}"),
                 return_url=return_url,
@@ -1163,12 +563,13 @@ def create_mobilepay_checkout(request):
             )
 
             # Log the successful checkout creation
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='EPAYMENT_CHECKOUT_CREATED', # Log as ePayment
                 status='SUCCESS',
                 response_data=checkout_data
             )
+            close_stored_cart(data)
 
             # Return the checkout information (using ePayment response)
             return JsonResponse({
@@ -1179,14 +580,13 @@ def create_mobilepay_checkout(request):
             })
 
         except Exception as e:
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='EPAYMENT_CHECKOUT_ERROR', # Log as ePayment error
                 status='ERROR',
                 response_data={'error': str(e)}
             )
-            order.status = 'SESSION_FAILED'
-            order.save()
+            transition_order(order, 'SESSION_FAILED')
             return JsonResponse({
                 'success': False,
                 'error': str(e),
@@ -1217,19 +617,16 @@ def get_mobilepay_payment(request, payment_id):
             # Update order status based on payment status
             payment_state = payment_details.get('state', '').upper()
             if payment_state == 'INITIATED':
-                order.status = 'PROCESSING'
+                transition_order(order, 'PROCESSING')
             elif payment_state == 'RESERVED':
-                order.status = 'PAYMENT_CONFIRMED'
+                transition_order(order, 'PAYMENT_CONFIRMED')
             elif payment_state == 'CAPTURED':
-                order.status = 'COMPLETED'
-                order.completed_at = datetime.datetime.now()
+                transition_order(order, 'COMPLETED', completed=True)
             elif payment_state == 'REJECTED' or payment_state == 'CANCELLED':
-                order.status = 'PAYMENT_FAILED'
-                
-            order.save()
+                transition_order(order, 'PAYMENT_FAILED')
             
             # Log the payment details
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='MOBILEPAY_PAYMENT_STATUS',
                 status=payment_state,
@@ -1264,7 +661,7 @@ def get_mobilepay_payment(request, payment_id):
             'error': str(e)
         }, status=500)
 
-@method_decorator(csrf_exempt, name='dispatch')
+@csrf_exempt
 @require_http_methods(["POST"])
 def mobilepay_callback_handler(request):
     """Handle Vipps/MobilePay ePayment webhook callbacks"""
@@ -1293,9 +690,10 @@ def mobilepay_callback_handler(request):
             
             # Update order status based on confirmed payment_details state
             payment_state = payment_details.get('state', '').upper()
+            completed = False
             # ... (map ePayment states to Order status - same logic as get_payment_status_view) ...
             if payment_state == 'AUTHORIZED':
-                order.status = 'PAYMENT_CONFIRMED'
+                new_status = 'PAYMENT_CONFIRMED'
                 
                 # AUTOMATIC CAPTURE: When payment is authorized, capture it immediately
                 try:
@@ -1333,7 +731,7 @@ def mobilepay_callback_handler(request):
                         )
                         
                         # Log the capture
-                        PaymentLog.objects.create(
+                        log_payment_event(
                             order=order,
                             event_type='PAYMENT_AUTO_CAPTURED',
                             status='COMPLETED',
@@ -1342,8 +740,8 @@ def mobilepay_callback_handler(request):
                         )
                         
                         # Update order status to COMPLETED since we've captured
-                        order.status = 'COMPLETED'
-                        order.completed_at = datetime.datetime.now()
+                        new_status = 'COMPLETED'
+                        completed = True
                         print(f"Payment auto-captured successfully for order {reference}")
                     else:
                         print(f"Could not auto-capture: missing authorized amount for order {reference}")
@@ -1353,17 +751,17 @@ def mobilepay_callback_handler(request):
                     # You may want to add this error to a queue for manual review
                 
             elif payment_state == 'CAPTURED':
-                 order.status = 'COMPLETED'
-                 order.completed_at = datetime.datetime.now()
+                 new_status = 'COMPLETED'
+                 completed = True
             elif payment_state in ['FAILED', 'CANCELLED', 'TERMINATED']:
-                 order.status = 'PAYMENT_FAILED'
+                 new_status = 'PAYMENT_FAILED'
             # Add other states
             else:
-                 order.status = 'PROCESSING' 
+                 new_status = 'PROCESSING' 
 
-            order.save()
+            transition_order(order, new_status, completed=completed)
             
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='EPAYMENT_CALLBACK',
                 status=payment_state,
@@ -1401,8 +799,9 @@ def get_payment_status_view(request, reference):
             
             # Update order status based on ePayment state
             payment_state = payment_details.get('state', '').upper()
+            completed = False
             if payment_state == 'AUTHORIZED':
-                order.status = 'PAYMENT_CONFIRMED'
+                new_status = 'PAYMENT_CONFIRMED'
                 
                 # Auto-capture if payment is authorized but not captured yet
                 if order.status != 'COMPLETED':
@@ -1441,7 +840,7 @@ def get_payment_status_view(request, reference):
                             )
                             
                             # Log the capture
-                            PaymentLog.objects.create(
+                            log_payment_event(
                                 order=order,
                                 event_type='PAYMENT_AUTO_CAPTURED',
                                 status='COMPLETED',
@@ -1450,8 +849,8 @@ def get_payment_status_view(request, reference):
                             )
                             
                             # Update order status to COMPLETED since we've captured
-                            order.status = 'COMPLETED'
-                            order.completed_at = datetime.datetime.now()
+                            new_status = 'COMPLETED'
+                            completed = True
                             payment_state = 'CAPTURED'  # Update the state for the response
                             print(f"Payment auto-captured successfully for order {reference}")
                             
@@ -1463,16 +862,16 @@ def get_payment_status_view(request, reference):
                         print(f"Failed to auto-capture payment for order {reference}: {str(capture_error)}")
                 
             elif payment_state == 'CAPTURED':
-                order.status = 'COMPLETED'
-                order.completed_at = datetime.datetime.now()
+                new_status = 'COMPLETED'
+                completed = True
             elif payment_state in ['FAILED', 'CANCELLED', 'TERMINATED']:
-                order.status = 'PAYMENT_FAILED'
+                new_status = 'PAYMENT_FAILED'
             else:
-                order.status = 'PROCESSING'
+                new_status = 'PROCESSING'
                 
-            order.save()
+            transition_order(order, new_status, completed=completed)
             
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='EPAYMENT_STATUS_CHECK',
                 status=payment_state,
@@ -1506,12 +905,56 @@ def get_payment_status_view(request, reference):
             'error': str(e)
         }, status=500)
 
+@require_http_methods(["GET", "HEAD"])
+def readiness_view(request):
+    """Load balancer readiness check: 200 once this worker has warmed up, 503 until then"""
+    status = warm_up_status()
+    if not status['started']:
+        # Not started by a gunicorn post_fork hook (e.g. runserver): warm up in the background
+        start_warm_up()
+    response = JsonResponse(status, status=200 if status['ready'] else 503)
+    patch_cache_control(response, no_store=True)
+    return response
+
 def mobilepay_test_page(request):
     """Serve a simple test page for 1 kr MobilePay payments"""
     return render(request, 'mobilepay_test.html')
 
-# Serve Next.js frontend
-index_view = never_cache(TemplateView.as_view(template_name='index.html'))
+def _page_etag(request, page=''):
+    cached = get_page(page)
+    return cached.etag if cached else None
+
+def _page_last_modified(request, page=''):
+    cached = get_page(page)
+    return datetime.datetime.fromtimestamp(cached.last_modified, tz=datetime.timezone.utc) if cached else None
+
+# Serve Next.js frontend pages from memory, revalidated with ETag/Last-Modified
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_page_etag, last_modified_func=_page_last_modified)
+def frontend_page_view(request, page=''):
+    cached = get_page(page)
+    if cached is None:
+        # This catch-all also matches e.g. /admin, which CommonMiddleware would otherwise slash-redirect
+        if settings.APPEND_SLASH and not request.path_info.endswith('/'):
+            try:
+                match = resolve(request.path_info + '/')
+            except Resolver404:
+                match = None
+            if match is not None and match.url_name != 'frontend_page':
+                return HttpResponsePermanentRedirect(request.get_full_path(force_append_slash=True))
+        raise Http404("No such page in the frontend build")
+
+    body, encoding = cached.negotiate(request.headers.get('Accept-Encoding', ''))
+
+    response = HttpResponse(body, content_type='text/html; charset=utf-8')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+    # Browsers revalidate every time; shared caches may reuse the page briefly
+    patch_cache_control(response, public=True, max_age=0, s_maxage=settings.FRONTEND_PAGE_SHARED_MAX_AGE)
+    return response
+
+index_view = frontend_page_view
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -1534,7 +977,7 @@ def capture_payment_frontend(request, reference):
         # Try to find the order to log the capture attempt
         try:
             order = Order.objects.get(reference=reference)
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='FRONTEND_CAPTURE_ATTEMPT',
                 status='INITIATED',
@@ -1554,7 +997,7 @@ def capture_payment_frontend(request, reference):
         
         # Log the successful capture
         if order:
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='FRONTEND_CAPTURE_SUCCESS',
                 status='COMPLETED',
@@ -1563,9 +1006,7 @@ def capture_payment_frontend(request, reference):
             )
             
             # Update order status
-            order.status = 'COMPLETED'
-            order.completed_at = datetime.datetime.now()
-            order.save()
+            transition_order(order, 'COMPLETED', completed=True)
         
         return JsonResponse({
             'success': True,
@@ -1577,7 +1018,7 @@ def capture_payment_frontend(request, reference):
         # Try to log the error if we can find the order
         try:
             order = Order.objects.get(reference=reference)
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='FRONTEND_CAPTURE_ERROR',
                 status='ERROR',
@@ -1602,7 +1043,7 @@ def get_payment_events_view(request, reference):
             order = Order.objects.get(reference=reference)
             
             # Log the event log request
-            PaymentLog.objects.create(
+            log_payment_event(
                 order=order,
                 event_type='EPAYMENT_EVENTS_CHECK',
                 status='SUCCESS',
@@ -1632,4 +1073,34 @@ def get_payment_events_view(request, reference):
         return JsonResponse({
             'success': False,
             'error': str(e)
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+@staff_member_required
+@require_http_methods(["GET"])
+def export_orders_view(request):
+    """Stream orders as CSV or JSONL for accounting.
+
+    Query parameters: format (csv/jsonl), from, to (YYYY-MM-DD, inclusive)
+    and status (comma-separated).
+    """
+    export_format = request.GET.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Unsupported format: {export_format}'}, status=400)
+
+    try:
+        filters = parse_export_filters(
+            date_from=request.GET.get('from'),
+            date_to=request.GET.get('to'),
+            status=request.GET.get('status'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+    response = StreamingHttpResponse(
+        iter_export(export_format, export_queryset(**filters)),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,118 @@
+"""Per-process warm-up, run when a worker starts.
+
+The first checkout on a fresh worker would otherwise pay for the database
+connection, the TCP/TLS handshakes to Vipps, the access token fetch and
+loading the catalog all at once. ``warm_up`` does that work up front: the
+gunicorn ``post_fork`` hook (backend/gunicorn.conf.py) runs it in each
+worker before it accepts requests, and the readiness endpoint reports 503
+until it has finished, so the load balancer only routes to warm workers.
+
+Only the database step decides readiness; a Vipps outage is reported by the
+readiness endpoint but does not keep the rest of the site from serving.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+
+_lock = threading.Lock()
+# Warm-up state of this process; 'pid' tells a forked worker apart from the master it inherited it from
+_state = {'pid': None, 'started': False, 'finished': False, 'ready': False, 'steps': {}}
+
+
+def _warm_database():
+    from django.db import connections
+    for connection in connections.all():
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return f"{len(connections.all())} connection(s) open"
+
+
+def _warm_caches():
+    from django.urls import get_resolver
+    from products.catalog import get_catalog
+    from .frontend_pages import get_page
+
+    get_resolver().url_patterns
+    catalog = get_catalog()
+    pages = 0
+    build_dir = settings.FRONTEND_BUILD_DIR
+    if os.path.isdir(build_dir):
+        for directory, _, filenames in os.walk(build_dir):
+            for filename in filenames:
+                if filename.endswith('.html'):
+                    name = os.path.relpath(os.path.join(directory, filename[:-len('.html')]), build_dir)
+                    pages += get_page(name.replace(os.sep, '/')) is not None
+    return f"catalog version {catalog.version}, {pages} page(s)"
+
+
+def _warm_vipps():
+    from payments import api
+    if not (api.client_id and api.client_secret and api.subscription_key):
+        return "skipped: Vipps credentials are not configured"
+    timeout = getattr(settings, 'WARMUP_TIMEOUT', 5)
+    opened = api.open_connections(getattr(settings, 'WARMUP_VIPPS_CONNECTIONS', 2), timeout=timeout)
+    api.get_access_token()
+    return f"{opened} connection(s) open, access token cached"
+
+
+def _run_step(name, func):
+    started = time.monotonic()
+    try:
+        detail, ok = func(), True
+    except Exception as e:
+        detail, ok = f"{type(e).__name__}: {e}", False
+    _state['steps'][name] = {
+        'ok': ok,
+        'detail': detail,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    return ok
+
+
+def _claim():
+    """Mark warm-up as started in this process; False if it already was"""
+    with _lock:
+        if _state['pid'] == os.getpid() and _state['started']:
+            return False
+        _state.update(pid=os.getpid(), started=True, finished=False, ready=False, steps={})
+        return True
+
+
+def warm_up():
+    """Warm this process up, at most once; returns whether it is ready.
+
+    The database and caches are warmed in the calling thread, since Django
+    connections belong to the thread that opened them. Vipps is warmed in
+    parallel because it is mostly waiting on the network.
+    """
+    if not _claim():
+        return _state['ready']
+    vipps = threading.Thread(target=_run_step, args=('vipps', _warm_vipps), daemon=True)
+    vipps.start()
+    database_ok = _run_step('database', _warm_database)
+    _run_step('caches', _warm_caches)
+    vipps.join()
+    _state['ready'] = database_ok
+    _state['finished'] = True
+    return database_ok
+
+
+def start_warm_up():
+    """Warm up in a background thread, for servers without a post_fork hook"""
+    if _state['pid'] != os.getpid() or not _state['started']:
+        threading.Thread(target=warm_up, daemon=True).start()
+
+
+def warm_up_status():
+    """Snapshot of this process's warm-up, as reported by the readiness endpoint"""
+    if _state['pid'] != os.getpid():
+        return {'started': False, 'finished': False, 'ready': False, 'steps': {}}
+    return {
+        'started': _state['started'],
+        'finished': _state['finished'],
+        'ready': _state['ready'],
+        'steps': dict(_state['steps']),
+    }
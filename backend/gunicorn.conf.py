@@ -0,0 +1,15 @@
+"""Gunicorn server hooks; the command-line options are set by run_project.py --production"""
+
+
+def post_fork(server, worker):
+    # Open the database and Vipps connections and prime the caches before this
+    # worker accepts requests; until then its /health/ready/ answers 503
+    from core.warmup import warm_up, warm_up_status
+
+    warm_up()
+    status = warm_up_status()
+    for name, step in status['steps'].items():
+        log = server.log.info if step['ok'] else server.log.warning
+        log("Worker %s warm-up %s (%.2fs): %s", worker.pid, name, step['seconds'], step['detail'])
+    if not status['ready']:
+        server.log.warning("Worker %s is not ready after warm-up", worker.pid)
@@ -0,0 +1,25 @@
+"""Vipps MobilePay integration.
+
+``payments.client`` (and ``requests`` with it) is only imported once the
+client is first used, so it stays out of worker start-up.
+"""
+from django.utils.functional import SimpleLazyObject
+
+__all__ = ['VippsAPIError', 'VippsMobilePayAPI', 'api', 'get_client']
+
+
+def get_client():
+    """Return the process-wide Vipps MobilePay client"""
+    from . import client
+    return client.get_client()
+
+
+# The process-wide client, created on first attribute access
+api = SimpleLazyObject(get_client)
+
+
+def __getattr__(name):
+    if name in ('VippsAPIError', 'VippsMobilePayAPI'):
+        from . import client
+        return getattr(client, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,480 @@
+import json
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+class VippsAPIError(Exception):
+    """Raised when a call to the Vipps/MobilePay API fails"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class VippsMobilePayAPI:
+    """Client for the Vipps MobilePay APIs.
+
+    A single instance is meant to be shared by the whole process (see
+    ``get_client``): it keeps one pooled HTTP session, caches the access
+    token until shortly before it expires and collects simple call metrics.
+    """
+
+    # Base URLs
+    TEST_BASE_URL = "https://apitest.vipps.no"
+    PROD_BASE_URL = "https://api.vipps.no"
+
+    DEFAULT_CURRENCY = "DKK"
+
+    # Vipps rejects idempotency keys longer than this
+    MAX_IDEMPOTENCY_KEY_LENGTH = 50
+
+    # Refresh the access token this many seconds before it actually expires
+    TOKEN_EXPIRY_MARGIN = 60
+
+    def __init__(self):
+        # Get settings from Django settings
+        self.client_id = settings.VIPPS_CLIENT_ID
+        self.client_secret = settings.VIPPS_CLIENT_SECRET
+        self.subscription_key = settings.VIPPS_SUBSCRIPTION_KEY
+        self.merchant_serial_number = settings.VIPPS_MERCHANT_SERIAL_NUMBER
+        self.is_test = getattr(settings, 'VIPPS_TEST_MODE', True)
+        self.timeout = getattr(settings, 'VIPPS_HTTP_TIMEOUT', 15)
+
+        # MobilePay specific settings
+        self.mobilepay_api_endpoint = settings.MOBILEPAY_API_ENDPOINT
+        self.checkout_return_url = settings.MOBILEPAY_CHECKOUT_RETURN_URL
+        self.checkout_callback_url = settings.MOBILEPAY_CHECKOUT_CALLBACK_URL
+
+        # System headers
+        self.system_name = "MemorybearWebapp"
+        self.system_version = "1.0.0"
+        self.plugin_name = "MemorybearCheckout"
+        self.plugin_version = "1.0.0"
+
+        # Shared HTTP session so connections (and TLS handshakes) are reused
+        pool_size = getattr(settings, 'VIPPS_HTTP_POOL_SIZE', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Access token cache
+        self._token_lock = threading.Lock()
+        self._access_token = None
+        self._access_token_expires_at = 0.0
+
+        # Call metrics
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'errors': 0,
+            'token_fetches': 0,
+            'token_cache_hits': 0,
+            'total_request_seconds': 0.0,
+        }
+
+    @property
+    def base_url(self):
+        return self.TEST_BASE_URL if self.is_test else self.PROD_BASE_URL
+
+    @property
+    def mobilepay_url(self):
+        return self.mobilepay_api_endpoint
+
+    # Metrics
+
+    def _record(self, **increments):
+        with self._metrics_lock:
+            for key, value in increments.items():
+                self._metrics[key] += value
+
+    def get_metrics(self):
+        """Return a snapshot of the call metrics collected by this client"""
+        with self._metrics_lock:
+            snapshot = dict(self._metrics)
+        snapshot['token_cached'] = self._access_token is not None and time.monotonic() < self._access_token_expires_at
+        return snapshot
+
+    # HTTP helpers
+
+    def _request(self, method, url, **kwargs):
+        """Send a request through the shared session and record metrics"""
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(requests=1, errors=1, total_request_seconds=time.monotonic() - started)
+            raise
+        failed = 1 if response.status_code >= 400 else 0
+        self._record(requests=1, errors=failed, total_request_seconds=time.monotonic() - started)
+        return response
+
+    def _raise_api_error(self, error, message):
+        """Log a failed request and re-raise it as a VippsAPIError"""
+        print(f"API Error: {str(error)}")
+        response = getattr(error, 'response', None)
+        status_code = None
+        if response is not None:
+            status_code = response.status_code
+            print(f"Response status: {response.status_code}")
+            print(f"Response content: {response.content}")
+        raise VippsAPIError(message, status_code=status_code) from error
+
+    def _lookup_error_message(self, error, subject, what):
+        """Return a user-friendly message for a failed payment lookup"""
+        response = getattr(error, 'response', None)
+        status_code = response.status_code if response is not None else None
+        if status_code == 404:
+            return f"{subject} not found. Verify the reference is correct and exists in the MobilePay system."
+        if status_code == 401:
+            return "Authorization failed. Check your API keys and credentials."
+        if status_code == 403:
+            return "Access forbidden. Your account may not have permission to access this payment."
+        return f"Failed to get {what}: {str(error)}"
+
+    def _idempotency_key(self, prefix, reference):
+        """Build an idempotency key that fits within the Vipps length limit"""
+        short_uuid = uuid.uuid4().hex[:8]
+        ref_max_len = self.MAX_IDEMPOTENCY_KEY_LENGTH - len(prefix) - len(short_uuid) - 2
+        return f"{prefix}-{reference[:ref_max_len]}-{short_uuid}"
+
+    # Authentication
+
+    def get_access_token(self, force_refresh=False):
+        """Return a valid access token, fetching a new one only when needed"""
+        with self._token_lock:
+            if not force_refresh and self._access_token and time.monotonic() < self._access_token_expires_at:
+                self._record(token_cache_hits=1)
+                return self._access_token
+
+            token_url = f"{self.base_url}/accesstoken/get"
+            token_headers = {
+                "Content-Type": "application/json",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "Ocp-Apim-Subscription-Key": self.subscription_key
+            }
+
+            try:
+                token_response = self._request("POST", token_url, headers=token_headers)
+                token_response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                self._raise_api_error(e, f"Failed to obtain access token: {str(e)}")
+
+            self._record(token_fetches=1)
+            token_data = token_response.json()
+            access_token = token_data.get("access_token")
+            if not access_token:
+                print("Failed to obtain access token. Token data keys:", list(token_data.keys()))
+                raise VippsAPIError("Failed to obtain access token")
+
+            try:
+                expires_in = int(token_data.get("expires_in", 3600))
+            except (TypeError, ValueError):
+                expires_in = 3600
+
+            self._access_token = access_token
+            self._access_token_expires_at = time.monotonic() + max(expires_in - self.TOKEN_EXPIRY_MARGIN, 0)
+            return access_token
+
+    def open_connections(self, count=1, timeout=None):
+        """Pre-establish up to ``count`` keep-alive connections to the API host.
+
+        Each connection is opened with a HEAD request and handed back to the
+        session's pool, so later calls skip the TCP and TLS handshakes.
+        Returns the number of connections that were opened.
+        """
+        count = max(min(count, getattr(settings, 'VIPPS_HTTP_POOL_SIZE', 10)), 1)
+        timeout = timeout or self.timeout
+        opened = []
+
+        def connect():
+            try:
+                # Any HTTP response means the connection is up
+                self.session.head(self.base_url, timeout=timeout).close()
+            except requests.exceptions.RequestException:
+                return
+            opened.append(1)
+
+        # Concurrent requests so each one checks out a different pooled connection
+        threads = [threading.Thread(target=connect, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(opened)
+
+    def clear_access_token(self):
+        """Drop the cached access token so the next call fetches a new one"""
+        with self._token_lock:
+            self._access_token = None
+            self._access_token_expires_at = 0.0
+
+    # Headers
+
+    def get_headers(self):
+        """Return common headers for API requests"""
+        return {
+            "Content-Type": "application/json",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "Ocp-Apim-Subscription-Key": self.subscription_key,
+            "Merchant-Serial-Number": self.merchant_serial_number,
+            "Vipps-System-Name": self.system_name,
+            "Vipps-System-Version": self.system_version,
+            "Vipps-System-Plugin-Name": self.plugin_name,
+            "Vipps-System-Plugin-Version": self.plugin_version
+        }
+
+    def get_epayment_headers(self, idempotency_key=None):
+        """Return authorized headers for the ePayment API"""
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.get_access_token()}",
+            "Ocp-Apim-Subscription-Key": self.subscription_key,
+            "Merchant-Serial-Number": self.merchant_serial_number,
+            "Vipps-System-Name": self.system_name,
+            "Vipps-System-Version": self.system_version,
+            "Vipps-System-Plugin-Name": self.plugin_name,
+            "Vipps-System-Plugin-Version": self.plugin_version
+        }
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        return headers
+
+    def _epayment_request(self, method, url, idempotency_key=None, **kwargs):
+        """Call the ePayment API, retrying once with a fresh token on 401"""
+        response = self._request(method, url, headers=self.get_epayment_headers(idempotency_key), **kwargs)
+        if response.status_code == 401:
+            self.clear_access_token()
+            response = self._request(method, url, headers=self.get_epayment_headers(idempotency_key), **kwargs)
+        if response.status_code >= 400:
+            print(f"Response status code: {response.status_code}")
+            print(f"Response content: {response.content}")
+        response.raise_for_status()
+        return response
+
+    # Checkout API
+
+    def create_checkout_session(self, amount, currency, reference, description, callback_url, return_url):
+        """Create a checkout session with Vipps MobilePay"""
+        url = f"{self.base_url}/checkout/v3/session"
+
+        # Generate a unique authorization token for callbacks
+        callback_token = str(uuid.uuid4())
+
+        payload = {
+            "merchantInfo": {
+                "callbackUrl": callback_url,
+                "returnUrl": return_url,
+                "callbackAuthorizationToken": callback_token
+            },
+            "transaction": {
+                "amount": {
+                    "value": amount,
+                    "currency": currency
+                },
+                "reference": reference,
+                "paymentDescription": description
+            }
+        }
+
+        try:
+            response = self._request("POST", url, headers=self.get_headers(), json=payload)
+            response.raise_for_status()
+            return response.json(), callback_token
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to connect to Vipps/MobilePay API: {str(e)}")
+
+    def get_session_details(self, reference):
+        """Get details of a checkout session"""
+        url = f"{self.base_url}/checkout/v3/session/{reference}"
+        try:
+            response = self._request("GET", url, headers=self.get_headers())
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to get session details: {str(e)}")
+
+    # ePayment API
+
+    def create_mobilepay_checkout(self, amount, reference, description, return_url=None, callback_url=None, customer_phone=None):
+        """Create a MobilePay checkout session using the ePayment API"""
+        url = f"{self.base_url}/epayment/v1/payments"
+
+        # Use default URLs if not provided
+        if return_url is None:
+            return_url = self.checkout_return_url
+        if callback_url is None:
+            callback_url = self.checkout_callback_url
+
+        payload = {
+            "amount": {
+                "value": amount,
+                "currency": self.DEFAULT_CURRENCY
+            },
+            "paymentMethod": {
+                "type": "WALLET"
+            },
+            # Required for wallet payments
+            "customerInteraction": "CUSTOMER_PRESENT",
+            "reference": reference,
+            "paymentDescription": description,
+            "returnUrl": return_url,
+            "userFlow": "WEB_REDIRECT",
+            "webhookUrl": callback_url
+        }
+
+        # The reference is unique per payment, so it doubles as the idempotency key
+        idempotency_key = reference[:self.MAX_IDEMPOTENCY_KEY_LENGTH]
+
+        print(f"Creating payment at: {url}")
+        print(f"Payment payload: {json.dumps(payload)}")
+
+        try:
+            response = self._epayment_request("POST", url, idempotency_key=idempotency_key, json=payload)
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to create ePayment session: {str(e)}")
+
+        response_data = response.json()
+        redirect_url = response_data.get("redirectUrl")
+        print(f"Redirect URL: {redirect_url}")
+
+        return response_data, None, redirect_url
+
+    def get_payment_details(self, reference):
+        """Get payment details from ePayment API"""
+        url = f"{self.base_url}/epayment/v1/payments/{reference}"
+        print(f"Fetching payment details from: {url}")
+        try:
+            response = self._epayment_request("GET", url)
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, self._lookup_error_message(e, f"Payment with reference '{reference}'", "payment details"))
+
+        data = response.json()
+        print(f"Payment state: {data.get('state')}")
+        return data
+
+    def get_payment_events(self, reference):
+        """Get payment event log from ePayment API"""
+        url = f"{self.base_url}/epayment/v1/payments/{reference}/events"
+        print(f"Fetching payment events from: {url}")
+        try:
+            response = self._epayment_request("GET", url)
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, self._lookup_error_message(e, f"Payment events for reference '{reference}'", "payment events"))
+        return response.json()
+
+    def _modification_payload(self, amount, description, currency):
+        payload = {}
+        if amount is not None:
+            payload["modificationAmount"] = {
+                "value": amount,
+                "currency": currency or self.DEFAULT_CURRENCY
+            }
+        if description is not None:
+            payload["description"] = description
+        return payload
+
+    def cancel_payment(self, reference):
+        """Cancel a payment"""
+        url = f"{self.base_url}/epayment/v1/payments/{reference}/cancel"
+        idempotency_key = self._idempotency_key("cnl", reference)
+        print(f"Cancelling payment at: {url}")
+        try:
+            response = self._epayment_request("POST", url, idempotency_key=idempotency_key, json={})
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to cancel payment: {str(e)}")
+        return response.json()
+
+    def capture_payment(self, reference, amount=None, description=None, currency=None):
+        """Capture a payment, either partially or fully"""
+        url = f"{self.base_url}/epayment/v1/payments/{reference}/capture"
+        payload = self._modification_payload(amount, description, currency)
+        idempotency_key = self._idempotency_key("cap", reference)
+        print(f"Capturing payment at: {url}")
+        print(f"Capture payload: {json.dumps(payload)}")
+        try:
+            response = self._epayment_request("POST", url, idempotency_key=idempotency_key, json=payload)
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to capture payment: {str(e)}")
+        return response.json()
+
+    def refund_payment(self, reference, amount=None, description=None, currency=None):
+        """Refund a payment, either partially or fully"""
+        url = f"{self.base_url}/epayment/v1/payments/{reference}/refund"
+        payload = self._modification_payload(amount, description, currency)
+        idempotency_key = self._idempotency_key("ref", reference)
+        print(f"Refunding payment at: {url}")
+        print(f"Refund payload: {json.dumps(payload)}")
+        try:
+            response = self._epayment_request("POST", url, idempotency_key=idempotency_key, json=payload)
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to refund payment: {str(e)}")
+        return response.json()
+
+    # Legacy MobilePay API
+
+    def _format_phone_number(self, phone):
+        """Format phone number to the expected format for MobilePay"""
+        if not phone:
+            return None
+
+        # Remove any spaces, dashes, etc.
+        phone = ''.join(c for c in phone if c.isdigit() or c == '+')
+
+        # If it starts with 00, replace with +
+        if phone.startswith('00'):
+            phone = '+' + phone[2:]
+
+        # If it doesn't have a country code, add Danish country code
+        if not phone.startswith('+'):
+            # If it starts with 0, remove the 0
+            if phone.startswith('0'):
+                phone = phone[1:]
+            # Add Danish country code
+            if not phone.startswith('45'):
+                phone = '45' + phone
+
+        # Ensure it's in the expected format
+        if phone.startswith('+'):
+            return phone
+        else:
+            return f"+{phone}"
+
+    def get_mobilepay_payment_status(self, payment_id):
+        """Get status of a MobilePay payment"""
+        url = f"{self.mobilepay_url}/v1/payments/{payment_id}"
+
+        headers = {
+            "Content-Type": "application/json",
+            "x-ibm-client-id": self.client_id,
+            "x-api-key": self.subscription_key
+        }
+
+        try:
+            response = self._request("GET", url, headers=headers)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            self._raise_api_error(e, f"Failed to get MobilePay payment status: {str(e)}")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide Vipps MobilePay client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = VippsMobilePayAPI()
+    return _client
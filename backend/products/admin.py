@@ -1,3 +1,41 @@
 from django.contrib import admin
+from .models import AddOn, CatalogVersion, FabricOption, ShippingMethod
 
-# Register your models here.
+
+class PriceInDKKMixin:
+    def price_in_dkk(self, obj):
+        return f"{obj.price / 100:.2f} DKK"
+    price_in_dkk.short_description = "Price"
+
+
+@admin.register(FabricOption)
+class FabricOptionAdmin(PriceInDKKMixin, admin.ModelAdmin):
+    list_display = ['name', 'code', 'fabric_count', 'price_in_dkk', 'is_active', 'sort_order']
+    list_editable = ['is_active', 'sort_order']
+    list_filter = ['is_active']
+
+
+@admin.register(AddOn)
+class AddOnAdmin(PriceInDKKMixin, admin.ModelAdmin):
+    list_display = ['name', 'code', 'price_in_dkk', 'is_active', 'sort_order']
+    list_editable = ['is_active', 'sort_order']
+    list_filter = ['is_active']
+
+
+@admin.register(ShippingMethod)
+class ShippingMethodAdmin(PriceInDKKMixin, admin.ModelAdmin):
+    list_display = ['name', 'code', 'price_in_dkk', 'requires_pickup_point', 'is_active', 'sort_order']
+    list_editable = ['is_active', 'sort_order']
+    list_filter = ['is_active']
+
+
+@admin.register(CatalogVersion)
+class CatalogVersionAdmin(admin.ModelAdmin):
+    list_display = ['version', 'updated_at']
+    readonly_fields = ['version', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
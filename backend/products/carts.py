@@ -0,0 +1,165 @@
+"""Server-side shopping carts keyed by an opaque cart token.
+
+Each cart is a compact list of lines in a Cart row under its token. Every
+write, and a read at most once per TOUCH_INTERVAL, pushes its expiry
+CART_TTL seconds out. Expired carts are never returned, and are deleted
+whenever a new cart is created, so nothing else has to sweep for them and
+no live cart is ever evicted to make room.
+
+Lines keep only the canonical fabric code, vest flag, quantity and the
+customer's fabric choices; prices are always taken from the current
+catalog when the cart is shown or checked out.
+"""
+import datetime
+import re
+import secrets
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Cart
+from .pricing import PricingError, price_items
+
+# Upper bound on distinct lines in one cart
+MAX_LINES = 20
+# Reading a cart extends its lifetime only when it was last extended longer ago than this,
+# so browsing a cart is not a write every time
+TOUCH_INTERVAL = datetime.timedelta(hours=1)
+
+# Free-text customization fields, in storage order, with the OrderItem column length they end up in
+TEXT_FIELDS = (
+    ('name', 100),
+    ('bodyFabric', 255),
+    ('headFabric', 255),
+    ('underArmsFabric', 255),
+    ('bellyFabric', 255),
+    ('vestFabric', 255),
+    ('faceStyle', 100),
+)
+
+_TOKEN = re.compile(r'^[A-Za-z0-9_-]{20,64}$')
+
+
+class CartNotFound(LookupError):
+    """The cart token is unknown or the cart has expired"""
+
+
+def _expiry():
+    return timezone.now() + datetime.timedelta(seconds=settings.CART_TTL)
+
+
+def new_token():
+    return secrets.token_urlsafe(18)
+
+
+def get_cart(token):
+    """Return the stored cart for ``token`` and extend its lifetime"""
+    if not token or not _TOKEN.match(token):
+        raise CartNotFound(token)
+    row = Cart.objects.filter(token=token, expires_at__gt=timezone.now()).values_list('lines', 'expires_at').first()
+    if row is None:
+        raise CartNotFound(token)
+    cart, expires_at = row
+    expiry = _expiry()
+    if expires_at < expiry - TOUCH_INTERVAL:
+        Cart.objects.filter(token=token).update(expires_at=expiry)
+    return cart
+
+
+def save_cart(token, cart):
+    if Cart.objects.filter(token=token).update(lines=cart, expires_at=_expiry()):
+        return
+    Cart.objects.filter(expires_at__lte=timezone.now()).delete()
+    Cart.objects.create(token=token, lines=cart, expires_at=_expiry())
+
+
+def delete_cart(token):
+    Cart.objects.filter(token=token).delete()
+
+
+def empty_cart():
+    # [next line id, [line, ...]]; each line is
+    # [id, fabric code, has vest, quantity, name, body, head, under arms, belly, vest fabric, face]
+    return [1, []]
+
+
+def _line_values(item, tables):
+    """Validate one storefront item and return its stored values (without the id)"""
+    (line,), _ = price_items(tables, [item])
+    values = [line.fabric_code, line.has_vest, line.quantity]
+    for field, max_length in TEXT_FIELDS:
+        value = item.get(field)
+        values.append(str(value)[:max_length] if value not in (None, '') else None)
+    return values
+
+
+def _line_item(line):
+    """Turn a stored line back into a storefront item dict"""
+    item = {'id': line[0], 'fabricType': line[1], 'hasVest': line[2], 'quantity': line[3]}
+    for (field, _), value in zip(TEXT_FIELDS, line[4:]):
+        item[field] = value
+    return item
+
+
+def _find_line(cart, line_id):
+    for line in cart[1]:
+        if line[0] == line_id:
+            return line
+    raise CartNotFound(line_id)
+
+
+def add_item(cart, item, tables):
+    """Validate ``item`` and add it to the cart, returning the new line id"""
+    if not isinstance(item, dict):
+        raise PricingError(["Item 1: not a valid cart item"])
+    if len(cart[1]) >= MAX_LINES:
+        raise PricingError([f"A cart can hold at most {MAX_LINES} different items"])
+    line_id = cart[0]
+    cart[1].append([line_id] + _line_values(item, tables))
+    cart[0] += 1
+    return line_id
+
+
+def update_item(cart, line_id, changes, tables):
+    """Apply storefront-style ``changes`` to a line; a quantity of 0 removes it"""
+    line = _find_line(cart, line_id)
+    if changes.get('quantity') in (0, '0'):
+        remove_item(cart, line_id)
+        return
+    item = _line_item(line)
+    item.update({key: value for key, value in changes.items() if key != 'id'})
+    line[1:] = _line_values(item, tables)
+
+
+def remove_item(cart, line_id):
+    line = _find_line(cart, line_id)
+    cart[1].remove(line)
+
+
+def cart_items(cart, catalog):
+    """Storefront item dicts for every line, as checkout expects them"""
+    items = []
+    for line in cart[1]:
+        item = _line_item(line)
+        fabric = catalog.fabrics_by_code.get(item['fabricType'])
+        if fabric is not None:
+            # Orders record the option's display name, as when the storefront posts items
+            item['fabricType'] = fabric['name']
+        items.append(item)
+    return items
+
+
+def cart_data(token, cart, catalog):
+    """JSON-ready view of a cart, priced against the current catalog"""
+    items = cart_items(cart, catalog)
+    data = {'token': token, 'currency': 'DKK', 'items': items, 'subtotal': None}
+    try:
+        lines, data['subtotal'] = price_items(catalog.price_tables, items)
+    except PricingError as e:
+        # Something in the cart left the catalog since it was added
+        data['errors'] = e.errors
+        return data
+    for item, line in zip(items, lines):
+        item['unitPrice'] = line.unit_price
+        item['lineTotal'] = line.unit_price * line.quantity
+    return data
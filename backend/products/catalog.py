@@ -0,0 +1,107 @@
+"""In-process cache of the product catalog.
+
+The whole catalog is small, so each process keeps one immutable snapshot
+of it together with its pre-serialized JSON. The snapshot is tagged with
+the CatalogVersion it was built from; catalog edits bump that version
+(see products.signals) and processes reload once they notice the change.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import AddOn, CatalogVersion, FabricOption, ShippingMethod
+from .pricing import PriceTables
+
+
+class Catalog:
+    """Immutable snapshot of the active catalog, indexed for pricing"""
+
+    def __init__(self, version, fabric_options, add_ons, shipping_methods):
+        self.version = version
+        self.fabric_options = fabric_options
+        self.add_ons = add_ons
+        self.shipping_methods = shipping_methods
+
+        self.fabrics_by_code = {option['code']: option for option in fabric_options}
+        self.add_ons_by_code = {add_on['code']: add_on for add_on in add_ons}
+        self.shipping_by_code = {method['code']: method for method in shipping_methods}
+
+        self.payload = json.dumps({
+            'version': version,
+            'currency': 'DKK',
+            'fabricOptions': fabric_options,
+            'addOns': add_ons,
+            'shippingMethods': shipping_methods,
+        }, separators=(',', ':')).encode('utf-8')
+        self.etag = f'"catalog-{version}-{hashlib.md5(self.payload).hexdigest()[:12]}"'
+        self.price_tables = PriceTables.from_catalog(self)
+
+
+def _load_catalog(version):
+    fabric_options = list(
+        FabricOption.objects.filter(is_active=True)
+        .values('code', 'name', 'fabric_count', 'price')
+    )
+    add_ons = list(AddOn.objects.filter(is_active=True).values('code', 'name', 'price'))
+    shipping_methods = [
+        {
+            'code': method['code'],
+            'name': method['name'],
+            'price': method['price'],
+            'requiresPickupPoint': method['requires_pickup_point'],
+        }
+        for method in ShippingMethod.objects.filter(is_active=True)
+        .values('code', 'name', 'price', 'requires_pickup_point')
+    ]
+    return Catalog(version, fabric_options, add_ons, shipping_methods)
+
+
+def _current_version():
+    version = CatalogVersion.objects.values_list('version', flat=True).first()
+    return version or 0
+
+
+_lock = threading.Lock()
+_state = {'catalog': None, 'checked_at': 0.0}
+
+
+def get_catalog():
+    """Return the cached catalog, reloading it if the stored version moved on.
+
+    The version row is checked at most every CATALOG_VERSION_CHECK_INTERVAL
+    seconds, so the common path does no database work at all.
+    """
+    catalog = _state['catalog']
+    interval = getattr(settings, 'CATALOG_VERSION_CHECK_INTERVAL', 5)
+    if catalog is not None and time.monotonic() - _state['checked_at'] < interval:
+        return catalog
+
+    with _lock:
+        catalog = _state['catalog']
+        if catalog is not None and time.monotonic() - _state['checked_at'] < interval:
+            return catalog
+        version = _current_version()
+        if catalog is None or catalog.version != version:
+            catalog = _load_catalog(version)
+            _state['catalog'] = catalog
+        _state['checked_at'] = time.monotonic()
+        return catalog
+
+
+def invalidate_catalog():
+    """Drop this process's cached catalog"""
+    with _lock:
+        _state['catalog'] = None
+        _state['checked_at'] = 0.0
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed for every process"""
+    updated = CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    invalidate_catalog()
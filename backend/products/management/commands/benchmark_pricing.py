@@ -0,0 +1,65 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products.catalog import get_catalog
+from products.pricing import PricingError, price_cart
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput of the pure cart pricing core on randomly generated storefront carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carts', type=int, default=50000)
+        parser.add_argument('--rounds', type=int, default=5, help='Timed passes over the carts; the median is reported')
+        parser.add_argument('--invalid-share', type=float, default=0.05,
+                            help='Share of carts with an unknown fabric option')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        catalog = get_catalog()
+        if not catalog.fabric_options or not catalog.shipping_methods:
+            raise CommandError("The product catalog has no active fabric options or shipping methods")
+        tables = catalog.price_tables
+        carts = self._carts(catalog, options['carts'], options['invalid_share'], options['seed'])
+
+        timings = []
+        rejected = 0
+        for _ in range(max(options['rounds'], 1)):
+            rejected = 0
+            started = time.perf_counter()
+            for items, shipping_method in carts:
+                try:
+                    price_cart(tables, items, shipping_method, require_pickup_point=False)
+                except PricingError:
+                    rejected += 1
+            timings.append(time.perf_counter() - started)
+
+        seconds = statistics.median(timings)
+        line_count = sum(len(items) for items, _ in carts)
+        self.stdout.write(f"{len(carts)} carts ({line_count} lines, {rejected} rejected), "
+                          f"median of {len(timings)} rounds")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(carts) / seconds:,.0f} carts/s, {seconds / len(carts) * 1e6:.2f} us per cart"
+        ))
+
+    def _carts(self, catalog, count, invalid_share, seed):
+        """Carts shaped like the ones the storefront posts"""
+        rng = random.Random(seed)
+        fabric_names = [option['name'] for option in catalog.fabric_options]
+        shipping_codes = [method['code'] for method in catalog.shipping_methods]
+        carts = []
+        for _ in range(count):
+            items = [
+                {
+                    'name': 'MemoryBear',
+                    'fabricType': rng.choice(fabric_names),
+                    'hasVest': rng.choice(['Yes', 'No', True, False]),
+                    'quantity': rng.choice([1, 1, 1, 2, 3]),
+                }
+                for _ in range(rng.choice([1, 1, 1, 2, 2, 3, 4]))
+            ]
+            if rng.random() < invalid_share:
+                items[-1]['fabricType'] = 'discontinued fabric'
+            carts.append((items, rng.choice(shipping_codes)))
+        return carts
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddOn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.IntegerField(help_text='Price in øre (cents)')),
+                ('is_active', models.BooleanField(default=True)),
+                ('sort_order', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Add-on',
+                'verbose_name_plural': 'Add-ons',
+                'ordering': ['sort_order', 'code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Catalog Version',
+                'verbose_name_plural': 'Catalog Version',
+            },
+        ),
+        migrations.CreateModel(
+            name='FabricOption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(unique=True)),
+                ('name', models.CharField(help_text='Shown to customers and sent back as fabricType', max_length=100)),
+                ('fabric_count', models.PositiveIntegerField(default=1)),
+                ('price', models.IntegerField(help_text='Price in øre (cents)')),
+                ('is_active', models.BooleanField(default=True)),
+                ('sort_order', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Fabric Option',
+                'verbose_name_plural': 'Fabric Options',
+                'ordering': ['sort_order', 'fabric_count'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShippingMethod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(help_text='Matches Order.shipping_method', max_length=20, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.IntegerField(help_text='Price in øre (cents)')),
+                ('requires_pickup_point', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('sort_order', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Shipping Method',
+                'verbose_name_plural': 'Shipping Methods',
+                'ordering': ['sort_order', 'code'],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+FABRIC_OPTIONS = [
+    ('fabric-1', '1 type of fabric', 1, 49900),
+    ('fabric-2', '2 types of fabric', 2, 59900),
+    ('fabric-3', '3 types of fabric', 3, 69900),
+    ('fabric-4', '4 types of fabric', 4, 79900),
+]
+
+ADD_ONS = [
+    ('vest', 'Vest', 25000),
+]
+
+SHIPPING_METHODS = [
+    ('home', 'Home Delivery', 4900, False),
+    ('pickup', 'Pickup Point', 3900, True),
+]
+
+
+def create_default_catalog(apps, schema_editor):
+    FabricOption = apps.get_model('products', 'FabricOption')
+    AddOn = apps.get_model('products', 'AddOn')
+    ShippingMethod = apps.get_model('products', 'ShippingMethod')
+    CatalogVersion = apps.get_model('products', 'CatalogVersion')
+
+    for index, (code, name, fabric_count, price) in enumerate(FABRIC_OPTIONS):
+        FabricOption.objects.get_or_create(code=code, defaults={
+            'name': name, 'fabric_count': fabric_count, 'price': price, 'sort_order': index,
+        })
+    for index, (code, name, price) in enumerate(ADD_ONS):
+        AddOn.objects.get_or_create(code=code, defaults={'name': name, 'price': price, 'sort_order': index})
+    for index, (code, name, price, requires_pickup_point) in enumerate(SHIPPING_METHODS):
+        ShippingMethod.objects.get_or_create(code=code, defaults={
+            'name': name, 'price': price, 'requires_pickup_point': requires_pickup_point, 'sort_order': index,
+        })
+    CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_catalog, migrations.RunPython.noop),
+    ]
@@ -1 +1,84 @@
-# Models are defined in core.models
+from django.db import models
+
+# Orders, customers and payment logs are defined in core.models;
+# this app holds the product catalog that checkout prices carts against.
+
+class FabricOption(models.Model):
+    """Base bear price, determined by how many fabrics it is sewn from"""
+    code = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=100, help_text="Shown to customers and sent back as fabricType")
+    fabric_count = models.PositiveIntegerField(default=1)
+    price = models.IntegerField(help_text="Price in øre (cents)")
+    is_active = models.BooleanField(default=True)
+    sort_order = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.price / 100:.2f} DKK)"
+
+    class Meta:
+        verbose_name = "Fabric Option"
+        verbose_name_plural = "Fabric Options"
+        ordering = ['sort_order', 'fabric_count']
+
+class AddOn(models.Model):
+    """Optional extra for a bear, such as the vest"""
+    code = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=100)
+    price = models.IntegerField(help_text="Price in øre (cents)")
+    is_active = models.BooleanField(default=True)
+    sort_order = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.price / 100:.2f} DKK)"
+
+    class Meta:
+        verbose_name = "Add-on"
+        verbose_name_plural = "Add-ons"
+        ordering = ['sort_order', 'code']
+
+class ShippingMethod(models.Model):
+    code = models.SlugField(max_length=20, unique=True, help_text="Matches Order.shipping_method")
+    name = models.CharField(max_length=100)
+    price = models.IntegerField(help_text="Price in øre (cents)")
+    requires_pickup_point = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+    sort_order = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.price / 100:.2f} DKK)"
+
+    class Meta:
+        verbose_name = "Shipping Method"
+        verbose_name_plural = "Shipping Methods"
+        ordering = ['sort_order', 'code']
+
+class CatalogVersion(models.Model):
+    """Single row whose version is bumped whenever the catalog changes.
+
+    Each process compares it against its in-memory catalog to know when to reload.
+    """
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
+
+    class Meta:
+        verbose_name = "Catalog Version"
+        verbose_name_plural = "Catalog Version"
+
+class Cart(models.Model):
+    """A server-side cart's lines, under its opaque token (see products.carts)"""
+    token = models.CharField(max_length=64, unique=True)
+    lines = models.JSONField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Cart {self.token} until {self.expires_at}"
+
+    class Meta:
+        verbose_name = "Cart"
+        verbose_name_plural = "Carts"
@@ -0,0 +1,137 @@
+"""Cart pricing engine.
+
+``price_cart`` is a pure function over precomputed ``PriceTables``: it
+validates a whole cart (items, vest add-on, shipping method and pickup
+point) in one pass, collects every problem it finds and returns the
+canonical prices. It never touches the database; the tables are built once
+per catalog snapshot (see products.catalog).
+"""
+from collections import namedtuple
+
+# Upper bound on a single line's quantity, to catch garbage before it reaches the payment provider
+MAX_QUANTITY = 99
+
+# Values the storefront uses for "has a vest" ('Yes' from the customizer, true from the cart)
+_VEST_VALUES = frozenset(['yes', 'true', '1'])
+
+CartLine = namedtuple('CartLine', ['fabric_code', 'has_vest', 'unit_price', 'quantity'])
+CartPrice = namedtuple('CartPrice', ['lines', 'subtotal', 'shipping_cost', 'total', 'pickup_point_id'])
+
+
+class PricingError(ValueError):
+    """Raised with every validation problem found in a cart"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+class PriceTables:
+    """Flat lookup tables for pricing, built from one catalog snapshot"""
+
+    __slots__ = ('fabrics', 'vest_price', 'shipping')
+
+    def __init__(self, fabrics, vest_price, shipping):
+        # Lower-cased fabric code or display name -> (code, price)
+        self.fabrics = fabrics
+        # None when the vest is not on sale
+        self.vest_price = vest_price
+        # Shipping method code -> (price, requires pickup point)
+        self.shipping = shipping
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        fabrics = {}
+        for option in catalog.fabric_options:
+            entry = (option['code'], option['price'])
+            # The storefront sends the option's display name back as fabricType
+            fabrics[option['name'].lower()] = entry
+            fabrics[option['code'].lower()] = entry
+        vest = catalog.add_ons_by_code.get('vest')
+        shipping = {
+            method['code']: (method['price'], method['requiresPickupPoint'])
+            for method in catalog.shipping_methods
+        }
+        return cls(fabrics, vest['price'] if vest else None, shipping)
+
+
+def _quantity(value):
+    if value is None:
+        return 1
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _price_lines(tables, items, errors):
+    """Price each item, appending any problems to ``errors``; returns (lines, subtotal)"""
+    fabrics = tables.fabrics
+    vest_price = tables.vest_price
+
+    lines = []
+    subtotal = 0
+    for number, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            errors.append(f"Item {number}: not a valid cart item")
+            continue
+
+        fabric_type = item.get('fabricType')
+        fabric = fabrics.get(fabric_type.lower()) if isinstance(fabric_type, str) else None
+        if fabric is None:
+            errors.append(f"Item {number}: unknown fabric option {fabric_type!r}")
+
+        has_vest = item.get('hasVest')
+        has_vest = has_vest is True or (isinstance(has_vest, str) and has_vest.lower() in _VEST_VALUES)
+        if has_vest and vest_price is None:
+            errors.append(f"Item {number}: the vest is not available")
+
+        quantity = _quantity(item.get('quantity'))
+        if quantity is None or not 1 <= quantity <= MAX_QUANTITY:
+            errors.append(f"Item {number}: quantity must be a whole number from 1 to {MAX_QUANTITY}")
+
+        if errors:
+            # Keep validating the rest of the cart, but stop pricing it
+            continue
+        unit_price = fabric[1] + (vest_price if has_vest else 0)
+        lines.append(CartLine(fabric[0], has_vest, unit_price, quantity))
+        subtotal += unit_price * quantity
+    return lines, subtotal
+
+
+def price_items(tables, items):
+    """Validate and price items without shipping; returns (lines, subtotal)"""
+    errors = []
+    lines, subtotal = _price_lines(tables, items, errors)
+    if errors:
+        raise PricingError(errors)
+    return tuple(lines), subtotal
+
+
+def price_cart(tables, items, shipping_method, pickup_point_id=None, require_pickup_point=True):
+    """Validate and price a cart, returning a CartPrice (all amounts in øre).
+
+    ``items`` are the dicts posted by the storefront (``fabricType``,
+    ``hasVest``, ``quantity``). Raises PricingError listing every problem.
+    """
+    errors = []
+    if not items:
+        errors.append("The cart is empty")
+        items = ()
+    lines, subtotal = _price_lines(tables, items, errors)
+
+    shipping = tables.shipping.get(shipping_method)
+    if shipping is None:
+        errors.append(f"Unknown shipping method: {shipping_method!r}")
+    elif shipping[1]:
+        if require_pickup_point and not pickup_point_id:
+            errors.append(f"Shipping method {shipping_method!r} requires a pickup point")
+    else:
+        # Only keep a pickup point for methods that deliver to one
+        pickup_point_id = None
+
+    if errors:
+        raise PricingError(errors)
+
+    return CartPrice(tuple(lines), subtotal, shipping[0], subtotal + shipping[0], pickup_point_id or None)
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .models import AddOn, FabricOption, ShippingMethod
+
+
+@receiver([post_save, post_delete], sender=FabricOption)
+@receiver([post_save, post_delete], sender=AddOn)
+@receiver([post_save, post_delete], sender=ShippingMethod)
+def catalog_changed(sender, **kwargs):
+    # Bump after commit so other processes never reload a half-written catalog
+    transaction.on_commit(bump_catalog_version)
@@ -1,3 +1,38 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import carts
+from .models import Cart
+
+
+class CartStoreTests(TestCase):
+    def test_saved_cart_is_read_back(self):
+        token = carts.new_token()
+        carts.save_cart(token, [2, [[1, 'fabric-1', False, 1] + [None] * 7]])
+
+        self.assertEqual(carts.get_cart(token), [2, [[1, 'fabric-1', False, 1] + [None] * 7]])
+
+    def test_expired_cart_is_not_found_and_removed_by_the_next_new_cart(self):
+        old = carts.new_token()
+        carts.save_cart(old, carts.empty_cart())
+        Cart.objects.filter(token=old).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        with self.assertRaises(carts.CartNotFound):
+            carts.get_cart(old)
+        carts.save_cart(carts.new_token(), carts.empty_cart())
+        self.assertFalse(Cart.objects.filter(token=old).exists())
+
+    @override_settings(CART_TTL=14 * 24 * 3600)
+    def test_reading_extends_the_lifetime_at_most_once_per_interval(self):
+        token = carts.new_token()
+        carts.save_cart(token, carts.empty_cart())
+        with self.assertNumQueries(1):
+            carts.get_cart(token)
+
+        stale = timezone.now() + datetime.timedelta(days=1)
+        Cart.objects.filter(token=token).update(expires_at=stale)
+        with self.assertNumQueries(2):
+            carts.get_cart(token)
+        self.assertGreater(Cart.objects.get(token=token).expires_at, stale + datetime.timedelta(days=12))
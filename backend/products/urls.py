@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('catalog/', views.catalog_view, name='product_catalog'),
+    path('carts/', views.create_cart_view, name='create_cart'),
+    path('carts/<str:token>/', views.cart_view, name='cart'),
+    path('carts/<str:token>/items/', views.cart_items_view, name='cart_items'),
+    path('carts/<str:token>/items/<int:line_id>/', views.cart_item_view, name='cart_item'),
+]
@@ -1,3 +1,108 @@
-from django.shortcuts import render
+import functools
+import json
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from . import carts
+from .catalog import get_catalog
+from .pricing import PricingError
 
-# Create your views here.
+# Let browsers and shared caches reuse the catalog briefly, then revalidate with the ETag
+CATALOG_MAX_AGE = 60
+
+
+@require_http_methods(["GET", "HEAD"])
+def catalog_view(request):
+    """Serve the product catalog (fabric options, add-ons, shipping methods) as JSON"""
+    catalog = get_catalog()
+
+    if catalog.etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(catalog.payload, content_type='application/json')
+    response['ETag'] = catalog.etag
+    response['Cache-Control'] = f'public, max-age={CATALOG_MAX_AGE}'
+    return response
+
+
+def _json_body(request):
+    if not request.body:
+        return {}
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return data
+
+
+def _cart_response(token, cart, status=200):
+    response = JsonResponse(carts.cart_data(token, cart, get_catalog()), status=status)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _cart_errors(view):
+    """Map cart lookups and validation failures to JSON error responses"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except PricingError as e:
+            return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except carts.CartNotFound:
+            return JsonResponse({'error': 'Cart or cart item not found (carts expire when left unused)'}, status=404)
+    return wrapper
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_cart_errors
+def create_cart_view(request):
+    """Create a cart, optionally with initial items, and return its token"""
+    data = _json_body(request)
+    tables = get_catalog().price_tables
+    cart = carts.empty_cart()
+    for item in data.get('items') or []:
+        carts.add_item(cart, item, tables)
+    token = carts.new_token()
+    carts.save_cart(token, cart)
+    return _cart_response(token, cart, status=201)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+@_cart_errors
+def cart_view(request, token):
+    """Return a cart priced against the current catalog, or delete it"""
+    cart = carts.get_cart(token)
+    if request.method == 'DELETE':
+        carts.delete_cart(token)
+        return HttpResponse(status=204)
+    return _cart_response(token, cart)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@_cart_errors
+def cart_items_view(request, token):
+    """Add an item to a cart"""
+    cart = carts.get_cart(token)
+    carts.add_item(cart, _json_body(request), get_catalog().price_tables)
+    carts.save_cart(token, cart)
+    return _cart_response(token, cart, status=201)
+
+
+@csrf_exempt
+@require_http_methods(["PATCH", "DELETE"])
+@_cart_errors
+def cart_item_view(request, token, line_id):
+    """Change (e.g. the quantity of) or remove one cart item"""
+    cart = carts.get_cart(token)
+    if request.method == 'DELETE':
+        carts.remove_item(cart, line_id)
+    else:
+        carts.update_item(cart, line_id, _json_body(request), get_catalog().price_tables)
+    carts.save_cart(token, cart)
+    return _cart_response(token, cart)
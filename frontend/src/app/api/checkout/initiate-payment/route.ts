@@ -47,7 +47,6 @@ export async function POST(req: NextRequest) {
     // Prepare the data for the MobilePay checkout endpoint
     const payloadForBackend = {
       amount: data.amount,
-      reference: data.reference || `order-${Date.now()}`,
       currency: data.currency || 'DKK',
       description: data.description || 'Purchase from MemoryBear',
       customer: data.customer || {},
@@ -63,11 +62,17 @@ export async function POST(req: NextRequest) {
     // console.log('Backend URL:', `${BACKEND_URL}/mobilepay/checkout/`);
 
     // Forward the request to the Django backend
+    // Pass the browser's Idempotency-Key on, so a retried checkout replays the first one
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+    };
+    const idempotencyKey = req.headers.get('Idempotency-Key');
+    if (idempotencyKey) {
+      headers['Idempotency-Key'] = idempotencyKey;
+    }
     const response = await fetch(`${BACKEND_URL}/mobilepay/checkout/`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers,
       body: JSON.stringify(payloadForBackend),
     });
 
@@ -1,6 +1,6 @@
 'use client';
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import Image from 'next/image';
 import { Playfair_Display, Lato } from 'next/font/google';
 import { useForm } from 'react-hook-form';
@@ -30,6 +30,8 @@ export default function CheckoutPage() {
   const [marketingConsent, setMarketingConsent] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // One key per payment attempt, so a double submit or retry reuses the first checkout
+  const idempotencyKey = useRef<string | null>(null);
 
   const { register, handleSubmit, watch, formState: { errors } } = useForm();
   const formData = watch();
@@ -52,6 +54,8 @@ export default function CheckoutPage() {
 
   const handlePayment = async (customerData: Record<string, any>) => {
     setIsProcessing(true);
+    const attemptKey = idempotencyKey.current ?? crypto.randomUUID();
+    idempotencyKey.current = attemptKey;
     setError(null);
     
     try {
@@ -102,6 +106,7 @@ export default function CheckoutPage() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': attemptKey,
         },
         body: JSON.stringify(paymentData),
       });
@@ -123,6 +128,8 @@ export default function CheckoutPage() {
     } catch (err: any) {
       setError(err.message || 'An unexpected error occurred during payment.');
       setIsProcessing(false);
+      // The customer may change their details before trying again
+      idempotencyKey.current = null;
     }
   };
 
@@ -6,6 +6,11 @@ import platform
 import signal
 import time
 import shutil
+import hashlib
+import threading
+import argparse
+import socket
+import http.client
 
 # Colors for terminal output
 class Colors:
@@ -20,10 +25,31 @@ BACKEND_DIR = "backend"
 FRONTEND_DIR = "frontend"
 VENV_DIR = "venv"
 
+# Fingerprints of the last successful installs, so unchanged dependencies are not reinstalled
+BACKEND_DEPS_STAMP = os.path.join(VENV_DIR, ".requirements.sha256")
+FRONTEND_DEPS_STAMP = os.path.join(FRONTEND_DIR, "node_modules", ".package-lock.sha256")
+
+# Production mode (--production): gunicorn settings
+PRODUCTION_BIND = os.getenv("BIND", "0.0.0.0:8000")
+MAX_REQUESTS = 1000  # Recycle each worker after this many requests (plus jitter) to cap memory growth
+MAX_REQUESTS_JITTER = 100
+GRACEFUL_TIMEOUT = 30  # Seconds workers get to finish in-flight requests on reload/shutdown
+READY_TIMEOUT = 120  # Seconds a new gunicorn gets to answer /health/ready/ before a reload is abandoned
+
+# Maintenance commands run next to the production server, with their interval in seconds
+BACKGROUND_JOBS = [
+    (["refresh_sales_rollups"], 5 * 60),
+    (["compact_payment_logs", "--pause", "0.05"], 24 * 60 * 60),
+    (["manage_payment_log_partitions"], 24 * 60 * 60),
+]
+
 # Global variables to store process objects
 backend_process = None
 frontend_process = None
+background_processes = {}  # Job name -> running process
 use_system_python = False  # Flag to indicate if we should use system Python
+reload_requested = threading.Event()
+shutting_down = threading.Event()
 
 def print_status(message):
     print(f"{Colors.BLUE}[INFO]{Colors.ENDC} {message}")
@@ -44,17 +70,11 @@ def check_requirements():
         print_error("Python 3.6 or higher is required.")
         return False
     
-    # Check if Node.js is installed
-    try:
-        subprocess.run(["node", "--version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (subprocess.SubprocessError, FileNotFoundError):
+    # Check if Node.js and npm are installed (a PATH lookup, no need to start them)
+    if shutil.which("node") is None:
         print_error("Node.js is required but not installed.")
         return False
-    
-    # Check if npm is installed
-    try:
-        subprocess.run(["npm", "--version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except (subprocess.SubprocessError, FileNotFoundError):
+    if shutil.which("npm") is None:
         print_error("npm is required but not installed.")
         return False
     
@@ -130,34 +150,80 @@ def get_python_executable():
     print_warning("Virtual environment Python not found, falling back to system Python")
     return get_system_python()
 
+def fingerprint(*paths, extra=""):
+    """Hash the contents of the given files (missing files count as empty)"""
+    digest = hashlib.sha256(extra.encode("utf-8"))
+    for path in paths:
+        digest.update(path.encode("utf-8") + b"\0")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def is_up_to_date(stamp_path, current):
+    try:
+        with open(stamp_path) as f:
+            return f.read().strip() == current
+    except OSError:
+        return False
+
+def write_stamp(stamp_path, current):
+    os.makedirs(os.path.dirname(stamp_path), exist_ok=True)
+    with open(stamp_path, "w") as f:
+        f.write(current)
+
 def install_backend_deps():
-    """Install backend dependencies"""
-    print_status("Installing backend dependencies...")
+    """Install backend dependencies unless requirements.txt is unchanged since the last install.
+
+    Returns True if an install ran.
+    """
     python_exe = get_python_executable()
+    requirements_path = os.path.abspath(os.path.join(BACKEND_DIR, "requirements.txt"))
+    # The interpreter is part of the fingerprint: a new venv or Python needs a fresh install
+    current = fingerprint(requirements_path, extra=python_exe)
+    stamp_path = BACKEND_DEPS_STAMP if not use_system_python else os.path.join(BACKEND_DIR, ".requirements.sha256")
+    if is_up_to_date(stamp_path, current):
+        print_status("Backend dependencies unchanged, skipping install.")
+        return False
+
+    print_status("Installing backend dependencies...")
     print_status(f"Using Python: {python_exe}")
     
     try:
         # Use absolute paths, pointing to the backend requirements file
-        requirements_path = os.path.abspath(os.path.join(BACKEND_DIR, "requirements.txt"))
         subprocess.run(
             [python_exe, "-m", "pip", "install", "-r", requirements_path],
             check=True,
             cwd=os.path.abspath(BACKEND_DIR) # Ensure pip runs in the backend directory context if needed
         )
+        write_stamp(stamp_path, current)
         print_success("Backend dependencies installed.")
     except subprocess.CalledProcessError as e:
         print_error(f"Failed to install backend dependencies: {str(e)}")
         sys.exit(1)
+    return True
 
 def run_migrations():
-    """Run Django migrations"""
-    print_status("Running Django migrations...")
+    """Run Django migrations if any are unapplied"""
     python_exe = get_python_executable()
+    # Use absolute paths
+    manage_py_path = os.path.abspath(os.path.join(BACKEND_DIR, "manage.py"))
+    
+    # `migrate --check` exits non-zero when there are unapplied migrations
+    check = subprocess.run(
+        [python_exe, manage_py_path, "migrate", "--check"],
+        cwd=os.path.abspath(BACKEND_DIR),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if check.returncode == 0:
+        print_status("No unapplied migrations.")
+        return
+    
+    print_status("Running Django migrations...")
     print_status(f"Using Python: {python_exe}")
     
     try:
-        # Use absolute paths
-        manage_py_path = os.path.abspath(os.path.join(BACKEND_DIR, "manage.py"))
         subprocess.run(
             [python_exe, manage_py_path, "migrate"],
             check=True,
@@ -169,21 +235,54 @@ def run_migrations():
         sys.exit(1)
 
 def install_frontend_deps():
-    """Install frontend dependencies"""
-    if not os.path.exists(os.path.join(FRONTEND_DIR, "node_modules")):
-        print_status("Installing frontend dependencies...")
-        current_dir = os.getcwd()
+    """Install frontend dependencies unless package-lock.json is unchanged since the last install.
+
+    Returns True if an install ran.
+    """
+    current = fingerprint(
+        os.path.join(FRONTEND_DIR, "package.json"),
+        os.path.join(FRONTEND_DIR, "package-lock.json"),
+    )
+    if os.path.exists(os.path.join(FRONTEND_DIR, "node_modules")) and is_up_to_date(FRONTEND_DEPS_STAMP, current):
+        print_status("Frontend dependencies unchanged, skipping install.")
+        return False
+
+    print_status("Installing frontend dependencies...")
+    try:
+        # cwd instead of os.chdir, as this runs alongside the backend install
+        subprocess.run(["npm", "install"], check=True, cwd=os.path.abspath(FRONTEND_DIR))
+        write_stamp(FRONTEND_DEPS_STAMP, current)
+        print_success("Frontend dependencies installed.")
+    except subprocess.CalledProcessError as e:
+        print_error(f"Failed to install frontend dependencies: {str(e)}")
+        sys.exit(1)
+    return True
+
+def install_dependencies():
+    """Install backend and frontend dependencies concurrently.
+
+    Returns True if either install ran.
+    """
+    results = {}
+    errors = []
+
+    def run(name, install):
         try:
-            os.chdir(FRONTEND_DIR)
-            subprocess.run(["npm", "install"], check=True)
-            print_success("Frontend dependencies installed.")
-        except subprocess.CalledProcessError as e:
-            print_error(f"Failed to install frontend dependencies: {str(e)}")
-            sys.exit(1)
-        finally:
-            os.chdir(current_dir)
-    else:
-        print_status("Frontend dependencies already installed.")
+            results[name] = install()
+        except SystemExit:
+            errors.append(name)
+
+    threads = [
+        threading.Thread(target=run, args=("backend", install_backend_deps)),
+        threading.Thread(target=run, args=("frontend", install_frontend_deps)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        sys.exit(1)
+    return any(results.values())
 
 def start_backend():
     """Start the Django backend server"""
@@ -219,9 +318,162 @@ def start_frontend():
     os.chdir(current_dir)
     print_success(f"Frontend server started with PID {frontend_process.pid}.")
 
-def cleanup(signum=None, frame=None):
+def worker_count():
+    """Gunicorn workers: WEB_CONCURRENCY, or the usual 2 x CPU cores + 1"""
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.getenv("WEB_CONCURRENCY"))
+    return (os.cpu_count() or 1) * 2 + 1
+
+def run_manage(*args):
+    """Run a Django management command to completion"""
+    manage_py_path = os.path.abspath(os.path.join(BACKEND_DIR, "manage.py"))
+    return subprocess.run(
+        [get_python_executable(), manage_py_path, *args],
+        cwd=os.path.abspath(BACKEND_DIR),
+        env=production_env(),
+    ).returncode
+
+def production_env():
+    env = os.environ.copy()
+    # Serve the export that `build_frontend` writes, rather than a copy inside backend/
+    env.setdefault("FRONTEND_BUILD_DIR", os.path.abspath(os.path.join(FRONTEND_DIR, "out")))
+    return env
+
+def prepare_production_assets():
+    """Build the static export (if its sources changed) and collect Django's static files"""
+    print_status("Building the frontend export if needed...")
+    if run_manage("build_frontend") != 0:
+        if not os.path.exists(os.path.join(FRONTEND_DIR, "out", "index.html")):
+            print_error("Frontend build failed and there is no previous build to serve.")
+            sys.exit(1)
+        print_warning("Frontend build failed, serving the previous build.")
+    
+    print_status("Collecting static files...")
+    if run_manage("collectstatic", "--noinput", "--verbosity", "0") != 0:
+        print_error("collectstatic failed.")
+        sys.exit(1)
+
+def free_local_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def start_production_backend(bind, workers):
+    """Start Django under gunicorn; returns the gunicorn master process"""
+    # Besides the shared port, each gunicorn listens on a port of its own, so a reload can check the
+    # readiness of the new one rather than whichever one the shared port hands the request to.
+    # (Not a unix socket: those do not take --reuse-port.)
+    ready_port = free_local_port()
+    command = [
+        get_python_executable(), "-m", "gunicorn", "core.wsgi:application",
+        # Hooks: each worker warms up before it accepts requests
+        "--config", "gunicorn.conf.py",
+        "--bind", bind,
+        "--bind", f"127.0.0.1:{ready_port}",
+        "--workers", str(workers),
+        # Import the app once in the master so workers fork with it already loaded
+        "--preload",
+        "--max-requests", str(MAX_REQUESTS),
+        "--max-requests-jitter", str(MAX_REQUESTS_JITTER),
+        "--graceful-timeout", str(GRACEFUL_TIMEOUT),
+        # Lets a new master bind next to the old one during a reload
+        "--reuse-port",
+        "--access-logfile", "-",
+    ]
+    process = subprocess.Popen(command, cwd=os.path.abspath(BACKEND_DIR), env=production_env())
+    process.ready_port = ready_port
+    print_success(f"Gunicorn started with {workers} workers on {bind} (PID {process.pid}).")
+    return process
+
+def wait_until_ready(process, timeout=READY_TIMEOUT):
+    """Poll the gunicorn's /health/ready/ until it answers 200; False if it exits or times out"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        connection = http.client.HTTPConnection("127.0.0.1", process.ready_port, timeout=5)
+        try:
+            connection.request("GET", "/health/ready/")
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            pass  # Not listening yet, or a worker is still warming up
+        finally:
+            connection.close()
+        time.sleep(0.5)
+    return False
+
+def reload_production_backend(bind, workers):
+    """Zero-downtime reload: start a new gunicorn next to the old one, then retire the old one"""
+    global backend_process
+    print_status("Reloading: starting new workers with the current code...")
+    old_process = backend_process
+    new_process = start_production_backend(bind, workers)
+    if not wait_until_ready(new_process):
+        print_error("New gunicorn did not become ready; keeping the running one.")
+        new_process.terminate()
+        new_process.wait()
+        return
+    backend_process = new_process
+    # TERM lets the old workers finish their in-flight requests first
+    old_process.terminate()
+    try:
+        old_process.wait(timeout=GRACEFUL_TIMEOUT + 10)
+    except subprocess.TimeoutExpired:
+        print_warning("Old gunicorn did not exit in time; killing it.")
+        old_process.kill()
+        old_process.wait()
+    print_success("Reload complete.")
+
+def run_background_jobs():
+    """Start each maintenance command when it is due, never two runs of the same job at once"""
+    next_run = {}
+    while not shutting_down.is_set():
+        now = time.monotonic()
+        for args, interval in BACKGROUND_JOBS:
+            name = args[0]
+            running = background_processes.get(name)
+            if running is not None and running.poll() is None:
+                continue
+            if now >= next_run.get(name, 0):
+                manage_py_path = os.path.abspath(os.path.join(BACKEND_DIR, "manage.py"))
+                background_processes[name] = subprocess.Popen(
+                    [get_python_executable(), manage_py_path, *args],
+                    cwd=os.path.abspath(BACKEND_DIR),
+                    env=production_env(),
+                )
+                next_run[name] = now + interval
+        shutting_down.wait(5)
+
+def request_reload(signum=None, frame=None):
+    reload_requested.set()
+
+def supervise_production(bind, workers):
+    """Keep gunicorn running: reload on SIGHUP and restart it if it dies"""
+    global backend_process
+    crashes = []
+    while True:
+        time.sleep(1)
+        if reload_requested.is_set():
+            reload_requested.clear()
+            reload_production_backend(bind, workers)
+            continue
+        
+        exit_code = backend_process.poll()
+        if exit_code is None:
+            continue
+        now = time.monotonic()
+        crashes = [crashed_at for crashed_at in crashes if now - crashed_at < 60] + [now]
+        if len(crashes) > 5:
+            print_error("Gunicorn keeps exiting; giving up.")
+            cleanup(exit_code=1)
+        print_warning(f"Gunicorn exited with code {exit_code}, restarting...")
+        backend_process = start_production_backend(bind, workers)
+
+def cleanup(signum=None, frame=None, exit_code=0):
     """Clean up processes when exiting"""
     print_status("Shutting down servers...")
+    shutting_down.set()
     
     global backend_process, frontend_process
     
@@ -239,14 +491,25 @@ def cleanup(signum=None, frame=None):
         except:
             print_warning("Could not terminate frontend server cleanly.")
     
+    for name, process in background_processes.items():
+        if process.poll() is None:
+            process.terminate()
+            print_status(f"Background job {name} stopped.")
+    
     print_success("All servers shut down.")
-    sys.exit(0)
-
-def is_first_run():
-    """Check if this is the first run"""
-    return not os.path.exists(VENV_DIR) or not os.path.exists(os.path.join(FRONTEND_DIR, "node_modules"))
+    sys.exit(exit_code)
 
 def main():
+    global backend_process
+    started = time.monotonic()
+
+    parser = argparse.ArgumentParser(description="Set up and run the MemoryBear project")
+    parser.add_argument("--production", action="store_true",
+                        help="Run Django under gunicorn with the built frontend export and background jobs")
+    parser.add_argument("--bind", default=PRODUCTION_BIND, help="Address for gunicorn (production only)")
+    parser.add_argument("--workers", type=int, default=None, help="Gunicorn workers (default: 2 x CPU cores + 1)")
+    args = parser.parse_args()
+
     # Register signal handlers for clean shutdown
     signal.signal(signal.SIGINT, cleanup)
     signal.signal(signal.SIGTERM, cleanup)
@@ -255,30 +518,44 @@ def main():
     if not check_requirements():
         sys.exit(1)
     
-    first_run = is_first_run()
-    
-    # Setup venv if first run
-    if first_run:
-        print_status("First time setup detected. Running initial environment setup...")
-        setup_venv()
-        # Frontend deps only need install on first run or if node_modules missing
-        install_frontend_deps()
-    else:
-        print_status("Existing setup detected.")
+    # Creates the venv only if it is missing or broken
+    setup_venv()
 
-    # Always ensure backend dependencies and migrations are up-to-date
-    print_status("Ensuring backend environment is up-to-date...")
-    install_backend_deps()
+    # Install whatever changed since the last run, backend and frontend in parallel
+    print_status("Ensuring the environment is up-to-date...")
+    installed = install_dependencies()
     run_migrations()
     
+    if args.production:
+        workers = args.workers or worker_count()
+        prepare_production_assets()
+        backend_process = start_production_backend(args.bind, workers)
+        threading.Thread(target=run_background_jobs, daemon=True).start()
+        # SIGHUP reloads the code without dropping requests
+        signal.signal(signal.SIGHUP, request_reload)
+        
+        elapsed = time.monotonic() - started
+        print_status("--------------------------------------------------------")
+        print_success(f"🚀 Production server is running on {args.bind}")
+        print_status(f"{'Cold' if installed else 'Warm'} start: bootstrapped in {elapsed:.1f}s")
+        print_status(f"Send SIGHUP to PID {os.getpid()} to reload gracefully.")
+        print_status("--------------------------------------------------------")
+        try:
+            supervise_production(args.bind, workers)
+        except KeyboardInterrupt:
+            cleanup()
+        return
+    
     # Start servers
     start_backend()
     start_frontend()
     
+    elapsed = time.monotonic() - started
     print_status("--------------------------------------------------------")
     print_success("🚀 Project is running!")
     print_success("📱 Frontend: http://localhost:3001")
     print_success("🖥️ Backend: http://127.0.0.1:8000")
+    print_status(f"{'Cold' if installed else 'Warm'} start: bootstrapped in {elapsed:.1f}s")
     print_status("--------------------------------------------------------")
     print_warning("Press Ctrl+C to stop both servers.")
     